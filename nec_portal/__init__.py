@@ -0,0 +1 @@
+default_app_config = 'nec_portal.apps.NecPortalConfig'
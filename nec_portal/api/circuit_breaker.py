@@ -0,0 +1,168 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import collections
+import logging
+import threading
+import time
+
+from django.utils.translation import ugettext_lazy as _
+
+from keystoneclient import exceptions as keystone_exceptions
+
+LOG = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Errors which mean Keystone itself is unhealthy. Client errors such as
+# NotFound or Conflict are answers from a working service and do not
+# count against the circuit.
+SERVICE_ERRORS = (keystone_exceptions.ConnectionRefused,
+                  keystone_exceptions.RequestTimeout,
+                  keystone_exceptions.HttpServerError)
+
+
+class IdentityUnavailable(keystone_exceptions.ServiceUnavailable):
+    """Raised instead of calling Keystone while the circuit is open."""
+
+    def __init__(self, message=None):
+        super(IdentityUnavailable, self).__init__(
+            message or _("Identity service is temporarily unavailable. "
+                         "Please try again later."))
+
+
+class CircuitBreaker(object):
+    """Tracks the health of Keystone over a sliding window of calls.
+
+    Every call outcome is recorded as a (failed, elapsed) pair. A call
+    counts as failed when it raised one of SERVICE_ERRORS or took longer
+    than ``slow_call_seconds``. When at least ``min_calls`` outcomes are
+    in the window and the failure ratio reaches ``failure_ratio`` the
+    circuit opens for ``open_seconds``; after that a single trial call is
+    let through (half open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, window=20, min_calls=10, failure_ratio=0.5,
+                 slow_call_seconds=5.0, open_seconds=30):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = STATE_CLOSED
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if (self._state == STATE_OPEN and
+                time.time() - self._opened_at >= self.open_seconds):
+            self._state = STATE_HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def allow_request(self):
+        """Return True if a call to Keystone may be attempted now."""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release_trial(self):
+        """Give up the half-open trial allowed to a call which was not
+        made, so that another call may be the trial.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, failed, elapsed):
+        slow = (self.slow_call_seconds is not None and
+                elapsed > self.slow_call_seconds)
+        failed = failed or slow
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self._close()
+                return
+            self._outcomes.append(failed)
+            if state == STATE_CLOSED and self._should_open():
+                self._open()
+
+    def _should_open(self):
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return False
+        failures = sum(1 for failed in self._outcomes if failed)
+        return float(failures) / calls >= self.failure_ratio
+
+    def _open(self):
+        LOG.warning('Identity circuit breaker opened; serving cached '
+                    'identity data for %s seconds.', self.open_seconds)
+        self._state = STATE_OPEN
+        self._opened_at = time.time()
+        self._trial_running = False
+
+    def _close(self):
+        LOG.info('Identity circuit breaker closed.')
+        self._state = STATE_CLOSED
+        self._opened_at = None
+        self._trial_running = False
+        self._outcomes.clear()
+
+    def reset(self):
+        with self._lock:
+            self._close()
+
+
+class LastKnownGood(object):
+    """A bounded LRU store of the most recent successful read results."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return (value, stored_at) or None when nothing is cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
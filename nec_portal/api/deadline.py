@@ -0,0 +1,84 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import contextlib
+import threading
+import time
+
+from django.utils.translation import ugettext_lazy as _
+
+from keystoneclient import exceptions as keystone_exceptions
+
+_LOCAL = threading.local()
+
+
+class DeadlineExceeded(keystone_exceptions.ClientException):
+    """Raised instead of calling Keystone once the time budget is spent."""
+
+    def __init__(self, message=None):
+        super(DeadlineExceeded, self).__init__(
+            message or _("The time allowed for this page was exceeded."))
+
+
+class Deadline(object):
+    """An absolute point in time by which identity calls must finish."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.time() + seconds
+        # Set when a call was refused, so views can tell that what they
+        # render is incomplete.
+        self.exhausted = False
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.time())
+
+    def check(self):
+        """Raise DeadlineExceeded if the budget has run out."""
+        if self.remaining() <= 0:
+            self.exhausted = True
+            raise DeadlineExceeded()
+
+
+def current():
+    """Return the deadline of the running request, or None."""
+    return getattr(_LOCAL, 'deadline', None)
+
+
+def install(deadline):
+    """Make ``deadline`` current for this thread and return the previous
+    one, so that work handed to other threads can share a budget.
+    """
+    previous = current()
+    _LOCAL.deadline = deadline
+    return previous
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds):
+    """Run the enclosed block with a budget of ``seconds``.
+
+    A nested scope never extends the budget of the enclosing one.
+    """
+    outer = current()
+    if seconds is None:
+        yield outer
+        return
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    install(deadline)
+    try:
+        yield deadline
+    finally:
+        install(outer)
@@ -0,0 +1,113 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""The roles users hold on a project directly or through their groups."""
+
+import collections
+import threading
+import time
+
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+EFFECTIVE_ROLES_SETTING = getattr(nec_set, 'IDENTITY_EFFECTIVE_ROLES', {})
+
+# Changes which only affect the roles on the project they name.
+PROJECT_OPERATIONS = ('add_project_user_role', 'remove_project_user_role',
+                      'add_group_role', 'remove_group_role',
+                      'project_delete')
+# Changes which may affect the roles on any project.
+GLOBAL_OPERATIONS = ('add_group_user', 'remove_group_user', 'group_delete',
+                     'user_delete')
+
+
+def expand(assignments, group_members):
+    """Return {user id: frozenset of role ids} for the assignments.
+
+    ``assignments`` yields (actor type, actor id, role id) tuples and
+    ``group_members(group_id)`` returns the ids of a group's members.
+    """
+    roles = collections.defaultdict(set)
+    group_roles = collections.defaultdict(set)
+    for actor_type, actor_id, role_id in assignments:
+        if actor_type == 'user':
+            roles[actor_id].add(role_id)
+        elif actor_type == 'group':
+            group_roles[actor_id].add(role_id)
+    for group_id, role_ids in group_roles.items():
+        for user_id in group_members(group_id):
+            roles[user_id].update(role_ids)
+    return dict((user_id, frozenset(role_ids))
+                for user_id, role_ids in roles.items())
+
+
+class EffectiveRoleCache(object):
+    """Effective roles by project, dropped when roles or group membership
+    change through this process.
+    """
+
+    def __init__(self, ttl=60, max_projects=1000):
+        self.ttl = ttl
+        self.max_projects = max_projects
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so that a result fetched while a
+        # change was made is not stored.
+        self.generation = 0
+
+    def get(self, project_id):
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def put(self, project_id, roles, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries.pop(project_id, None)
+            self._entries[project_id] = (roles, time.time() + self.ttl)
+            while len(self._entries) > self.max_projects:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, project_id=None):
+        """Drop the roles of one project, or of all when None."""
+        with self._lock:
+            self.generation += 1
+            if project_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(project_id, None)
+
+
+CACHE = EffectiveRoleCache(
+    ttl=EFFECTIVE_ROLES_SETTING.get('ttl', 60),
+    max_projects=EFFECTIVE_ROLES_SETTING.get('max_projects', 1000))
+
+
+def _invalidate(sender, arguments=None, **kwargs):
+    arguments = arguments or {}
+    # An inherited grant affects every project below the one it names.
+    if sender in PROJECT_OPERATIONS and not arguments.get('inherited'):
+        project = arguments.get('project')
+        CACHE.invalidate(getattr(project, 'id', project))
+    elif sender in PROJECT_OPERATIONS:
+        CACHE.invalidate()
+    elif sender in GLOBAL_OPERATIONS:
+        CACHE.invalidate()
+
+
+signals.identity_changed.connect(
+    _invalidate, dispatch_uid='nec_portal.effective_roles')
@@ -0,0 +1,128 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Brings the members of a group to a given list of users.
+
+Only the users missing from the group are added and only those not in
+the list are removed; the changes are sent to Keystone concurrently.
+"""
+
+import collections
+import logging
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.api import user_import
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+WRITE_CONCURRENCY = getattr(nec_set, 'IDENTITY_WRITE_CONCURRENCY', 8)
+
+# The user ids to add to and to remove from a group.
+MembershipPlan = collections.namedtuple('MembershipPlan', ['add', 'remove'])
+
+# The plan, the listed users which do not exist, and the parallel.Outcome
+# of each (action, user id) change; no outcomes for a dry run.
+SyncResult = collections.namedtuple('SyncResult',
+                                    ['plan', 'unknown', 'outcomes'])
+
+
+class IncompleteTargets(Exception):
+    """Some of the listed users do not exist, or none were listed."""
+
+    def __init__(self, unknown):
+        super(IncompleteTargets, self).__init__(
+            'Unknown users: %s' % ', '.join(unknown) if unknown
+            else 'No users are listed.')
+        self.unknown = unknown
+
+
+def read_targets(stream):
+    """Yield the user names or ids of a file listing one per line.
+
+    Blank lines and lines starting with '#' are skipped.
+    """
+    for line in stream:
+        line = user_import._text(line).strip().lstrip(u'\ufeff')
+        if line and not line.startswith('#'):
+            yield line
+
+
+def resolve_users(targets, domain):
+    """Return the ids of the users named or identified by ``targets`` in
+    the domain, and the targets matching none.
+    """
+    index = user_import.get_name_index(domain)
+    user_ids = set()
+    unknown = []
+    for target in targets:
+        existing = index.get(target)
+        if existing is not None:
+            user_ids.add(existing[0])
+        elif index.name_of(target) is not None:
+            user_ids.add(target)
+        else:
+            unknown.append(target)
+    return user_ids, unknown
+
+
+def plan_membership(current_ids, target_ids):
+    """Return the MembershipPlan taking a group from the members
+    ``current_ids`` to ``target_ids``.
+    """
+    current = frozenset(current_ids)
+    target = frozenset(target_ids)
+    return MembershipPlan(sorted(target - current), sorted(current - target))
+
+
+def _apply(request, group_id, change):
+    action, user_id = change
+    if action == 'add':
+        return project_identity.add_group_user(request, group_id=group_id,
+                                               user_id=user_id)
+    return project_identity.remove_group_user(request, group_id=group_id,
+                                              user_id=user_id)
+
+
+def sync_group(request, group_id, targets, domain=None, concurrency=None,
+               dry_run=False, require_all=False):
+    """Make the users named or identified by ``targets`` the members of
+    the group, at most ``concurrency`` changes at once.
+
+    Unknown targets are reported and left out, unless ``require_all`` is
+    set: then IncompleteTargets is raised, changing nothing, when any
+    target is unknown or none is given. Returns a SyncResult; failed
+    changes do not raise.
+    """
+    if concurrency is None:
+        concurrency = WRITE_CONCURRENCY
+    user_ids, unknown = resolve_users(targets, domain)
+    if require_all and (unknown or not user_ids):
+        raise IncompleteTargets(unknown)
+    current_ids = set(user.id for user in
+                      project_identity.iter_users(group=group_id))
+    plan = plan_membership(current_ids, user_ids)
+    if dry_run:
+        return SyncResult(plan, unknown, [])
+    changes = ([('add', user_id) for user_id in plan.add] +
+               [('remove', user_id) for user_id in plan.remove])
+    outcomes = parallel.run_bounded(
+        lambda change: _apply(request, group_id, change), changes,
+        concurrency)
+    for outcome in outcomes:
+        if outcome.error:
+            LOG.warning('Unable to %s user %s in group %s: %s',
+                        outcome.item[0], outcome.item[1], group_id,
+                        outcome.error)
+    return SyncResult(plan, unknown, outcomes)
@@ -0,0 +1,165 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""A journal of the changes made through project_identity.
+
+Each change appends one event per listing it affects, naming the objects
+whose rows changed, to a journal numbered by a counter in the Django
+cache. Open users, groups and projects tables follow the journal and
+re-fetch only those rows.
+
+As for identity_generations, a worker only sees the events of the others
+when the cache is shared between workers.
+"""
+
+import collections
+import time
+
+from django.core.cache import cache
+
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+CHANGE_EVENTS_SETTING = getattr(nec_set, 'IDENTITY_CHANGE_EVENTS', {})
+LAST_ID_KEY = 'nec_portal:identity_events:last'
+EVENT_KEY = 'nec_portal:identity_events:%d'
+
+# ``ids`` of None stands for every row of the listing.
+Event = collections.namedtuple('Event', ['id', 'listing', 'ids', 'project'])
+
+
+def _id(value):
+    return getattr(value, 'id', value)
+
+
+def _role_events(arguments, result):
+    project = _id(arguments.get('project'))
+    if arguments.get('inherited'):
+        project = None
+    if arguments.get('group'):
+        # The effective roles of every member changed.
+        return [('groups', [_id(arguments['group'])], project),
+                ('users', None, project)]
+    return [('users', [_id(arguments.get('user'))], project)]
+
+
+# The (listing, ids, project or None for all projects) of each change.
+OPERATION_EVENTS = {
+    'user_create': lambda a, r: [('users', [_id(r)],
+                                  _id(a.get('project')))],
+    'user_update': lambda a, r: [('users', [_id(a.get('user'))], None)],
+    'user_update_project': lambda a, r: [('users', [_id(a.get('user'))],
+                                          None)],
+    'user_delete': lambda a, r: [('users', [a.get('user_id')], None)],
+    'project_create': lambda a, r: [('projects', [_id(r)], None)],
+    'project_update': lambda a, r: [('projects', [_id(a.get('project'))],
+                                     None)],
+    'project_delete': lambda a, r: [('projects', [_id(a.get('project'))],
+                                     None)],
+    'group_create': lambda a, r: [('groups', [_id(r)], None)],
+    'group_update': lambda a, r: [('groups', [a.get('group_id')], None)],
+    'group_delete': lambda a, r: [('groups', [a.get('group_id')], None),
+                                  ('users', None, None)],
+    'add_group_user': lambda a, r: [('users', [a.get('user_id')], None)],
+    'remove_group_user': lambda a, r: [('users', [a.get('user_id')],
+                                        None)],
+    'add_project_user_role': _role_events,
+    'remove_project_user_role': _role_events,
+    'add_group_role': _role_events,
+    'remove_group_role': _role_events,
+}
+
+
+def enabled():
+    return CHANGE_EVENTS_SETTING.get('enabled', True)
+
+
+def _timeout():
+    return CHANGE_EVENTS_SETTING.get('timeout', 3600)
+
+
+def last_id():
+    """Return the id of the latest event."""
+    return cache.get(LAST_ID_KEY) or 0
+
+
+def publish(listing, ids=None, project=None):
+    """Append an event for the rows ``ids`` of the listing and return it."""
+    cache.add(LAST_ID_KEY, 0, None)
+    try:
+        event_id = cache.incr(LAST_ID_KEY)
+    except ValueError:
+        # Evicted between add and incr.
+        cache.add(LAST_ID_KEY, 1, None)
+        event_id = cache.incr(LAST_ID_KEY)
+    event = Event(event_id, listing, ids, project)
+    cache.set(EVENT_KEY % event_id, tuple(event), _timeout())
+    return event
+
+
+def events_since(since, listing=None, project=None):
+    """Return (events after ``since``, id to resume from), or
+    (None, id to resume from) when some of them were lost and the
+    listing is to be fetched again.
+
+    Only the events of ``listing`` which concern ``project`` or every
+    project are returned. An event missing from the journal is still being
+    written: the events after it are left for the next call, which resumes
+    from the one before it. It is only taken as lost once more than ``keep``
+    events follow, as for any event too old to be kept.
+    """
+    latest = last_id()
+    if since >= latest:
+        # Nothing new, or the counter itself was lost.
+        return [], latest
+    if latest - since > CHANGE_EVENTS_SETTING.get('keep', 1000):
+        return None, latest
+    keys = [EVENT_KEY % event_id for event_id in range(since + 1,
+                                                       latest + 1)]
+    values = cache.get_many(keys)
+    events = []
+    for event_id, key in enumerate(keys, since + 1):
+        if key not in values:
+            return events, event_id - 1
+        event = Event(*values[key])
+        if listing and event.listing != listing:
+            continue
+        if project and event.project not in (None, project):
+            continue
+        events.append(event)
+    return events, latest
+
+
+def wait(since, seconds, listing=None, project=None):
+    """Like events_since(), waiting up to ``seconds`` for an event."""
+    interval = CHANGE_EVENTS_SETTING.get('interval', 1)
+    deadline = time.time() + seconds
+    while True:
+        events, latest = events_since(since, listing, project)
+        if events is None or events or time.time() >= deadline:
+            return events, latest
+        since = latest
+        time.sleep(min(interval, max(deadline - time.time(), 0)))
+
+
+def _publish_events(sender, arguments=None, result=None, **kwargs):
+    if sender not in OPERATION_EVENTS or not enabled():
+        return
+    for listing, ids, project in OPERATION_EVENTS[sender](arguments or {},
+                                                          result):
+        publish(listing, ids, project)
+
+
+signals.identity_changed.connect(
+    _publish_events, dispatch_uid='nec_portal.identity_events')
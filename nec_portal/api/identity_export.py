@@ -0,0 +1,215 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Exports users, groups and role assignments as CSV or JSON.
+
+Rows are produced from the streamed listings of project_identity and
+serialized one at a time, so that an export of any size is written
+without being held in memory.
+"""
+
+import csv
+import itertools
+import json
+
+import six
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+
+EXPORT_SETTING = getattr(nec_set, 'IDENTITY_EXPORT', {})
+
+FORMATS = ('csv', 'json')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8',
+                 'json': 'application/json'}
+
+USER_FIELDS = ('user_id', 'user_name', 'email', 'enabled', 'project_id',
+               'project_name', 'roles')
+GROUP_FIELDS = ('group_id', 'group_name', 'user_id', 'user_name', 'email',
+                'enabled')
+ROLE_FIELDS = ('actor_type', 'actor_id', 'actor_name', 'role_id',
+               'role_name', 'inherited')
+
+
+def _assignments(**filters):
+    """Yield the role assignments matching ``filters`` with the names of
+    what they refer to, or without when the client cannot ask for them.
+    """
+    try:
+        for assignment in project_identity.iter_role_assignments(
+                include_names=True, **filters):
+            yield assignment
+    except TypeError:
+        for assignment in project_identity.iter_role_assignments(
+                **filters):
+            yield assignment
+
+
+def _role_names(request):
+    return dict((role.id, role.name)
+                for role in project_identity.role_list(request))
+
+
+def _member_ids(project):
+    """Return the ids of the users holding a role on the project, directly
+    or through a group.
+    """
+    return set(assignment.user['id'] for assignment in
+               project_identity.iter_role_assignments(project=project,
+                                                      effective=True)
+               if getattr(assignment, 'user', None))
+
+
+def _user_projects(user):
+    """Return [(project id, project name, role ids)] of the user's
+    effective project role assignments, ordered by project name.
+    """
+    projects = {}
+    for assignment in _assignments(user=user.id, effective=True):
+        project = getattr(assignment, 'scope', {}).get('project')
+        if not project:
+            continue
+        name, role_ids = projects.setdefault(
+            project['id'], (project.get('name', ''), []))
+        role_ids.append(assignment.role['id'])
+    return sorted(((project_id, name, role_ids)
+                   for project_id, (name, role_ids) in projects.items()),
+                  key=lambda project: (project[1], project[0]))
+
+
+def user_rows(request, project, domain=None):
+    """Yield a row per project of each member of ``project``, with the
+    roles the user holds there, those held through a group included.
+
+    The members are read from the effective role assignments of the
+    project, then from the streamed users of the domain; their
+    assignments are looked up IDENTITY_EXPORT['batch_size'] members at a
+    time, concurrently.
+    """
+    role_names = _role_names(request)
+    batch_size = EXPORT_SETTING.get('batch_size', 50)
+    concurrency = EXPORT_SETTING.get('concurrency', 8)
+    users = project_identity._iter_take(
+        project_identity.iter_users(domain=domain), _member_ids(project))
+    while True:
+        batch = list(itertools.islice(users, batch_size))
+        if not batch:
+            return
+        for outcome in parallel.run_bounded(_user_projects, batch,
+                                            concurrency):
+            if outcome.error is not None:
+                raise outcome.error
+            if project not in [p[0] for p in outcome.result]:
+                continue
+            user = outcome.item
+            for project_id, project_name, role_ids in outcome.result:
+                yield {'user_id': user.id,
+                       'user_name': user.name,
+                       'email': getattr(user, 'email', None) or '',
+                       'enabled': getattr(user, 'enabled', True),
+                       'project_id': project_id,
+                       'project_name': project_name,
+                       'roles': ';'.join(sorted(
+                           role_names.get(role_id, role_id)
+                           for role_id in role_ids))}
+
+
+def group_rows(request, project, domain=None):
+    """Yield a row per member of each group of ``project``; a group
+    without members gets a row of its own.
+    """
+    for group in project_identity.project_group_refs(project=project,
+                                                     domain=domain):
+        empty = True
+        for user in project_identity.iter_users(group=group.id):
+            empty = False
+            yield {'group_id': group.id,
+                   'group_name': group.name,
+                   'user_id': user.id,
+                   'user_name': user.name,
+                   'email': getattr(user, 'email', None) or '',
+                   'enabled': getattr(user, 'enabled', True)}
+        if empty:
+            yield dict(dict.fromkeys(GROUP_FIELDS, ''), group_id=group.id,
+                       group_name=group.name)
+
+
+def role_rows(request, project):
+    """Yield a row per role assignment on ``project``, those inherited to
+    its subprojects included.
+    """
+    role_names = _role_names(request)
+    for assignment in _assignments(project=project):
+        for actor_type in ('user', 'group'):
+            actor = getattr(assignment, actor_type, None)
+            if actor is not None:
+                break
+        else:
+            continue
+        role_id = assignment.role['id']
+        yield {'actor_type': actor_type,
+               'actor_id': actor['id'],
+               'actor_name': actor.get('name', ''),
+               'role_id': role_id,
+               'role_name': assignment.role.get(
+                   'name', role_names.get(role_id, role_id)),
+               'inherited': project_identity._is_inherited(assignment)}
+
+
+# name: (fields, row generator)
+EXPORTS = {
+    'users': (USER_FIELDS, user_rows),
+    'groups': (GROUP_FIELDS, group_rows),
+    'roles': (ROLE_FIELDS, role_rows),
+}
+
+
+class _Echo(object):
+    """A file which returns what is written to it, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def iter_csv(fields, rows):
+    """Yield the lines of a CSV file with a header line."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([_csv_value(field) for field in fields])
+    for row in rows:
+        yield writer.writerow([_csv_value(row.get(field, ''))
+                               for field in fields])
+
+
+def iter_json(fields, rows):
+    """Yield a JSON array of objects, one object per chunk."""
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(
+            dict((field, row.get(field, '')) for field in fields),
+            sort_keys=True)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+SERIALIZERS = {'csv': iter_csv, 'json': iter_json}
@@ -0,0 +1,153 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Change generations of the users, groups and projects listings.
+
+Every change made through project_identity bumps the generation of the
+listings it may affect, either those of one project or those of all
+projects. The version of a listing is derived from its generations, so
+that a page built from an unchanged listing can be answered with
+304 Not Modified.
+
+The generations live in the Django cache; without a cache shared between
+workers a worker only sees its own changes. Changes made outside of the
+portal are not seen at all, so a version also changes every
+IDENTITY_CONDITIONAL_GET['max_age'] seconds.
+"""
+
+import hashlib
+import random
+import time
+
+from django.core.cache import cache
+
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+CONDITIONAL_GET_SETTING = getattr(nec_set, 'IDENTITY_CONDITIONAL_GET', {})
+GENERATION_KEY = 'nec_portal:identity_generation:%s:%s'
+ALL_PROJECTS = '*'
+
+LISTINGS = ('users', 'groups', 'projects')
+
+
+def _id(value):
+    return getattr(value, 'id', value)
+
+
+def _role_scopes(listings):
+    """The scopes of a role grant or revocation: the listings of the
+    project, or of every project when it is inherited by the subprojects.
+    """
+    def scopes(arguments):
+        project = _id(arguments.get('project'))
+        if arguments.get('inherited'):
+            project = None
+        return [(listing, project) for listing in listings] + [
+            ('projects', None)]
+    return scopes
+
+
+# The (listing, project or None for all projects) each change affects.
+OPERATION_SCOPES = {
+    'user_create': lambda a: [('users', None)],
+    'user_update': lambda a: [('users', None)],
+    'user_update_project': lambda a: [('users', None)],
+    'user_delete': lambda a: [('users', None)],
+    'project_create': lambda a: [('projects', None)],
+    'project_update': lambda a: [('projects', None)],
+    'project_delete': lambda a: [('projects', None),
+                                 ('users', _id(a.get('project'))),
+                                 ('groups', _id(a.get('project')))],
+    'group_create': lambda a: [('groups', None)],
+    'group_update': lambda a: [('groups', None)],
+    'group_delete': lambda a: [('groups', None), ('users', None)],
+    # Users show the roles they hold through their groups.
+    'add_group_user': lambda a: [('users', None)],
+    'remove_group_user': lambda a: [('users', None)],
+    'add_project_user_role': _role_scopes(('users',)),
+    'remove_project_user_role': _role_scopes(('users',)),
+    'add_group_role': _role_scopes(('users', 'groups')),
+    'remove_group_role': _role_scopes(('users', 'groups')),
+}
+
+
+def enabled():
+    return CONDITIONAL_GET_SETTING.get('enabled', True)
+
+
+def _key(listing, project):
+    return GENERATION_KEY % (listing, project or ALL_PROJECTS)
+
+
+def _timeout():
+    return CONDITIONAL_GET_SETTING.get('timeout', 86400)
+
+
+def bump(listing, project=None):
+    """Start a new generation of the listing of the project, or of the
+    listings of all projects.
+    """
+    key = _key(listing, project)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not in the cache; any value but the one lost will do.
+        cache.add(key, random.randint(1, 2 ** 31), _timeout())
+    cache.set(key + ':at', time.time(), _timeout())
+
+
+def generations(listing, project=None):
+    """Return the generations of the listing for the project and for all
+    projects, and when the later of them started, or None if unknown.
+    """
+    keys = [_key(listing, ALL_PROJECTS)]
+    if project:
+        keys.append(_key(listing, project))
+    values = cache.get_many(keys + [key + ':at' for key in keys])
+    for key in keys:
+        if key not in values:
+            cache.add(key, random.randint(1, 2 ** 31), _timeout())
+            values[key] = cache.get(key)
+    changed_at = [values[key + ':at'] for key in keys
+                  if values.get(key + ':at') is not None]
+    return ([values[key] for key in keys],
+            max(changed_at) if changed_at else None)
+
+
+def version(listing, project=None, scope=()):
+    """Return (token, last modified timestamp) of the listing as seen
+    from ``scope``, the values the page depends on besides the listing
+    itself such as the user and their roles.
+    """
+    max_age = CONDITIONAL_GET_SETTING.get('max_age', 60)
+    now = time.time()
+    period_start = now - now % max_age if max_age else now
+    values, changed_at = generations(listing, project)
+    digest = hashlib.sha1()
+    for part in [listing, project, period_start] + values + list(scope):
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest(), max(changed_at or 0, period_start)
+
+
+def _bump_generations(sender, arguments=None, **kwargs):
+    if sender not in OPERATION_SCOPES:
+        return
+    for listing, project in OPERATION_SCOPES[sender](arguments or {}):
+        bump(listing, project)
+
+
+signals.identity_changed.connect(
+    _bump_generations, dispatch_uid='nec_portal.identity_generations')
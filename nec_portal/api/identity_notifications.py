@@ -0,0 +1,390 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Keeps an IdentityState current from Keystone notifications.
+
+Keystone emits ``identity.<resource>.<action>`` notifications for users,
+projects, groups and role assignments. The consumer reads them from a
+transport and applies each one to the state, fetching only the resource
+it names. A full reload runs periodically as a safety net against lost
+notifications.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.utils import module_loading
+from keystoneclient import exceptions as keystone_exceptions
+from six.moves import queue
+
+from nec_portal.api import identity_state
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+try:
+    from oslo_config import cfg
+    import oslo_messaging
+except ImportError:
+    oslo_messaging = None
+
+LOG = logging.getLogger(__name__)
+NOTIFICATIONS_SETTING = getattr(nec_set, 'IDENTITY_NOTIFICATIONS', {})
+
+
+class Transport(object):
+    """Where notifications come from."""
+
+    def receive(self, timeout):
+        """Return the (event_type, payload) pairs which arrived, waiting
+        at most ``timeout`` seconds for the first one.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class QueueTransport(Transport):
+    """Notifications published within the process, e.g. by tests."""
+
+    def __init__(self, queue_=None, **kwargs):
+        self.queue = queue_ if queue_ is not None else queue.Queue()
+
+    def publish(self, event_type, payload):
+        self.queue.put((event_type, payload))
+
+    def receive(self, timeout):
+        messages = []
+        try:
+            messages.append(self.queue.get(timeout=timeout))
+            while True:
+                messages.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+
+class FileTransport(Transport):
+    """Notifications appended to a file as one JSON object per line,
+    with 'event_type' and 'payload' keys.
+    """
+
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self.offset = 0
+
+    def receive(self, timeout):
+        messages = []
+        if os.path.exists(self.path):
+            if os.path.getsize(self.path) < self.offset:
+                # The file was truncated or replaced; start over.
+                self.offset = 0
+            with open(self.path) as f:
+                f.seek(self.offset)
+                for line in iter(f.readline, ''):
+                    if not line.endswith('\n'):
+                        break
+                    self.offset = f.tell()
+                    if not line.strip():
+                        continue
+                    message = json.loads(line)
+                    messages.append((message['event_type'],
+                                     message.get('payload', {})))
+        if not messages:
+            time.sleep(timeout)
+        return messages
+
+
+class _NotificationEndpoint(object):
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    def info(self, ctxt, publisher_id, event_type, payload, metadata):
+        if event_type.startswith('identity.'):
+            self.messages.put((event_type, payload))
+
+
+class OsloMessagingTransport(Transport):
+    """Notifications from the message bus Keystone publishes to.
+
+    Every process listens in its own pool, so that each one receives all
+    notifications instead of sharing them with the other workers.
+    """
+
+    def __init__(self, url=None, topic='notifications', **kwargs):
+        if oslo_messaging is None:
+            raise ImportError('oslo.messaging is required to receive '
+                              'Keystone notifications from the bus.')
+        self.messages = queue.Queue()
+        transport = oslo_messaging.get_transport(cfg.CONF, url=url)
+        pool = 'nec_portal-%s-%d' % (socket.gethostname(), os.getpid())
+        self.listener = oslo_messaging.get_notification_listener(
+            transport, [oslo_messaging.Target(topic=topic)],
+            [_NotificationEndpoint(self.messages)],
+            executor='threading', pool=pool)
+        self.listener.start()
+        self._queue_transport = QueueTransport(self.messages)
+
+    def receive(self, timeout):
+        return self._queue_transport.receive(timeout)
+
+    def close(self):
+        self.listener.stop()
+        self.listener.wait()
+
+
+TRANSPORTS = {
+    'queue': QueueTransport,
+    'file': FileTransport,
+    'oslo': OsloMessagingTransport,
+}
+
+
+def _resource_id(payload):
+    return (payload.get('resource_info') or
+            payload.get('target', {}).get('id'))
+
+
+def _assignment(payload):
+    if payload.get('user'):
+        actor = ('user', payload['user'])
+    elif payload.get('group'):
+        actor = ('group', payload['group'])
+    else:
+        return None
+    return ((payload['role'],) + actor +
+            (payload.get('project') or '', payload.get('domain') or '',
+             1 if payload.get('inherited_to_projects') else 0))
+
+
+def apply_event(state, event_type, payload, get_client):
+    """Apply one notification to ``state``.
+
+    ``get_client`` returns a Keystone client and is only called when the
+    notification does not carry enough data to be applied on its own.
+    Returns False for notifications which are not about identity data.
+    """
+    parts = event_type.split('.')
+    if len(parts) != 3 or parts[0] != 'identity':
+        return False
+    resource, action = parts[1], parts[2]
+
+    if resource == 'role_assignment':
+        assignment = _assignment(payload)
+        if assignment is None:
+            return False
+        if action == 'created':
+            state.add_assignment(assignment)
+        elif action == 'deleted':
+            state.remove_assignment(assignment)
+        return True
+
+    resource_id = _resource_id(payload)
+    if resource_id is None or resource not in ('user', 'group', 'project'):
+        return False
+    delete = getattr(state, 'delete_%s' % resource)
+    if action == 'deleted':
+        delete(resource_id)
+        return True
+
+    client = get_client()
+    try:
+        if resource == 'user':
+            state.put_user(client.users.get(resource_id))
+        elif resource == 'project':
+            state.put_project(client.projects.get(resource_id))
+        else:
+            member_ids = [user.id
+                          for user in client.users.list(group=resource_id)]
+            state.put_group(client.groups.get(resource_id), member_ids)
+    except keystone_exceptions.NotFound:
+        # Deleted again before the notification was handled.
+        delete(resource_id)
+    return True
+
+
+class NotificationConsumer(object):
+
+    def __init__(self, state, transport, client_factory,
+                 reconcile_interval=3600, poll_timeout=1.0):
+        self.state = state
+        self.transport = transport
+        self.client_factory = client_factory
+        self.reconcile_interval = reconcile_interval
+        self.poll_timeout = poll_timeout
+        self.last_reconciled = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def reconcile(self):
+        start = time.time()
+        self.state.load(self.client_factory())
+        self.last_reconciled = time.time()
+        LOG.info('Reloaded identity state in %.1f seconds.',
+                 self.last_reconciled - start)
+
+    def _reconcile_due(self):
+        if self.last_reconciled is None:
+            return True
+        return (self.reconcile_interval is not None and
+                time.time() - self.last_reconciled >= self.reconcile_interval)
+
+    def run_once(self):
+        if self._reconcile_due():
+            self.reconcile()
+        clients = []
+
+        def get_client():
+            if not clients:
+                clients.append(self.client_factory())
+            return clients[0]
+
+        for event_type, payload in self.transport.receive(self.poll_timeout):
+            try:
+                apply_event(self.state, event_type, payload, get_client)
+            except Exception:
+                LOG.exception('Unable to apply notification %s.', event_type)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                LOG.exception('Identity notification consumer failed.')
+                self._stopped.wait(self.poll_timeout)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='identity-notifications')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self.transport.close()
+
+
+_CONSUMER = None
+_CONSUMER_LOCK = threading.Lock()
+
+
+def _create_consumer():
+    # Imported here as project_identity reads from this module.
+    from nec_portal.api import project_identity
+
+    options = dict(NOTIFICATIONS_SETTING)
+    transport_class = options.pop('transport', 'oslo')
+    if transport_class in TRANSPORTS:
+        transport_class = TRANSPORTS[transport_class]
+    else:
+        transport_class = module_loading.import_string(transport_class)
+    reconcile_interval = options.pop('reconcile_interval', 3600)
+    options.pop('enabled', None)
+    return NotificationConsumer(identity_state.IdentityState(),
+                                transport_class(**options),
+                                project_identity.get_keystone_client,
+                                reconcile_interval=reconcile_interval)
+
+
+def get_consumer():
+    """Return the consumer of this process, starting it on first use."""
+    global _CONSUMER
+    if not NOTIFICATIONS_SETTING.get('enabled', False):
+        return None
+    with _CONSUMER_LOCK:
+        if _CONSUMER is None:
+            _CONSUMER = _create_consumer()
+            _CONSUMER.start()
+    return _CONSUMER
+
+
+def get_identity_state():
+    """Return the identity state once it has been loaded, else None."""
+    consumer = get_consumer()
+    if consumer is None or not consumer.state.ready:
+        return None
+    return consumer.state
+
+
+def _id(value):
+    return getattr(value, 'id', value)
+
+
+def _role_assignment_event(action, arguments):
+    payload = {'role': _id(arguments['role']),
+               'project': _id(arguments.get('project'))}
+    if arguments.get('group'):
+        payload['group'] = _id(arguments['group'])
+    else:
+        payload['user'] = _id(arguments['user'])
+    if arguments.get('inherited'):
+        payload['inherited_to_projects'] = 'projects'
+    return 'identity.role_assignment.%s' % action, payload
+
+
+def _resource_event(resource, action, resource_id):
+    return ('identity.%s.%s' % (resource, action),
+            {'resource_info': resource_id})
+
+
+# Turns a change made through project_identity into the notification
+# Keystone will send for it, so that the state of the process which made
+# the change is current right away.
+OPERATION_EVENTS = {
+    'user_create': lambda a, r: _resource_event('user', 'created', _id(r)),
+    'user_update': lambda a, r: _resource_event('user', 'updated',
+                                                _id(a['user'])),
+    'user_update_project': lambda a, r: _resource_event('user', 'updated',
+                                                        _id(a['user'])),
+    'user_delete': lambda a, r: _resource_event('user', 'deleted',
+                                                a['user_id']),
+    'project_create': lambda a, r: _resource_event('project', 'created',
+                                                   _id(r)),
+    'project_update': lambda a, r: _resource_event('project', 'updated',
+                                                   _id(a['project'])),
+    'project_delete': lambda a, r: _resource_event('project', 'deleted',
+                                                   _id(a['project'])),
+    'group_create': lambda a, r: _resource_event('group', 'created', _id(r)),
+    'group_update': lambda a, r: _resource_event('group', 'updated',
+                                                 a['group_id']),
+    'group_delete': lambda a, r: _resource_event('group', 'deleted',
+                                                 a['group_id']),
+    'add_group_user': lambda a, r: _resource_event('group', 'updated',
+                                                   a['group_id']),
+    'remove_group_user': lambda a, r: _resource_event('group', 'updated',
+                                                      a['group_id']),
+    'add_project_user_role': lambda a, r: _role_assignment_event('created',
+                                                                 a),
+    'remove_project_user_role': lambda a, r: _role_assignment_event(
+        'deleted', a),
+    'add_group_role': lambda a, r: _role_assignment_event('created', a),
+    'remove_group_role': lambda a, r: _role_assignment_event('deleted', a),
+}
+
+
+def _apply_identity_change(sender, arguments=None, result=None, **kwargs):
+    consumer = get_consumer()
+    if consumer is None or sender not in OPERATION_EVENTS:
+        return
+    event_type, payload = OPERATION_EVENTS[sender](arguments, result)
+    apply_event(consumer.state, event_type, payload, consumer.client_factory)
+
+
+signals.identity_changed.connect(
+    _apply_identity_change, dispatch_uid='nec_portal.identity_notifications')
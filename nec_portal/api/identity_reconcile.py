@@ -0,0 +1,586 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Converges projects, groups, group members and role grants on a
+desired state read from a JSON or YAML file such as::
+
+    domain: default
+    groups:
+      - name: developers
+        description: Web developers
+        members: [alice, bob]
+    projects:
+      - name: web
+        parent: platform
+        description: Web services
+        enabled: true
+        users: {carol: [_member_]}
+        groups: {developers: [C__DC1__Reader]}
+
+Only what the file declares is managed: projects and groups it does not
+name are left alone, and the members of a group or the user or group
+grants of a project are only changed when the file lists them. Inherited
+grants are not managed.
+
+The plan holds the fewest changes turning the live state into the
+desired one, each of them a single Keystone call. Changes are applied a
+stage at a time, parents before the projects created under them, and
+the changes of a stage concurrently.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from nec_portal.api import circuit_breaker
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.api import user_import
+from nec_portal.local import nec_portal_settings as nec_set
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+LOG = logging.getLogger(__name__)
+RECONCILE_SETTING = getattr(nec_set, 'IDENTITY_RECONCILE', {})
+
+FORMATS = ('json', 'yaml')
+GROUP_FIELDS = ('description',)
+PROJECT_FIELDS = ('description', 'enabled')
+ACTOR_TYPES = ('user', 'group')
+
+# A change of the plan. target is the project or group name, actor the
+# user or group name for member and grant changes, role the role name for
+# grants, and values the (field, value) pairs of creations and updates.
+Change = collections.namedtuple('Change', ['action', 'target', 'actor_type',
+                                           'actor', 'role', 'values'])
+
+# The changes to make, stage by stage, the {kind: {name: id}} of the
+# objects they refer to, the problems of the desired state which left
+# changes out, and the number of listings read to compute it.
+Plan = collections.namedtuple('Plan', ['domain', 'stages', 'ids', 'errors',
+                                       'reads'])
+
+# The parallel.Outcome of each change made, and the changes not attempted
+# because an object they refer to could not be created.
+ApplyResult = collections.namedtuple('ApplyResult', ['outcomes', 'skipped'])
+
+
+def _change(action, target, actor_type=None, actor=None, role=None,
+            values=None):
+    return Change(action, target, actor_type, actor, role,
+                  tuple(sorted((values or {}).items())))
+
+
+def change_key(change):
+    return json.dumps(list(change), sort_keys=True)
+
+
+def detect_format(filename):
+    if filename.lower().endswith(('.yaml', '.yml')):
+        return 'yaml'
+    return 'json'
+
+
+def load_desired(stream, fmt='json'):
+    """Return the desired state of a JSON or YAML file.
+
+    Raises ValueError when it is malformed.
+    """
+    if fmt == 'yaml':
+        if yaml is None:
+            raise ValueError('PyYAML is required to read YAML files.')
+        desired = yaml.safe_load(stream)
+    else:
+        desired = json.loads(user_import._text(stream.read()))
+    if not isinstance(desired, dict):
+        raise ValueError('The desired state is not a mapping.')
+    for kind in ('groups', 'projects'):
+        names = set()
+        for entry in desired.get(kind) or []:
+            if not isinstance(entry, dict) or not entry.get('name'):
+                raise ValueError('An entry of %s has no name.' % kind)
+            if entry['name'] in names:
+                raise ValueError('%s is declared twice in %s.' % (
+                    entry['name'], kind))
+            names.add(entry['name'])
+    return desired
+
+
+class LiveState(object):
+    """The projects, groups, users and roles of a domain as Keystone has
+    them, and the members and grants of some of them.
+    """
+
+    def __init__(self, request, domain):
+        self.reads = 3
+        self.roles = dict((role.name, role.id)
+                          for role in project_identity.role_list(request))
+        self.projects = dict(
+            (project.name, project)
+            for project in project_identity.iter_projects(domain=domain))
+        self.groups = dict(
+            (group.name, group)
+            for group in project_identity.iter_groups(domain=domain))
+        self.users = user_import.get_name_index(domain)
+        self._group_names = dict((group.id, name)
+                                 for name, group in self.groups.items())
+        self._lock = threading.Lock()
+
+    def _read(self):
+        with self._lock:
+            self.reads += 1
+
+    def user_id(self, name):
+        existing = self.users.get(name)
+        return existing[0] if existing is not None else None
+
+    def members(self, group_name):
+        """Return the names of the members of the group."""
+        self._read()
+        group = self.groups[group_name]
+        return set(user.name for user in
+                   project_identity.iter_users(group=group.id))
+
+    def grants(self, project_name):
+        """Return the (actor type, actor name, role name) of the direct
+        grants on the project.
+        """
+        self._read()
+        project = self.projects[project_name]
+        role_names = dict((role_id, name)
+                          for name, role_id in self.roles.items())
+        grants = set()
+        for assignment in project_identity.iter_role_assignments(
+                project=project.id):
+            if project_identity._is_inherited(assignment):
+                continue
+            if hasattr(assignment, 'user'):
+                actor_id = assignment.user['id']
+                grants.add(('user',
+                            self.users.name_of(actor_id) or actor_id,
+                            role_names.get(assignment.role['id'],
+                                           assignment.role['id'])))
+            elif hasattr(assignment, 'group'):
+                actor_id = assignment.group['id']
+                grants.add(('group',
+                            self._group_names.get(actor_id, actor_id),
+                            role_names.get(assignment.role['id'],
+                                           assignment.role['id'])))
+        return grants
+
+
+def _declared(entry, fields):
+    return dict((field, entry[field]) for field in fields if field in entry)
+
+
+def _project_depths(projects, live, errors):
+    """Return {project name: depth below the projects without a declared
+    parent}, leaving out the projects whose parent is unknown or which
+    are their own ancestors.
+    """
+    parents = dict((project['name'], project.get('parent'))
+                   for project in projects)
+    depths = {}
+    for name in parents:
+        chain = []
+        current = name
+        while current in parents and current not in depths:
+            if current in chain:
+                errors.append('Project %s is its own ancestor.' % name)
+                break
+            chain.append(current)
+            current = parents[current]
+        else:
+            if current in depths:
+                base = depths[current] + 1
+            elif current is None or current in live.projects:
+                base = 0
+            else:
+                errors.append('The parent %s of project %s does not '
+                              'exist.' % (current, chain[-1]))
+                continue
+            for offset, member in enumerate(reversed(chain)):
+                depths[member] = base + offset
+    return depths
+
+
+def _read_all(func, names, concurrency):
+    results = {}
+    for outcome in parallel.run_bounded(func, names, concurrency):
+        if outcome.error is not None:
+            raise outcome.error
+        results[outcome.item] = outcome.result
+    return results
+
+
+def compute_plan(request, desired, concurrency=None):
+    """Return the Plan converging the live state on ``desired``."""
+    if concurrency is None:
+        concurrency = RECONCILE_SETTING.get('concurrency', 8)
+    domain = desired.get('domain') or 'default'
+    live = LiveState(request, domain)
+    groups = desired.get('groups') or []
+    projects = desired.get('projects') or []
+    errors = []
+    creations = collections.defaultdict(list)
+    changes = []
+
+    for group in groups:
+        values = _declared(group, GROUP_FIELDS)
+        existing = live.groups.get(group['name'])
+        if existing is None:
+            creations[0].append(_change('create_group', group['name'],
+                                        values=values))
+            continue
+        values = dict((field, value) for field, value in values.items()
+                      if getattr(existing, field, None) != value)
+        if values:
+            changes.append(_change('update_group', group['name'],
+                                   values=values))
+
+    depths = _project_depths(projects, live, errors)
+    project_names = dict((project.id, name)
+                         for name, project in live.projects.items())
+    for project in projects:
+        name = project['name']
+        if name not in depths:
+            continue
+        values = _declared(project, PROJECT_FIELDS)
+        existing = live.projects.get(name)
+        if existing is None:
+            values['parent'] = project.get('parent')
+            creations[depths[name]].append(_change('create_project', name,
+                                                   values=values))
+            continue
+        parent = project_names.get(getattr(existing, 'parent_id', None))
+        if project.get('parent') and project['parent'] != parent:
+            errors.append('Project %s cannot be moved under %s.' % (
+                name, project['parent']))
+        values = dict((field, value) for field, value in values.items()
+                      if getattr(existing, field, None) != value)
+        if values:
+            changes.append(_change('update_project', name, values=values))
+
+    declared_groups = set(group['name'] for group in groups)
+    members = _read_all(live.members, [
+        group['name'] for group in groups
+        if 'members' in group and group['name'] in live.groups],
+        concurrency)
+    for group in groups:
+        if 'members' not in group:
+            continue
+        current = members.get(group['name'], set())
+        wanted = set()
+        for user in group['members'] or []:
+            if live.user_id(user) is None:
+                errors.append('User %s of group %s does not exist.' % (
+                    user, group['name']))
+            else:
+                wanted.add(user)
+        for user in sorted(wanted - current):
+            changes.append(_change('add_member', group['name'], 'user',
+                                   user))
+        for user in sorted(current - wanted):
+            changes.append(_change('remove_member', group['name'], 'user',
+                                   user))
+
+    managed = [project for project in projects
+               if project['name'] in depths and
+               any(actor_type + 's' in project
+                   for actor_type in ACTOR_TYPES)]
+    grants = _read_all(live.grants, [
+        project['name'] for project in managed
+        if project['name'] in live.projects], concurrency)
+    for project in managed:
+        name = project['name']
+        types = [actor_type for actor_type in ACTOR_TYPES
+                 if actor_type + 's' in project]
+        current = set(grant for grant in grants.get(name, set())
+                      if grant[0] in types)
+        wanted = set()
+        for actor_type in types:
+            for actor, roles in (project[actor_type + 's'] or {}).items():
+                if actor_type == 'user' and live.user_id(actor) is None:
+                    errors.append('User %s of project %s does not exist.'
+                                  % (actor, name))
+                    continue
+                if (actor_type == 'group' and actor not in live.groups and
+                        actor not in declared_groups):
+                    errors.append('Group %s of project %s does not exist.'
+                                  % (actor, name))
+                    continue
+                for role in roles or []:
+                    if role not in live.roles:
+                        errors.append('Role %s of project %s does not '
+                                      'exist.' % (role, name))
+                    else:
+                        wanted.add((actor_type, actor, role))
+        for actor_type, actor, role in sorted(wanted - current):
+            changes.append(_change('grant', name, actor_type, actor, role))
+        for actor_type, actor, role in sorted(current - wanted):
+            changes.append(_change('revoke', name, actor_type, actor, role))
+
+    stages = [creations[depth] for depth in sorted(creations)]
+    if changes:
+        stages.append(changes)
+    ids = {'project': dict((name, project.id)
+                           for name, project in live.projects.items()),
+           'group': dict((name, group.id)
+                         for name, group in live.groups.items()),
+           'role': dict(live.roles),
+           'user': {}}
+    # Grants of users and groups of other domains are named by their id.
+    for change in changes:
+        if change.actor_type == 'user':
+            ids['user'][change.actor] = (live.user_id(change.actor) or
+                                         change.actor)
+        elif (change.actor_type == 'group' and
+                change.actor not in declared_groups):
+            ids['group'].setdefault(change.actor, change.actor)
+    return Plan(domain, stages, ids, errors, live.reads)
+
+
+def estimate_calls(plan):
+    """Return a Counter of the Keystone calls applying the plan takes, by
+    action, not counting retries.
+    """
+    return collections.Counter(change.action for stage in plan.stages
+                               for change in stage)
+
+
+def _required(change):
+    """Return the (kind, name) of the objects the change refers to."""
+    if change.action == 'create_group':
+        return []
+    if change.action == 'create_project':
+        parent = dict(change.values).get('parent')
+        return [('project', parent)] if parent else []
+    kind = 'group' if change.action.endswith(('_group', '_member')) \
+        else 'project'
+    required = [(kind, change.target)]
+    if change.actor is not None:
+        required.append((change.actor_type, change.actor))
+    if change.role is not None:
+        required.append(('role', change.role))
+    return required
+
+
+def _apply_change(request, domain, ids, change):
+    """Make a change; returns the id of the object it created, if any."""
+    values = dict(change.values)
+    if change.action == 'create_group':
+        return project_identity.group_create(
+            request, domain, change.target,
+            description=values.get('description')).id
+    if change.action == 'create_project':
+        kwargs = {}
+        if values.get('parent'):
+            kwargs['parent'] = ids['project'][values['parent']]
+        return project_identity.project_create(
+            request, change.target, description=values.get('description'),
+            enabled=values.get('enabled', True), domain=domain,
+            **kwargs).id
+    if change.action == 'update_group':
+        project_identity.group_update(request, ids['group'][change.target],
+                                      description=values.get('description'))
+    elif change.action == 'update_project':
+        project_identity.project_update(request,
+                                        ids['project'][change.target],
+                                        **values)
+    elif change.action in ('add_member', 'remove_member'):
+        func = {'add_member': project_identity.add_group_user,
+                'remove_member': project_identity.remove_group_user}
+        func[change.action](request, group_id=ids['group'][change.target],
+                            user_id=ids['user'][change.actor])
+    elif change.actor_type == 'group':
+        func = {'grant': project_identity.add_group_role,
+                'revoke': project_identity.remove_group_role}
+        func[change.action](request, role=ids['role'][change.role],
+                            group=ids['group'][change.actor],
+                            project=ids['project'][change.target])
+    else:
+        func = {'grant': project_identity.add_project_user_role,
+                'revoke': project_identity.remove_project_user_role}
+        func[change.action](request, project=ids['project'][change.target],
+                            user=ids['user'][change.actor],
+                            role=ids['role'][change.role])
+    return None
+
+
+def _created_id(domain, change):
+    """Return the id of the group or project a create change names, when
+    an attempt which failed still created it, or None.
+    """
+    listing = {'create_group': project_identity.iter_groups,
+               'create_project': project_identity.iter_projects}
+    for obj in listing[change.action](domain=domain, name=change.target):
+        if obj.name == change.target:
+            return obj.id
+    return None
+
+
+def _with_retries(func, retries, backoff, recover=None):
+    """Call func, again up to ``retries`` times with exponential backoff
+    while Keystone is unavailable.
+
+    Before each retry ``recover()``, if given, returns the result of a
+    failed attempt which took effect all the same, or None to retry.
+    """
+    attempt = 0
+    while True:
+        try:
+            if attempt and recover is not None:
+                found = recover()
+                if found is not None:
+                    return found
+            return func()
+        except circuit_breaker.SERVICE_ERRORS:
+            if attempt >= retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+
+def source_digest(data):
+    """Return the digest a Checkpoint keeps of the desired state file."""
+    return hashlib.sha1(data).hexdigest()
+
+
+class Checkpoint(object):
+    """A file holding a plan, the digest of the desired state it was
+    computed from and the changes of it already made, so that an
+    interrupted run resumes without reading the live state again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.plan = None
+        self.digest = None
+        self.done = {}
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            return
+        with open(path) as stream:
+            for line in stream:
+                record = json.loads(line)
+                if 'plan' in record:
+                    self.plan = _plan_from_record(record['plan'])
+                    self.digest = record.get('digest')
+                else:
+                    self.done[record['done']] = record.get('id')
+
+    def start(self, plan, digest=None):
+        """Record a new plan, forgetting the progress of any other."""
+        with self._lock:
+            self.plan = plan
+            self.digest = digest
+            self.done = {}
+            with open(self.path, 'w') as stream:
+                stream.write(json.dumps({'plan': plan._asdict(),
+                                         'digest': digest}) + '\n')
+
+    def finish(self):
+        """Remove the file once its plan was made entirely."""
+        with self._lock:
+            self.plan = None
+            self.digest = None
+            self.done = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def record(self, change, created_id=None):
+        key = change_key(change)
+        with self._lock:
+            self.done[key] = created_id
+            with open(self.path, 'a') as stream:
+                stream.write(json.dumps({'done': key,
+                                         'id': created_id}) + '\n')
+
+
+def _plan_from_record(record):
+    stages = [[Change(*(change[:5] + [tuple(tuple(item)
+                                            for item in change[5])]))
+               for change in stage] for stage in record['stages']]
+    return Plan(record['domain'], stages, record['ids'], record['errors'],
+                record['reads'])
+
+
+def apply(request, plan, concurrency=None, retries=None, backoff=None,
+          checkpoint=None, progress=None):
+    """Make the changes of the plan stage by stage, at most
+    ``concurrency`` at once, retrying those failing because Keystone is
+    unavailable.
+
+    Changes the checkpoint records as made are skipped and those made
+    are recorded in it. ``progress(change, error)`` is called after each
+    change. Returns an ApplyResult; failed changes do not raise.
+    """
+    if concurrency is None:
+        concurrency = RECONCILE_SETTING.get('concurrency', 8)
+    if retries is None:
+        retries = RECONCILE_SETTING.get('retries', 3)
+    if backoff is None:
+        backoff = RECONCILE_SETTING.get('backoff', 1.0)
+    ids = dict((kind, dict(names)) for kind, names in plan.ids.items())
+    done = checkpoint.done if checkpoint is not None else {}
+    outcomes = []
+    skipped = []
+
+    def make(change):
+        recover = None
+        if change.action in ('create_group', 'create_project'):
+            # A create which timed out may have been made: it is looked
+            # up rather than made twice.
+            recover = functools.partial(_created_id, plan.domain, change)
+        return _with_retries(
+            lambda: _apply_change(request, plan.domain, ids, change),
+            retries, backoff, recover)
+
+    for stage in plan.stages:
+        ready = []
+        for change in stage:
+            key = change_key(change)
+            if key in done:
+                if done[key] is not None:
+                    kind = change.action.split('_', 1)[1]
+                    ids[kind][change.target] = done[key]
+                continue
+            if any(name not in ids[kind] or ids[kind][name] is None
+                   for kind, name in _required(change)):
+                skipped.append(change)
+            else:
+                ready.append(change)
+        for outcome in parallel.run_bounded(make, ready, concurrency):
+            change = outcome.item
+            if outcome.error is not None:
+                LOG.warning('Unable to %s %s: %s', change.action,
+                            change.target, outcome.error)
+            else:
+                if outcome.result is not None:
+                    kind = change.action.split('_', 1)[1]
+                    ids[kind][change.target] = outcome.result
+                if checkpoint is not None:
+                    checkpoint.record(change, outcome.result)
+            if progress is not None:
+                progress(change, outcome.error)
+            outcomes.append(outcome)
+    return ApplyResult(outcomes, skipped)
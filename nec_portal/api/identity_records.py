@@ -0,0 +1,164 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Compact stand-ins for keystoneclient resources.
+
+A keystoneclient Resource keeps a __dict__, its manager and the raw
+response; a record keeps only the fields the identity panels use, in
+__slots__. Records are read-only, except for the attributes the projects
+table sets to build its tree.
+"""
+
+
+def _restore(cls, values):
+    return cls(**dict(zip(cls.fields, values)))
+
+
+class Record(object):
+    __slots__ = ()
+    fields = ()
+
+    def __init__(self, **values):
+        for field in self.fields:
+            object.__setattr__(self, field, values.get(field))
+
+    @classmethod
+    def from_resource(cls, resource):
+        """Build a record from a keystoneclient resource or any object
+        carrying the fields as attributes.
+        """
+        if isinstance(resource, cls):
+            return resource
+        return cls(**dict((field, getattr(resource, field, None))
+                          for field in cls.fields))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only' % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError('%s is read-only' % type(self).__name__)
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._values()))
+
+    def __reduce__(self):
+        return _restore, (type(self), self._values())
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, ' '.join(
+            '%s=%r' % (field, getattr(self, field)) for field in self.fields))
+
+    def to_dict(self):
+        return dict(zip(self.fields, self._values()))
+
+
+class UserRecord(Record):
+    fields = ('id', 'name', 'email', 'enabled', 'domain_id',
+              'default_project_id', 'description')
+    __slots__ = fields
+
+
+class GroupRecord(Record):
+    fields = ('id', 'name', 'description', 'domain_id')
+    __slots__ = fields
+
+
+class ProjectRecord(Record):
+    fields = ('id', 'name', 'description', 'enabled', 'domain_id',
+              'parent_id')
+    __slots__ = fields + ('parent', 'immediate_subprojects')
+
+    # Set by the projects table while it arranges projects in a tree.
+    _tree_attributes = ('parent', 'immediate_subprojects')
+
+    def __init__(self, **values):
+        super(ProjectRecord, self).__init__(**values)
+        object.__setattr__(self, 'parent', None)
+        object.__setattr__(self, 'immediate_subprojects', [])
+
+    def __setattr__(self, name, value):
+        if name in self._tree_attributes:
+            object.__setattr__(self, name, value)
+        else:
+            super(ProjectRecord, self).__setattr__(name, value)
+
+
+class RoleAssignmentRecord(Record):
+    """A role assignment, with the user/group/role/scope dicts of
+    keystoneclient role assignments derived from the flat fields.
+    """
+    fields = ('role_id', 'actor_type', 'actor_id', 'project_id',
+              'domain_id', 'inherited')
+    __slots__ = fields
+
+    @classmethod
+    def from_resource(cls, assignment):
+        if isinstance(assignment, cls):
+            return assignment
+        if hasattr(assignment, 'user'):
+            actor_type, actor_id = 'user', assignment.user['id']
+        elif hasattr(assignment, 'group'):
+            actor_type, actor_id = 'group', assignment.group['id']
+        else:
+            actor_type, actor_id = None, None
+        scope = getattr(assignment, 'scope', None) or {}
+        return cls(role_id=assignment.role['id'],
+                   actor_type=actor_type, actor_id=actor_id,
+                   project_id=scope.get('project', {}).get('id'),
+                   domain_id=scope.get('domain', {}).get('id'),
+                   inherited=bool(scope.get('OS-INHERIT:inherited_to')))
+
+    def _actor(self, actor_type):
+        if self.actor_type != actor_type:
+            raise AttributeError(actor_type)
+        return {'id': self.actor_id}
+
+    @property
+    def user(self):
+        return self._actor('user')
+
+    @property
+    def group(self):
+        return self._actor('group')
+
+    @property
+    def role(self):
+        return {'id': self.role_id}
+
+    @property
+    def scope(self):
+        scope = {}
+        if self.project_id:
+            scope['project'] = {'id': self.project_id}
+        if self.domain_id:
+            scope['domain'] = {'id': self.domain_id}
+        if self.inherited:
+            scope['OS-INHERIT:inherited_to'] = 'projects'
+        return scope
+
+
+def to_records(record_class, resources):
+    """Convert a listing to records; None and lists of records pass."""
+    if resources is None:
+        return None
+    return [record_class.from_resource(resource) for resource in resources]
@@ -0,0 +1,480 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""A local SQLite copy of the identity data the panels list.
+
+The replica is filled by the ``sync_identity_replica`` management command
+and shared by all dashboard workers through the file. Workers only read it,
+except for applying the changes they make themselves through
+project_identity, so that it does not lag behind their own writes.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import sqlite3
+import time
+
+from openstack_dashboard.api import base
+
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+REPLICA_SETTING = getattr(nec_set, 'IDENTITY_REPLICA', {})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    enabled INTEGER,
+    domain_id TEXT,
+    default_project_id TEXT,
+    description TEXT
+);
+CREATE INDEX IF NOT EXISTS users_name ON users (name, id);
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    domain_id TEXT
+);
+CREATE INDEX IF NOT EXISTS groups_name ON groups (name, id);
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    enabled INTEGER,
+    domain_id TEXT,
+    parent_id TEXT
+);
+CREATE INDEX IF NOT EXISTS projects_parent ON projects (parent_id);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id TEXT,
+    user_id TEXT,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS group_members_user ON group_members (user_id);
+CREATE TABLE IF NOT EXISTS role_assignments (
+    role_id TEXT,
+    actor_type TEXT,
+    actor_id TEXT,
+    project_id TEXT,
+    domain_id TEXT,
+    inherited INTEGER DEFAULT 0,
+    PRIMARY KEY (project_id, actor_type, actor_id, role_id, domain_id,
+                 inherited)
+);
+CREATE INDEX IF NOT EXISTS role_assignments_actor
+    ON role_assignments (actor_type, actor_id);
+"""
+
+USER_COLUMNS = ('id', 'name', 'email', 'enabled', 'domain_id',
+                'default_project_id', 'description')
+GROUP_COLUMNS = ('id', 'name', 'description', 'domain_id')
+PROJECT_COLUMNS = ('id', 'name', 'description', 'enabled', 'domain_id',
+                   'parent_id')
+ASSIGNMENT_COLUMNS = ('role_id', 'actor_type', 'actor_id', 'project_id',
+                      'domain_id', 'inherited')
+
+
+def _id(value):
+    return getattr(value, 'id', value)
+
+
+def _inherited(arguments):
+    return 1 if arguments.get('inherited') else 0
+
+
+def _values(obj, columns):
+    values = []
+    for column in columns:
+        value = getattr(obj, column, None)
+        if column == 'enabled' and value is not None:
+            value = 1 if value else 0
+        values.append(value)
+    return tuple(values)
+
+
+def assignment_values(assignment):
+    """Flatten a keystoneclient role assignment into a table row.
+
+    Returns None for assignments which are neither on a user nor a group.
+    """
+    if hasattr(assignment, 'user'):
+        actor_type, actor_id = 'user', assignment.user['id']
+    elif hasattr(assignment, 'group'):
+        actor_type, actor_id = 'group', assignment.group['id']
+    else:
+        return None
+    scope = getattr(assignment, 'scope', None) or {}
+    inherited = 1 if scope.get('OS-INHERIT:inherited_to') else 0
+    # Ids are stored as '' rather than NULL so that the primary key keeps
+    # assignments unique.
+    return (assignment.role['id'], actor_type, actor_id,
+            scope.get('project', {}).get('id') or '',
+            scope.get('domain', {}).get('id') or '',
+            inherited)
+
+
+def fetch_snapshot(client):
+    """Fetch everything the identity listings need from Keystone.
+
+    Role assignments are returned flattened by assignment_values() and
+    group membership as (group id, user id) pairs.
+    """
+    groups = client.groups.list()
+    assignments = [assignment_values(a)
+                   for a in client.role_assignments.list()]
+    return {
+        'users': client.users.list(),
+        'groups': groups,
+        'projects': client.projects.list(),
+        'role_assignments': [a for a in assignments if a is not None],
+        'group_members': [(group.id, user.id)
+                          for group in groups
+                          for user in client.users.list(group=group.id)],
+    }
+
+
+def _wrap(row):
+    data = dict(row)
+    if data.get('enabled') is not None:
+        data['enabled'] = bool(data['enabled'])
+    return base.APIDictWrapper(data)
+
+
+class IdentityReplica(object):
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+
+    @contextlib.contextmanager
+    def _connect(self, path=None):
+        conn = sqlite3.connect(path or self.path, timeout=self.timeout)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def synced_at(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta "
+                               "WHERE key = 'synced_at'").fetchone()
+        return float(row['value']) if row else None
+
+    def is_fresh(self, max_age):
+        if not self.exists():
+            return False
+        try:
+            synced_at = self.synced_at()
+        except sqlite3.Error:
+            LOG.exception('Unable to read the identity replica %s.',
+                          self.path)
+            return False
+        if synced_at is None:
+            return False
+        return max_age is None or time.time() - synced_at <= max_age
+
+    def sync(self, client):
+        """Rebuild the replica from Keystone.
+
+        The new copy is written next to the current one and moved over it,
+        so readers always see a complete replica.
+        """
+        snapshot = fetch_snapshot(client)
+        users = snapshot['users']
+        groups = snapshot['groups']
+        projects = snapshot['projects']
+        assignments = snapshot['role_assignments']
+        members = snapshot['group_members']
+
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with self._connect(tmp_path) as conn:
+            conn.executescript(SCHEMA)
+            with conn:
+                self._insert(conn, 'users', USER_COLUMNS,
+                             [_values(u, USER_COLUMNS) for u in users])
+                self._insert(conn, 'groups', GROUP_COLUMNS,
+                             [_values(g, GROUP_COLUMNS) for g in groups])
+                self._insert(conn, 'projects', PROJECT_COLUMNS,
+                             [_values(p, PROJECT_COLUMNS) for p in projects])
+                self._insert(conn, 'group_members', ('group_id', 'user_id'),
+                             members)
+                self._insert(conn, 'role_assignments', ASSIGNMENT_COLUMNS,
+                             assignments)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) "
+                             "VALUES ('synced_at', ?)", (str(time.time()),))
+        os.rename(tmp_path, self.path)
+        return {'users': len(users), 'groups': len(groups),
+                'projects': len(projects), 'group_members': len(members),
+                'role_assignments': len(assignments)}
+
+    @staticmethod
+    def _insert(conn, table, columns, rows):
+        conn.executemany(
+            "INSERT OR REPLACE INTO %s (%s) VALUES (%s)" % (
+                table, ', '.join(columns), ', '.join('?' * len(columns))),
+            rows)
+
+    @staticmethod
+    def _filter_clause(columns, filters, marker, alias):
+        clauses = []
+        params = []
+        for key, value in sorted((filters or {}).items()):
+            if key == 'name':
+                clauses.append("%s.name LIKE ?" % alias)
+                params.append('%%%s%%' % value)
+            elif key in columns:
+                clauses.append("%s.%s = ?" % (alias, key))
+                params.append(value)
+            else:
+                LOG.debug('Ignoring unsupported replica filter %s.', key)
+        if marker:
+            clauses.append(
+                "(%(a)s.name > (SELECT name FROM %(t)s WHERE id = ?) OR "
+                "(%(a)s.name = (SELECT name FROM %(t)s WHERE id = ?) AND "
+                "%(a)s.id > ?))" % {'a': alias, 't': alias})
+            params.extend([marker, marker, marker])
+        return clauses, params
+
+    def _select(self, table, columns, where, params, filters=None,
+                marker=None, limit=None):
+        clauses, extra = self._filter_clause(columns, filters, marker, table)
+        sql = "SELECT %s FROM %s WHERE %s" % (
+            ', '.join('%s.%s' % (table, c) for c in columns), table,
+            ' AND '.join([where] + clauses))
+        sql += " ORDER BY %s.name, %s.id" % (table, table)
+        if limit:
+            sql += " LIMIT %d" % int(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, list(params) + extra).fetchall()
+        return [_wrap(row) for row in rows]
+
+    def project_users(self, project, filters=None, marker=None, limit=None):
+        return self._select(
+            'users', USER_COLUMNS,
+            "users.id IN (SELECT actor_id FROM role_assignments "
+            "WHERE project_id = ? AND actor_type = 'user')",
+            [project], filters, marker, limit)
+
+    def group_users(self, project, group, filters=None, marker=None,
+                    limit=None):
+        return self._select(
+            'users', USER_COLUMNS,
+            "users.id IN (SELECT user_id FROM group_members "
+            "WHERE group_id = ?) AND "
+            "users.id IN (SELECT actor_id FROM role_assignments "
+            "WHERE project_id = ? AND actor_type = 'user')",
+            [group, project], filters, marker, limit)
+
+    def project_groups(self, project, domain=None, filters=None, marker=None,
+                       limit=None):
+        filters = dict(filters or {})
+        if domain:
+            filters['domain_id'] = domain
+        return self._select(
+            'groups', GROUP_COLUMNS,
+            "groups.id IN (SELECT actor_id FROM role_assignments "
+            "WHERE project_id = ? AND actor_type = 'group')",
+            [project], filters, marker, limit)
+
+    def project_users_roles(self, project):
+        users_roles = collections.defaultdict(list)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT actor_id, role_id FROM role_assignments "
+                "WHERE project_id = ? AND actor_type = 'user'",
+                [project]).fetchall()
+        for row in rows:
+            users_roles[row['actor_id']].append(row['role_id'])
+        return users_roles
+
+    def project_effective_roles(self, project):
+        """Return {user id: frozenset of role ids} held on the project
+        directly, through a group or inherited from a parent project.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "WITH RECURSIVE ancestors(id) AS ("
+                "SELECT parent_id FROM projects WHERE id = ? "
+                "UNION "
+                "SELECT projects.parent_id FROM projects "
+                "JOIN ancestors ON projects.id = ancestors.id), "
+                "applicable AS ("
+                "SELECT * FROM role_assignments "
+                "WHERE project_id = ? AND inherited = 0 "
+                "UNION ALL "
+                "SELECT * FROM role_assignments "
+                "WHERE project_id IN (SELECT id FROM ancestors) "
+                "AND inherited = 1) "
+                "SELECT actor_id AS user_id, role_id FROM applicable "
+                "WHERE actor_type = 'user' "
+                "UNION "
+                "SELECT group_members.user_id, applicable.role_id "
+                "FROM applicable JOIN group_members "
+                "ON group_members.group_id = applicable.actor_id "
+                "WHERE applicable.actor_type = 'group'",
+                [project, project]).fetchall()
+        roles = collections.defaultdict(set)
+        for row in rows:
+            roles[row['user_id']].add(row['role_id'])
+        return dict((user_id, frozenset(role_ids))
+                    for user_id, role_ids in roles.items())
+
+    def apply_change(self, operation, arguments, result):
+        """Apply a change made through project_identity to the replica."""
+        handler = getattr(self, '_apply_%s' % operation, None)
+        if handler is None:
+            return
+        with self._connect() as conn:
+            with conn:
+                handler(conn, arguments, result)
+
+    def _upsert(self, conn, table, columns, obj):
+        if obj is not None and getattr(obj, 'id', None):
+            self._insert(conn, table, columns, [_values(obj, columns)])
+
+    def _apply_user_create(self, conn, arguments, result):
+        self._upsert(conn, 'users', USER_COLUMNS, result)
+
+    def _apply_user_update(self, conn, arguments, result):
+        data = dict(arguments.get('data') or {})
+        if 'project' in data:
+            data['default_project_id'] = data.pop('project')
+        for column in USER_COLUMNS[1:]:
+            if column in data:
+                value = data[column]
+                if column == 'enabled' and value is not None:
+                    value = 1 if value else 0
+                conn.execute("UPDATE users SET %s = ? WHERE id = ?" % column,
+                             (value, _id(arguments['user'])))
+
+    def _apply_user_delete(self, conn, arguments, result):
+        user_id = arguments['user_id']
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.execute("DELETE FROM group_members WHERE user_id = ?",
+                     (user_id,))
+        conn.execute("DELETE FROM role_assignments "
+                     "WHERE actor_type = 'user' AND actor_id = ?",
+                     (user_id,))
+
+    def _apply_user_update_project(self, conn, arguments, result):
+        conn.execute("UPDATE users SET default_project_id = ? WHERE id = ?",
+                     (_id(arguments['project']), _id(arguments['user'])))
+
+    def _apply_add_project_user_role(self, conn, arguments, result):
+        if arguments.get('group'):
+            actor = ('group', _id(arguments['group']))
+        else:
+            actor = ('user', _id(arguments['user']))
+        self._insert(conn, 'role_assignments', ASSIGNMENT_COLUMNS,
+                     [(_id(arguments['role']),) + actor +
+                      (_id(arguments['project']), '',
+                       _inherited(arguments))])
+
+    def _apply_remove_project_user_role(self, conn, arguments, result):
+        conn.execute("DELETE FROM role_assignments WHERE role_id = ? AND "
+                     "actor_type = 'user' AND actor_id = ? AND "
+                     "project_id = ? AND inherited = ?",
+                     (_id(arguments['role']), _id(arguments['user']),
+                      _id(arguments['project']), _inherited(arguments)))
+
+    def _apply_project_create(self, conn, arguments, result):
+        self._upsert(conn, 'projects', PROJECT_COLUMNS, result)
+
+    def _apply_project_update(self, conn, arguments, result):
+        self._upsert(conn, 'projects', PROJECT_COLUMNS, result)
+
+    def _apply_project_delete(self, conn, arguments, result):
+        project_id = _id(arguments['project'])
+        conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        conn.execute("DELETE FROM role_assignments WHERE project_id = ?",
+                     (project_id,))
+
+    def _apply_group_create(self, conn, arguments, result):
+        self._upsert(conn, 'groups', GROUP_COLUMNS, result)
+
+    def _apply_group_update(self, conn, arguments, result):
+        self._upsert(conn, 'groups', GROUP_COLUMNS, result)
+
+    def _apply_group_delete(self, conn, arguments, result):
+        group_id = arguments['group_id']
+        conn.execute("DELETE FROM groups WHERE id = ?", (group_id,))
+        conn.execute("DELETE FROM group_members WHERE group_id = ?",
+                     (group_id,))
+        conn.execute("DELETE FROM role_assignments "
+                     "WHERE actor_type = 'group' AND actor_id = ?",
+                     (group_id,))
+
+    def _apply_add_group_role(self, conn, arguments, result):
+        self._insert(conn, 'role_assignments', ASSIGNMENT_COLUMNS,
+                     [(_id(arguments['role']), 'group',
+                       _id(arguments['group']), _id(arguments['project']),
+                       '', _inherited(arguments))])
+
+    def _apply_remove_group_role(self, conn, arguments, result):
+        conn.execute("DELETE FROM role_assignments WHERE role_id = ? AND "
+                     "actor_type = 'group' AND actor_id = ? AND "
+                     "project_id = ? AND inherited = ?",
+                     (_id(arguments['role']), _id(arguments['group']),
+                      _id(arguments['project']), _inherited(arguments)))
+
+    def _apply_add_group_user(self, conn, arguments, result):
+        self._insert(conn, 'group_members', ('group_id', 'user_id'),
+                     [(arguments['group_id'], arguments['user_id'])])
+
+    def _apply_remove_group_user(self, conn, arguments, result):
+        conn.execute("DELETE FROM group_members "
+                     "WHERE group_id = ? AND user_id = ?",
+                     (arguments['group_id'], arguments['user_id']))
+
+
+def get_replica(fresh=True):
+    """Return the configured replica, or None when it is disabled.
+
+    With ``fresh`` None is also returned while the replica is missing or
+    older than the configured 'max_age', so that callers fall back to
+    Keystone.
+    """
+    if not REPLICA_SETTING.get('enabled', False):
+        return None
+    replica = IdentityReplica(REPLICA_SETTING['path'],
+                              timeout=REPLICA_SETTING.get('timeout', 5.0))
+    if fresh and not replica.is_fresh(REPLICA_SETTING.get('max_age')):
+        return None
+    return replica
+
+
+def _apply_identity_change(sender, arguments=None, result=None, **kwargs):
+    replica = get_replica(fresh=False)
+    if replica is not None and replica.exists():
+        replica.apply_change(sender, arguments, result)
+
+
+signals.identity_changed.connect(_apply_identity_change,
+                                 dispatch_uid='nec_portal.identity_replica')
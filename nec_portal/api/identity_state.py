@@ -0,0 +1,234 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""An in-process copy of the identity data the panels list.
+
+The state is loaded in full once and then kept current by applying
+Keystone notifications one at a time (see identity_notifications). It
+answers the same membership queries as the SQLite replica.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from nec_portal.api import effective_roles
+from nec_portal.api import identity_records
+from nec_portal.api import identity_replica
+
+LOG = logging.getLogger(__name__)
+
+
+def _id(value):
+    return getattr(value, 'id', value)
+
+
+def select_objects(objects, filters=None, marker=None, limit=None):
+    """Filter and page a listing the way the identity replica does."""
+    if not (filters or marker or limit):
+        return objects
+    selected = []
+    for obj in objects:
+        matched = True
+        for key, value in (filters or {}).items():
+            if key == 'name':
+                matched = value.lower() in (obj.name or '').lower()
+            else:
+                matched = getattr(obj, key, None) == value
+            if not matched:
+                break
+        if matched:
+            selected.append(obj)
+    selected.sort(key=lambda obj: (obj.name, obj.id))
+    if marker:
+        ids = [obj.id for obj in selected]
+        if marker in ids:
+            selected = selected[ids.index(marker) + 1:]
+    if limit:
+        selected = selected[:limit]
+    return selected
+
+
+class IdentityState(object):
+    """Users, groups, projects, membership and role assignments by id.
+
+    Users, groups and projects are kept as compact identity_records and
+    role assignments as the tuples built by
+    identity_replica.assignment_values().
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded_at = None
+        self._reset()
+
+    def _reset(self):
+        self.users = {}
+        self.groups = {}
+        self.projects = {}
+        self.members = collections.defaultdict(set)
+        self.assignments = collections.defaultdict(set)
+
+    @property
+    def ready(self):
+        return self.loaded_at is not None
+
+    def load(self, client):
+        """Replace the whole state with a fresh copy from Keystone."""
+        snapshot = identity_replica.fetch_snapshot(client)
+        members = collections.defaultdict(set)
+        for group_id, user_id in snapshot['group_members']:
+            members[group_id].add(user_id)
+        assignments = collections.defaultdict(set)
+        for assignment in snapshot['role_assignments']:
+            assignments[assignment[3]].add(assignment)
+        with self._lock:
+            self.users = self._index(identity_records.UserRecord,
+                                     snapshot['users'])
+            self.groups = self._index(identity_records.GroupRecord,
+                                      snapshot['groups'])
+            self.projects = self._index(identity_records.ProjectRecord,
+                                        snapshot['projects'])
+            self.members = members
+            self.assignments = assignments
+            self.loaded_at = time.time()
+
+    @staticmethod
+    def _index(record_class, resources):
+        return dict((record.id, record) for record in
+                    identity_records.to_records(record_class, resources))
+
+    def _actor_ids(self, project, actor_type):
+        return set(a[2] for a in self.assignments.get(project, ())
+                   if a[1] == actor_type)
+
+    def project_users(self, project, filters=None, marker=None, limit=None):
+        with self._lock:
+            users = [self.users[user_id]
+                     for user_id in self._actor_ids(project, 'user')
+                     if user_id in self.users]
+        return select_objects(users, filters, marker, limit)
+
+    def group_users(self, project, group, filters=None, marker=None,
+                    limit=None):
+        with self._lock:
+            user_ids = (self.members.get(group, set()) &
+                        self._actor_ids(project, 'user'))
+            users = [self.users[user_id] for user_id in user_ids
+                     if user_id in self.users]
+        return select_objects(users, filters, marker, limit)
+
+    def project_groups(self, project, domain=None, filters=None, marker=None,
+                       limit=None):
+        with self._lock:
+            groups = [self.groups[group_id]
+                      for group_id in self._actor_ids(project, 'group')
+                      if group_id in self.groups]
+        if domain:
+            groups = [g for g in groups
+                      if getattr(g, 'domain_id', None) == domain]
+        return select_objects(groups, filters, marker, limit)
+
+    def project_users_roles(self, project):
+        users_roles = collections.defaultdict(list)
+        with self._lock:
+            for assignment in self.assignments.get(project, ()):
+                if assignment[1] == 'user':
+                    users_roles[assignment[2]].append(assignment[0])
+        return users_roles
+
+    def _ancestor_ids(self, project):
+        ancestor_ids = []
+        parent_id = getattr(self.projects.get(project), 'parent_id', None)
+        while parent_id and parent_id not in ancestor_ids:
+            ancestor_ids.append(parent_id)
+            parent_id = getattr(self.projects.get(parent_id), 'parent_id',
+                                None)
+        return ancestor_ids
+
+    def project_effective_roles(self, project):
+        """Roles held on the project directly, through a group or
+        inherited from a parent project.
+        """
+        with self._lock:
+            assignments = [(a[1], a[2], a[0])
+                           for a in self.assignments.get(project, ())
+                           if not a[5]]
+            for parent_id in self._ancestor_ids(project):
+                assignments.extend((a[1], a[2], a[0])
+                                   for a in self.assignments.get(parent_id,
+                                                                 ())
+                                   if a[5])
+            members = dict((a[1], set(self.members.get(a[1], ())))
+                           for a in assignments if a[0] == 'group')
+        return effective_roles.expand(
+            assignments, lambda group_id: members.get(group_id, ()))
+
+    def put_user(self, user):
+        with self._lock:
+            self.users[user.id] = identity_records.UserRecord.from_resource(
+                user)
+
+    def put_group(self, group, member_ids=None):
+        with self._lock:
+            self.groups[group.id] = (
+                identity_records.GroupRecord.from_resource(group))
+            if member_ids is not None:
+                self.members[group.id] = set(member_ids)
+
+    def put_project(self, project):
+        with self._lock:
+            self.projects[project.id] = (
+                identity_records.ProjectRecord.from_resource(project))
+
+    def _drop_actor(self, actor_type, actor_id):
+        for project_id, assignments in self.assignments.items():
+            self.assignments[project_id] = set(
+                a for a in assignments
+                if not (a[1] == actor_type and a[2] == actor_id))
+
+    def delete_user(self, user_id):
+        with self._lock:
+            self.users.pop(user_id, None)
+            for member_ids in self.members.values():
+                member_ids.discard(user_id)
+            self._drop_actor('user', user_id)
+
+    def delete_group(self, group_id):
+        with self._lock:
+            self.groups.pop(group_id, None)
+            self.members.pop(group_id, None)
+            self._drop_actor('group', group_id)
+
+    def delete_project(self, project_id):
+        with self._lock:
+            self.projects.pop(project_id, None)
+            self.assignments.pop(project_id, None)
+
+    def add_assignment(self, assignment):
+        with self._lock:
+            self.assignments[assignment[3]].add(assignment)
+
+    def remove_assignment(self, assignment):
+        with self._lock:
+            self.assignments.get(assignment[3], set()).discard(assignment)
+
+    def add_member(self, group_id, user_id):
+        with self._lock:
+            self.members[group_id].add(user_id)
+
+    def remove_member(self, group_id, user_id):
+        with self._lock:
+            self.members.get(group_id, set()).discard(user_id)
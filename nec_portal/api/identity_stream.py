@@ -0,0 +1,77 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Reads Keystone v3 collections one member at a time.
+
+The response body is parsed as it arrives with ijson, so that a listing
+of the whole domain is never held in memory, and a consumer which stops
+iterating closes the connection. Pages are followed through the
+collection's ``links.next`` when Keystone returns one.
+"""
+
+import requests
+
+from keystoneclient import exceptions as keystone_exceptions
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def iter_members(stream, key, links=None):
+    """Yield the members of the ``key`` array of a JSON document.
+
+    The ``links`` of the collection are stored into the given dict.
+    """
+    item_prefix = key + '.item'
+    builder = None
+    for prefix, event, value in ijson.parse(stream):
+        if prefix == item_prefix and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event == 'end_map':
+                yield builder.value
+                builder = None
+        elif (links is not None and prefix.startswith('links.') and
+                event in ('string', 'null')):
+            links[prefix[len('links.'):]] = value
+
+
+def iter_collection(url, key, params=None, headers=None, timeout=None,
+                    verify=True):
+    """Yield the members of the collection at ``url``, page by page."""
+    while url:
+        try:
+            response = requests.get(url, params=params, headers=headers,
+                                    timeout=timeout, verify=verify,
+                                    stream=True)
+        except requests.exceptions.Timeout:
+            raise keystone_exceptions.RequestTimeout(
+                'Request to %s timed out' % url)
+        except requests.exceptions.ConnectionError:
+            raise keystone_exceptions.ConnectionRefused(
+                'Unable to establish connection to %s' % url)
+        links = {}
+        try:
+            if response.status_code >= 400:
+                raise keystone_exceptions.from_response(response, 'GET', url)
+            response.raw.decode_content = True
+            for member in iter_members(response.raw, key, links):
+                yield member
+        finally:
+            response.close()
+        # The next link carries the query of the following page.
+        url, params = links.get('next'), None
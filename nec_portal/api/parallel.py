@@ -0,0 +1,64 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import collections
+import threading
+
+from nec_portal.api import deadline
+
+# The outcome of calling a function for one item: either result or error
+# is set.
+Outcome = collections.namedtuple('Outcome', ['item', 'result', 'error'])
+
+
+def run_bounded(func, items, concurrency):
+    """Call ``func(item)`` for every item, at most ``concurrency`` at once.
+
+    Returns the outcomes in the order of ``items``; exceptions are
+    captured rather than raised. The deadline of the calling thread
+    applies to the workers as well.
+    """
+    items = list(items)
+    outcomes = [None] * len(items)
+    pending = iter(enumerate(items))
+    lock = threading.Lock()
+    budget = deadline.current()
+
+    def work():
+        previous = deadline.install(budget)
+        try:
+            while True:
+                with lock:
+                    try:
+                        index, item = next(pending)
+                    except StopIteration:
+                        return
+                try:
+                    outcomes[index] = Outcome(item, func(item), None)
+                except Exception as e:
+                    outcomes[index] = Outcome(item, None, e)
+        finally:
+            deadline.install(previous)
+
+    workers = min(max(concurrency or 1, 1), len(items))
+    if workers <= 1:
+        work()
+        return outcomes
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
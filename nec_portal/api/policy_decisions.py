@@ -0,0 +1,113 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Authorization decisions remembered for the duration of a request.
+
+The row actions of a table ask the same policy rules, with the same
+target, and the same keystone_can_edit_* capabilities once per row. The
+answers are kept on the request, along with the number of decisions and
+the time spent making them, which server_timing() reports.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from openstack_dashboard import api
+from openstack_dashboard import policy
+
+from nec_portal.local import nec_portal_settings as nec_set
+
+AUTHORIZATION_SETTING = getattr(nec_set, 'IDENTITY_AUTHORIZATION', {})
+REQUEST_ATTRIBUTE = '_nec_portal_policy_decisions'
+
+
+class Decisions(object):
+    """The decisions made for one request."""
+
+    def __init__(self):
+        self.results = {}
+        self.checks = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def decide(self, key, decision):
+        with self._lock:
+            self.checks += 1
+            if key in self.results:
+                self.hits += 1
+                return self.results[key]
+        start = time.time()
+        try:
+            result = decision()
+        finally:
+            with self._lock:
+                self.seconds += time.time() - start
+        if AUTHORIZATION_SETTING.get('memoize', True):
+            with self._lock:
+                self.results[key] = result
+        return result
+
+
+def decisions(request):
+    """Return the Decisions of the request."""
+    found = getattr(request, REQUEST_ATTRIBUTE, None)
+    if found is None:
+        found = Decisions()
+        setattr(request, REQUEST_ATTRIBUTE, found)
+    return found
+
+
+def check(rules, request, target=None):
+    """policy.check(), asked once per request for the same rules and
+    target.
+    """
+    key = ('policy', tuple(tuple(rule) for rule in rules),
+           repr(sorted((target or {}).items())))
+    return decisions(request).decide(
+        key, lambda: policy.check(rules, request, target=target or {}))
+
+
+def can_edit(request, kind):
+    """keystone_can_edit_<kind>() of 'user', 'group' or 'project', asked
+    once per request.
+    """
+    return decisions(request).decide(
+        ('can_edit', kind),
+        getattr(api.keystone, 'keystone_can_edit_%s' % kind))
+
+
+def server_timing(request):
+    """Return the Server-Timing value reporting the authorization made
+    for the request, or None if there was none.
+    """
+    found = getattr(request, REQUEST_ATTRIBUTE, None)
+    if found is None or not found.checks:
+        return None
+    return 'authz;dur=%.1f;desc="%d checks, %d memoized"' % (
+        found.seconds * 1000, found.checks, found.hits)
+
+
+class PolicyDecisionMixin(object):
+    """Makes a table action check its policy_rules through check()."""
+
+    def _allowed(self, request, datum):
+        if self.policy_rules and \
+                getattr(settings, 'POLICY_CHECK_FUNCTION', None):
+            target = self.get_policy_target(request, datum)
+            return (check(self.policy_rules, request, target) and
+                    self.allowed(request, datum))
+        return self.allowed(request, datum)
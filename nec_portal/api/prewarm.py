@@ -0,0 +1,128 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Fills the warm store of a worker with the identity data its first
+pages need, so that they do not all hit Keystone cold.
+"""
+
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+
+from django.core.cache import cache
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+PREWARM_SETTING = getattr(nec_set, 'IDENTITY_PREWARM', {})
+SLOT_KEY = 'nec_portal:identity_prewarm:slot:%d'
+
+
+def _tasks(projects, domains):
+    tasks = [('roles', project_identity.role_list.warm, (None,))]
+    for domain_id in domains:
+        tasks.append(('domain %s' % domain_id,
+                      project_identity.domain_get.warm, (None, domain_id)))
+    for project_id in projects:
+        tasks.extend([
+            ('users of %s' % project_id,
+             project_identity._project_user_list.warm, (project_id,)),
+            ('groups of %s' % project_id,
+             project_identity._project_group_list.warm, (project_id,)),
+            ('roles of %s' % project_id,
+             project_identity._project_users_roles.warm,
+             (None, project_id)),
+        ])
+    return tasks
+
+
+def prewarm(projects=None, domains=None, concurrency=None):
+    """Fetch the role catalog, the domains and the membership of the
+    projects into the warm store.
+
+    Returns one parallel.Outcome per fetch, whose item is a
+    (description, function, arguments) tuple.
+    """
+    if projects is None:
+        projects = PREWARM_SETTING.get('projects', [])
+    if domains is None:
+        domains = PREWARM_SETTING.get('domains', [])
+    if concurrency is None:
+        concurrency = PREWARM_SETTING.get('concurrency', 4)
+    return parallel.run_bounded(lambda task: task[1](*task[2]),
+                                _tasks(projects, domains), concurrency)
+
+
+@contextlib.contextmanager
+def fleet_slot(slots, wait, lease):
+    """Take one of ``slots`` slots shared by all workers through the
+    Django cache, waiting at most ``wait`` seconds for one to be free.
+
+    Yields whether a slot was taken. A slot is released when the block
+    ends, or after ``lease`` seconds should the worker die. Without a
+    cache shared between workers the limit only applies per process.
+    """
+    key = None
+    give_up_at = time.time() + wait
+    while key is None:
+        for slot in range(slots):
+            if cache.add(SLOT_KEY % slot, os.getpid(), lease):
+                key = SLOT_KEY % slot
+                break
+        else:
+            if time.time() >= give_up_at:
+                break
+            time.sleep(random.uniform(0.5, 2.0))
+    try:
+        yield key is not None
+    finally:
+        if key is not None:
+            cache.delete(key)
+
+
+def _prewarm_in_background():
+    time.sleep(random.uniform(0, PREWARM_SETTING.get('jitter', 30)))
+    with fleet_slot(PREWARM_SETTING.get('fleet_concurrency', 2),
+                    PREWARM_SETTING.get('fleet_wait', 300),
+                    PREWARM_SETTING.get('fleet_lease', 120)) as taken:
+        if not taken:
+            LOG.info('Skipped pre-warming identity data; too many workers '
+                     'are pre-warming already.')
+            return
+        start = time.time()
+        outcomes = prewarm()
+    failed = [outcome.item[0] for outcome in outcomes if outcome.error]
+    if failed:
+        LOG.warning('Unable to pre-warm identity data: %s.',
+                    ', '.join(failed))
+    LOG.info('Pre-warmed %d of %d identity listings in %.1f seconds.',
+             len(outcomes) - len(failed), len(outcomes), time.time() - start)
+
+
+def start_background():
+    """Start pre-warming in a daemon thread, so that the worker is ready
+    to serve right away. Returns the thread, or None when disabled.
+    """
+    if not PREWARM_SETTING.get('enabled', False):
+        return None
+    thread = threading.Thread(target=_prewarm_in_background,
+                              name='identity-prewarm')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,137 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Deletes a project together with all of its subprojects.
+
+Keystone refuses to delete a project which still has children, so the
+subtree is deleted one level at a time from the leaves up, the projects
+of a level concurrently. A project whose subprojects could not all be
+deleted is skipped rather than attempted.
+"""
+
+import collections
+import logging
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+WRITE_CONCURRENCY = getattr(nec_set, 'IDENTITY_WRITE_CONCURRENCY', 8)
+
+# The projects deleted, the (project id, error) pairs of those which could
+# not be, and the projects left because a subproject was not deleted.
+CascadeResult = collections.namedtuple('CascadeResult',
+                                       ['deleted', 'failed', 'skipped'])
+
+
+class ProtectedProject(Exception):
+    """The subtree to delete holds a project which must not be deleted."""
+
+
+def subtree_levels(root_id, subtree):
+    """Return the project ids of a subtree level by level, the root first.
+
+    ``subtree`` is the nested {project id: subtree or None} dict Keystone
+    returns for ``subtree_as_ids``. Also returns {project id: parent id}.
+    """
+    levels = [[root_id]]
+    parents = {}
+    current = [(root_id, subtree)]
+    while current:
+        level = []
+        following = []
+        for parent_id, children in current:
+            for child_id, grandchildren in sorted((children or {}).items()):
+                if child_id in parents or child_id == root_id:
+                    continue
+                parents[child_id] = parent_id
+                level.append(child_id)
+                following.append((child_id, grandchildren))
+        if level:
+            levels.append(level)
+        current = following
+    return levels, parents
+
+
+def _revoke_assignments(request, project_id):
+    """Revoke every role assignment on the project, including the ones
+    inherited to its subprojects.
+    """
+    for assignment in list(project_identity.iter_role_assignments(
+            project=project_id)):
+        kwargs = {}
+        if project_identity._is_inherited(assignment):
+            kwargs['inherited'] = True
+        if hasattr(assignment, 'group'):
+            project_identity.remove_group_role(
+                request, role=assignment.role['id'],
+                group=assignment.group['id'], project=project_id, **kwargs)
+        elif hasattr(assignment, 'user'):
+            project_identity.remove_project_user_role(
+                request, project=project_id, user=assignment.user['id'],
+                role=assignment.role['id'], **kwargs)
+
+
+def cascade_delete(request, project_id, revoke_assignments=False,
+                   concurrency=None, progress=None, protected=()):
+    """Delete the project and its whole subtree, leaves first.
+
+    With ``revoke_assignments`` the role assignments on each project are
+    revoked before it is deleted, for deployments where Keystone leaves
+    them behind. ``progress(project_id, error, done, total)`` is called
+    after each project. Raises ProtectedProject, deleting nothing, when
+    one of the ``protected`` project ids is in the subtree. Returns a
+    CascadeResult.
+    """
+    if concurrency is None:
+        concurrency = WRITE_CONCURRENCY
+    subtree = project_identity.project_subtree(request, project_id)
+    levels, parents = subtree_levels(project_id, subtree)
+    found = set(protected).intersection(
+        project for level in levels for project in level)
+    if found:
+        raise ProtectedProject('Project %s is in the subtree of %s.'
+                               % (sorted(found)[0], project_id))
+    total = sum(len(level) for level in levels)
+    deleted = []
+    failed = []
+    skipped = []
+    blocked = set()
+
+    def delete(project):
+        if revoke_assignments:
+            _revoke_assignments(request, project)
+        return project_identity.project_delete(request, project)
+
+    for level in reversed(levels):
+        ready = []
+        for project in level:
+            if project in blocked:
+                skipped.append(project)
+                blocked.add(parents.get(project))
+            else:
+                ready.append(project)
+        for outcome in parallel.run_bounded(delete, ready, concurrency):
+            if outcome.error:
+                LOG.warning('Unable to delete project %s: %s',
+                            outcome.item, outcome.error)
+                failed.append((outcome.item, outcome.error))
+                blocked.add(parents.get(outcome.item))
+            else:
+                deleted.append(outcome.item)
+            if progress is not None:
+                progress(outcome.item, outcome.error,
+                         len(deleted) + len(failed), total)
+    return CascadeResult(deleted, failed, skipped)
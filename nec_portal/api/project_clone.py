@@ -0,0 +1,106 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Creates a project with the group and user role assignments of another
+one.
+"""
+
+import collections
+import logging
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+WRITE_CONCURRENCY = getattr(nec_set, 'IDENTITY_WRITE_CONCURRENCY', 8)
+
+# A role assignment of the source project to replay on the new one.
+Grant = collections.namedtuple('Grant', ['actor_type', 'actor_id',
+                                         'role_id', 'role_name',
+                                         'inherited'])
+
+# The new project, the parallel.Outcome of each Grant, and the Grants
+# left out because of DISINHERITED_ROLES.
+CloneResult = collections.namedtuple('CloneResult',
+                                     ['project', 'outcomes', 'skipped'])
+
+
+def plan_grants(assignments, role_names, disinherited_roles=()):
+    """Return the Grants replaying ``assignments``, and those skipped
+    because their role is one of ``disinherited_roles``.
+
+    ``role_names`` maps role ids to names.
+    """
+    grants = set()
+    for assignment in assignments:
+        for actor_type in ('group', 'user'):
+            actor = getattr(assignment, actor_type, None)
+            if actor is not None:
+                break
+        else:
+            continue
+        role_id = assignment.role['id']
+        grants.add(Grant(actor_type, actor['id'], role_id,
+                         role_names.get(role_id, role_id),
+                         project_identity._is_inherited(assignment)))
+    disinherited_roles = frozenset(disinherited_roles)
+    planned = sorted(grant for grant in grants
+                     if grant.role_name not in disinherited_roles)
+    skipped = sorted(grant for grant in grants
+                     if grant.role_name in disinherited_roles)
+    return planned, skipped
+
+
+def _grant(request, project_id, grant):
+    kwargs = {'inherited': True} if grant.inherited else {}
+    if grant.actor_type == 'group':
+        return project_identity.add_group_role(
+            request, role=grant.role_id, group=grant.actor_id,
+            project=project_id, **kwargs)
+    return project_identity.add_project_user_role(
+        request, project=project_id, user=grant.actor_id,
+        role=grant.role_id, **kwargs)
+
+
+def clone_project(request, source, name, description=None, enabled=True,
+                  domain=None, parent=None, concurrency=None):
+    """Create a project and grant it the roles groups and users have on
+    ``source``, at most ``concurrency`` grants at once.
+
+    The assignments of the source are read before the project is created.
+    Returns a CloneResult; failed grants do not raise.
+    """
+    if concurrency is None:
+        concurrency = WRITE_CONCURRENCY
+    role_names = dict((role.id, role.name)
+                      for role in project_identity.role_list(request))
+    grants, skipped = plan_grants(
+        project_identity.iter_role_assignments(project=source), role_names,
+        getattr(nec_set, 'DISINHERITED_ROLES', []))
+
+    kwargs = {'parent': parent} if parent else {}
+    project = project_identity.project_create(
+        request, name=name, description=description, enabled=enabled,
+        domain=domain, **kwargs)
+
+    outcomes = parallel.run_bounded(
+        lambda grant: _grant(request, project.id, grant), grants,
+        concurrency)
+    for outcome in outcomes:
+        if outcome.error:
+            LOG.warning('Unable to grant role %s to %s %s on project %s: '
+                        '%s', outcome.item.role_name, outcome.item.actor_type,
+                        outcome.item.actor_id, project.id, outcome.error)
+    return CloneResult(project, outcomes, skipped)
@@ -13,7 +13,11 @@
 #
 
 import collections
+import functools
+import inspect
 import logging
+import threading
+import time
 
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
@@ -28,11 +32,64 @@ from keystoneclient import exceptions as keystone_exceptions
 from horizon import exceptions
 from horizon.utils import functions as utils
 
+from nec_portal.api import circuit_breaker
+from nec_portal.api import deadline
+from nec_portal.api import effective_roles
+from nec_portal.api import identity_notifications
+from nec_portal.api import identity_records
+from nec_portal.api import identity_replica
+from nec_portal.api import identity_state
+from nec_portal.api import identity_stream
+from nec_portal.api import signals
+from nec_portal.api import warm_store
 from nec_portal.local import nec_portal_settings as nec_set
 
 LOG = logging.getLogger(__name__)
 DEFAULT_ROLE = None
 KEYSTONE_ADMIN_SETTING = getattr(nec_set, 'KEYSTONE_ADMIN_SETTING', None)
+CIRCUIT_BREAKER_SETTING = getattr(nec_set, 'IDENTITY_CIRCUIT_BREAKER', {})
+API_TIMEOUTS = getattr(nec_set, 'IDENTITY_API_TIMEOUTS', {})
+PREWARM_SETTING = getattr(nec_set, 'IDENTITY_PREWARM', {})
+COMPACT_RECORDS = getattr(nec_set, 'IDENTITY_COMPACT_RECORDS', False)
+STREAM_LISTINGS = getattr(nec_set, 'IDENTITY_STREAM_LISTINGS', True)
+EFFECTIVE_ROLES_SETTING = getattr(nec_set, 'IDENTITY_EFFECTIVE_ROLES', {})
+INHERITED_GRANTS = getattr(nec_set, 'IDENTITY_INHERITED_GRANTS', False)
+
+# Query parameters of the v3 API for the filters each listing's manager
+# takes; other filters are sent as they are named.
+STREAM_FILTERS = {
+    'users': {'domain': 'domain_id',
+              'project': 'default_project_id',
+              'default_project': 'default_project_id'},
+    'groups': {'domain': 'domain_id'},
+    'projects': {'domain': 'domain_id',
+                 'parent': 'parent_id'},
+    'role_assignments': {'domain': 'scope.domain.id',
+                         'project': 'scope.project.id',
+                         'user': 'user.id',
+                         'group': 'group.id',
+                         'role': 'role.id'},
+}
+
+# Arguments of the v2.0 managers for the filters they can apply.
+V2_FILTERS = {
+    'users': {'project': 'tenant_id',
+              'default_project': 'tenant_id'},
+    'projects': {},
+}
+
+BREAKER = circuit_breaker.CircuitBreaker(
+    window=CIRCUIT_BREAKER_SETTING.get('window', 20),
+    min_calls=CIRCUIT_BREAKER_SETTING.get('min_calls', 10),
+    failure_ratio=CIRCUIT_BREAKER_SETTING.get('failure_ratio', 0.5),
+    slow_call_seconds=CIRCUIT_BREAKER_SETTING.get('slow_call_seconds', 5.0),
+    open_seconds=CIRCUIT_BREAKER_SETTING.get('open_seconds', 30))
+LAST_KNOWN_GOOD = circuit_breaker.LastKnownGood(
+    max_entries=CIRCUIT_BREAKER_SETTING.get('stale_cache_size', 1000))
+
+# Holds the timeout of the identity call running in this thread, which
+# get_keystone_client() hands to the client it builds.
+_CALL_CONTEXT = threading.local()
 
 
 # Set up our data structure for managing Identity API versions, and
@@ -70,6 +127,219 @@ except ImportError:
     pass
 
 
+def _breaker_enabled():
+    return CIRCUIT_BREAKER_SETTING.get('enabled', True)
+
+
+def _key_part(value):
+    # A request only matters through the scope of its user; everything
+    # else is an id, a name or a small dict of filters.
+    if hasattr(value, 'user') and hasattr(value, 'session'):
+        return ('request', getattr(value.user, 'id', None),
+                getattr(value.user, 'project_id', None))
+    if isinstance(value, dict):
+        return repr(sorted(value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _call_key(name, args, kwargs):
+    return (name,
+            tuple(_key_part(arg) for arg in args),
+            tuple((key, _key_part(value))
+                  for key, value in sorted(kwargs.items())))
+
+
+def _call_timeout(name):
+    """Return the client timeout for the identity call ``name``.
+
+    The timeout configured for the call is shortened to what is left of
+    the request deadline; DeadlineExceeded is raised when nothing is left.
+    """
+    name = name.lstrip('_')
+    timeout = API_TIMEOUTS.get(name, API_TIMEOUTS.get('default'))
+    budget = deadline.current()
+    if budget is not None:
+        budget.check()
+        remaining = budget.remaining()
+        if timeout is None or remaining < timeout:
+            timeout = remaining
+    return timeout
+
+
+def _timed_call(func, args, kwargs):
+    timeout = _call_timeout(func.__name__)
+    previous = getattr(_CALL_CONTEXT, 'timeout', None)
+    _CALL_CONTEXT.timeout = timeout
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _CALL_CONTEXT.timeout = previous
+
+
+def _check_deadline():
+    budget = deadline.current()
+    if budget is not None:
+        budget.check()
+
+
+def _guarded_call(func, args, kwargs):
+    start = time.time()
+    try:
+        result = _timed_call(func, args, kwargs)
+    except deadline.DeadlineExceeded:
+        # Keystone was not called: nothing to record, but a half-open
+        # trial must not be held forever.
+        BREAKER.release_trial()
+        raise
+    except circuit_breaker.SERVICE_ERRORS:
+        BREAKER.record(True, time.time() - start)
+        raise
+    except Exception:
+        BREAKER.record(False, time.time() - start)
+        raise
+    BREAKER.record(False, time.time() - start)
+    return result
+
+
+def _identity_read(func):
+    """Guard a read call with the circuit breaker.
+
+    Successful results are kept as last-known-good copies. While the
+    circuit is open the copy is returned instead of calling Keystone, and
+    IdentityUnavailable is raised when there is none.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _breaker_enabled():
+            return _timed_call(func, args, kwargs)
+        key = _call_key(func.__name__, args, kwargs)
+        _check_deadline()
+        if not BREAKER.allow_request():
+            cached = LAST_KNOWN_GOOD.get(key)
+            if cached is None:
+                raise circuit_breaker.IdentityUnavailable()
+            return cached[0]
+        try:
+            result = _guarded_call(func, args, kwargs)
+        except circuit_breaker.SERVICE_ERRORS:
+            cached = LAST_KNOWN_GOOD.get(key)
+            if cached is None:
+                raise
+            LOG.warning('Keystone call %s failed; serving cached data.',
+                        func.__name__)
+            return cached[0]
+        LAST_KNOWN_GOOD.put(key, result)
+        return result
+    return wrapper
+
+
+def _identity_write(func):
+    """Guard a mutating call; it is refused at once while the circuit is
+    open so that workers are not tied up waiting for Keystone to time out.
+
+    identity_changed is sent once the call succeeded.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _breaker_enabled():
+            result = _timed_call(func, args, kwargs)
+        else:
+            _check_deadline()
+            if not BREAKER.allow_request():
+                raise circuit_breaker.IdentityUnavailable()
+            result = _guarded_call(func, args, kwargs)
+        responses = signals.identity_changed.send_robust(
+            sender=func.__name__,
+            arguments=inspect.getcallargs(func, *args, **kwargs),
+            result=result)
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                LOG.error('Unable to propagate %s to %r: %s',
+                          func.__name__, receiver, response)
+        return result
+    return wrapper
+
+
+def _prewarmed(key_func, membership=False):
+    """Serve a read from the warm store while a pre-fetched copy is fresh.
+
+    ``key_func`` takes the arguments of the call and returns its key in
+    the store. ``<function>.warm(...)`` fetches from Keystone and stores
+    the result; only the pre-warming does that, other calls just read.
+    Membership data expires sooner and is dropped on any change.
+    """
+    if membership:
+        ttl = PREWARM_SETTING.get('membership_ttl', 300)
+    else:
+        ttl = PREWARM_SETTING.get('catalog_ttl', 3600)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cached = warm_store.STORE.get(key_func(*args, **kwargs))
+            if cached is not None:
+                return cached
+            return func(*args, **kwargs)
+
+        def warm(*args, **kwargs):
+            result = func(*args, **kwargs)
+            warm_store.STORE.put(key_func(*args, **kwargs), result, ttl,
+                                 volatile=membership)
+            return result
+        wrapper.warm = warm
+        return wrapper
+    return decorator
+
+
+def _as_records(record_class):
+    """Return the listing of a read as identity_records when
+    IDENTITY_COMPACT_RECORDS is set, so that the caches hold records too.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if not COMPACT_RECORDS:
+                return result
+            if isinstance(result, tuple):
+                # project_list returns (projects, has_more_data).
+                return ((identity_records.to_records(record_class,
+                                                     result[0]),) +
+                        result[1:])
+            return identity_records.to_records(record_class, result)
+        return wrapper
+    return decorator
+
+
+def is_degraded():
+    """Whether identity data is currently being served from cache."""
+    return (_breaker_enabled() and
+            BREAKER.state != circuit_breaker.STATE_CLOSED)
+
+
+def inherited_grants_enabled():
+    """Whether roles may be granted to the subprojects of a project with
+    the OS-INHERIT extension.
+    """
+    return bool(INHERITED_GRANTS) and VERSIONS.active >= 3
+
+
+def _inherit_kwargs(inherited):
+    return {'os_inherit_extension_inherited': True} if inherited else {}
+
+
+def _is_inherited(assignment):
+    """Whether a role assignment is inherited to the subprojects of its
+    project rather than held on the project itself.
+    """
+    scope = getattr(assignment, 'scope', None) or {}
+    return bool(scope.get('OS-INHERIT:inherited_to'))
+
+
 def get_keystone_client():
 
     api_version = VERSIONS.get_active_version()
@@ -79,7 +349,8 @@ def get_keystone_client():
         password=KEYSTONE_ADMIN_SETTING['password'],
         tenant_name=KEYSTONE_ADMIN_SETTING['tenant_name'],
         auth_url=KEYSTONE_ADMIN_SETTING['auth_url'],
-        region_name=KEYSTONE_ADMIN_SETTING.get('region_name', None))
+        region_name=KEYSTONE_ADMIN_SETTING.get('region_name', None),
+        timeout=getattr(_CALL_CONTEXT, 'timeout', None))
 
 
 def get_default_domain(request):
@@ -99,32 +370,325 @@ def get_default_domain(request):
     return domain
 
 
+@_prewarmed(lambda request, domain_id: ('domain', domain_id))
+@_identity_read
 def domain_get(request, domain_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.domains.get(domain_id)
 
 
-def project_user_list(project=None, domain=None, group=None, filters=None):
-
-    users_roles = []
-    keystoneclient = get_keystone_client()
-    project_users = keystoneclient.role_assignments.list(project=project)
+def _id(value):
+    return getattr(value, 'id', value)
 
-    for project_user in project_users:
-        if not hasattr(project_user, 'user'):
-            continue
-        user_id = project_user.user['id']
-        users_roles.append(user_id)
 
-    ret_users = []
-    all_users = keystoneclient.users.list()
-    for user_data in all_users:
-        if user_data.id in users_roles:
-            ret_users.append(user_data)
+def _iter_listing(keystoneclient, manager_name, path, key, filters, params):
+    """Yield the objects of a listing one at a time.
 
-    return ret_users
+    The response is parsed incrementally when ijson is available, so that
+    memory does not grow with the size of the listing and stopping early
+    closes the connection; otherwise the manager's list is walked.
+    """
+    keystoneclient = keystoneclient or get_keystone_client()
+    if VERSIONS.active < 3:
+        manager = getattr(keystoneclient,
+                          'tenants' if manager_name == 'projects'
+                          else manager_name)
+        for obj in manager.list(**_v2_filters(manager_name, filters)):
+            yield obj
+        return
+    manager = getattr(keystoneclient, manager_name)
+    if not (STREAM_LISTINGS and identity_stream.ijson):
+        for obj in manager.list(**filters):
+            yield obj
+        return
+    session = getattr(keystoneclient, 'session', None)
+    members = identity_stream.iter_collection(
+        keystoneclient.management_url.rstrip('/') + path, key,
+        params=params,
+        headers={'X-Auth-Token': keystoneclient.auth_token,
+                 'Accept': 'application/json'},
+        timeout=getattr(_CALL_CONTEXT, 'timeout', None),
+        verify=getattr(session, 'verify', True))
+    for member in members:
+        yield manager.resource_class(manager, member, loaded=True)
+
+
+def _stream_params(listing, filters):
+    names = STREAM_FILTERS[listing]
+    return dict((names.get(name, name), _id(value))
+                for name, value in filters.items() if value is not None)
+
+
+def _v2_filters(listing, filters):
+    """Return the v2.0 manager arguments for the ``filters`` of the
+    listing; raises ValueError for a filter v2.0 cannot apply.
+
+    v2.0 has a single domain, so a domain filter is dropped.
+    """
+    names = V2_FILTERS.get(listing, {})
+    arguments = {}
+    for name, value in filters.items():
+        if value is None or name == 'domain':
+            continue
+        if name not in names:
+            raise ValueError('Identity v2.0 cannot filter %s by %s.'
+                             % (listing, name))
+        arguments[names[name]] = _id(value)
+    return arguments
+
+
+def iter_users(keystoneclient=None, **filters):
+    """Yield users matching the users.list() ``filters``."""
+    params = dict(filters)
+    path = '/users'
+    if params.get('group'):
+        path = '/groups/%s/users' % _id(params.pop('group'))
+    return _iter_listing(keystoneclient, 'users', path, 'users', filters,
+                         _stream_params('users', params))
+
+
+def iter_groups(keystoneclient=None, **filters):
+    """Yield groups matching the groups.list() ``filters``."""
+    params = dict(filters)
+    path = '/groups'
+    if params.get('user'):
+        path = '/users/%s/groups' % _id(params.pop('user'))
+    return _iter_listing(keystoneclient, 'groups', path, 'groups', filters,
+                         _stream_params('groups', params))
+
+
+def iter_projects(keystoneclient=None, **filters):
+    """Yield projects matching the projects.list() ``filters``."""
+    params = dict(filters)
+    path = '/projects'
+    if params.get('user'):
+        path = '/users/%s/projects' % _id(params.pop('user'))
+    return _iter_listing(keystoneclient, 'projects', path, 'projects',
+                         filters, _stream_params('projects', params))
+
+
+def iter_role_assignments(keystoneclient=None, **filters):
+    """Yield role assignments matching the role_assignments.list()
+    ``filters``.
+    """
+    params = dict(filters)
+    effective = params.pop('effective', False)
+    params = _stream_params('role_assignments', params)
+    if effective:
+        params['effective'] = ''
+    return _iter_listing(keystoneclient, 'role_assignments',
+                         '/role_assignments', 'role_assignments', filters,
+                         params)
+
+
+def _assigned_ids(keystoneclient, actor_type, project):
+    assignments = iter_role_assignments(keystoneclient, project=project)
+    return set(getattr(assignment, actor_type)['id']
+               for assignment in assignments
+               if hasattr(assignment, actor_type))
+
+
+def _iter_take(objects, ids):
+    """Yield the objects whose id is in ``ids``, stopping as soon as all
+    of them were found.
+    """
+    remaining = set(ids)
+    try:
+        for obj in objects if remaining else ():
+            if obj.id in remaining:
+                remaining.discard(obj.id)
+                yield obj
+                if not remaining:
+                    break
+    finally:
+        # Stops a streamed listing and releases its connection.
+        getattr(objects, 'close', lambda: None)()
+
+
+def _take(objects, ids):
+    """Return the objects whose id is in ``ids``; see _iter_take()."""
+    return list(_iter_take(objects, ids))
+
+
+class _NamesMissing(Exception):
+    """The role assignment listing did not include names."""
+
+
+def _iter_assignment_refs(keystoneclient, project, actor_type):
+    """Yield the users or groups assigned to the project as records
+    holding the id, name and domain Keystone includes in the role
+    assignment listing, in listing order.
+
+    Raises _NamesMissing, or TypeError when the client is too old to pass
+    include_names.
+    """
+    record_class = {'user': identity_records.UserRecord,
+                    'group': identity_records.GroupRecord}[actor_type]
+    seen = set()
+    for assignment in iter_role_assignments(keystoneclient,
+                                            project=project,
+                                            include_names=True):
+        actor = getattr(assignment, actor_type, None)
+        if actor is None or actor['id'] in seen:
+            continue
+        if 'name' not in actor:
+            raise _NamesMissing()
+        seen.add(actor['id'])
+        yield record_class(id=actor['id'], name=actor['name'],
+                           domain_id=actor.get('domain', {}).get('id'))
+
+
+@_identity_read
+def _assignment_refs(project, actor_type):
+    """Return the users or groups assigned to the project as records
+    holding the id, name and domain Keystone includes in the role
+    assignment listing, or None when it did not include names.
+    """
+    try:
+        refs = list(_iter_assignment_refs(get_keystone_client(), project,
+                                          actor_type))
+    except (TypeError, _NamesMissing):
+        return None
+    return sorted(refs, key=lambda ref: (ref.name, ref.id))
+
+
+def project_user_refs(project=None):
+    """Returns the users which have a role on the project from a single
+    role assignment listing.
+
+    Only id, name and domain_id are set, unless the users came from a local
+    copy; the rest is to be fetched per user when needed.
+    """
+    source = _local_source()
+    if source is not None:
+        return source.project_users(project)
+    if VERSIONS.active >= 3:
+        refs = _assignment_refs(project, 'user')
+        if refs is not None:
+            return refs
+    return project_user_list(project=project)
+
+
+def _streamable():
+    """Whether listings may be streamed from Keystone: the users and
+    groups come from Keystone rather than a local copy, and the circuit
+    is closed, so that no last-known-good copy is to be served instead.
+    """
+    return (_local_source() is None and VERSIONS.active >= 3 and
+            (not _breaker_enabled() or
+             BREAKER.state == circuit_breaker.STATE_CLOSED))
+
+
+def iter_project_user_refs(project=None):
+    """Yields the users project_user_refs() returns as the role assignment
+    listing is read, in listing order rather than by name.
+    """
+    if _streamable():
+        started = False
+        try:
+            for ref in _iter_assignment_refs(get_keystone_client(),
+                                             project, 'user'):
+                started = True
+                yield ref
+            return
+        except (TypeError, _NamesMissing):
+            # Keystone includes the names of all users or of none.
+            if started:
+                raise
+    for user in project_user_refs(project=project):
+        yield user
+
+
+def iter_project_users(project=None):
+    """Yields the users project_user_list() returns as the user listing
+    is read, after a single role assignment listing.
+    """
+    if not _streamable():
+        for user in project_user_list(project=project):
+            yield user
+        return
+    keystoneclient = get_keystone_client()
+    user_ids = _assigned_ids(keystoneclient, 'user', project)
+    for user in _iter_take(iter_users(keystoneclient), user_ids):
+        yield identity_records.UserRecord.from_resource(user)
+
+
+def iter_project_groups(project=None, domain=None):
+    """Yields the groups project_group_list() returns as the group listing
+    is read, after a single role assignment listing.
+    """
+    if not _streamable():
+        for group in project_group_list(project=project, domain=domain):
+            yield group
+        return
+    keystoneclient = get_keystone_client()
+    group_ids = _assigned_ids(keystoneclient, 'group', project)
+    for group in _iter_take(iter_groups(keystoneclient, domain=domain),
+                            group_ids):
+        yield identity_records.GroupRecord.from_resource(group)
+
+
+def project_group_refs(project=None, domain=None):
+    """Returns the groups which have a role on the project from a single
+    role assignment listing; see project_user_refs().
+    """
+    source = _local_source()
+    if source is not None:
+        return source.project_groups(project, domain=domain)
+    if VERSIONS.active >= 3:
+        refs = _assignment_refs(project, 'group')
+        if refs is not None:
+            return [ref for ref in refs
+                    if domain is None or ref.domain_id == domain]
+    return project_group_list(project=project, domain=domain)
+
+
+@_identity_read
+def is_project_member(project, user=None, group=None):
+    """Whether the user or group has a role on the project; the listing
+    stops at the first assignment found.
+    """
+    filters = {'project': project}
+    if group is not None:
+        filters['group'] = group
+    else:
+        filters['user'] = user
+    for _assignment in iter_role_assignments(**filters):
+        return True
+    return False
+
+
+def _local_source():
+    """Return the notification-fed state, else the replica, else None."""
+    state = identity_notifications.get_identity_state()
+    if state is not None:
+        return state
+    return identity_replica.get_replica()
+
+
+def project_user_list(project=None, domain=None, group=None, filters=None,
+                      marker=None, limit=None):
+    """Returns the users which have a role on the project."""
+    source = _local_source()
+    if source is not None:
+        return source.project_users(project, filters=filters,
+                                    marker=marker, limit=limit)
+    users = _project_user_list(project=project)
+    return identity_state.select_objects(users, filters, marker, limit)
+
+
+@_prewarmed(lambda project=None: ('project_users', project),
+            membership=True)
+@_identity_read
+@_as_records(identity_records.UserRecord)
+def _project_user_list(project=None):
+    keystoneclient = get_keystone_client()
+    user_ids = _assigned_ids(keystoneclient, 'user', project)
+    return _take(iter_users(keystoneclient), user_ids)
 
 
+@_identity_read
+@_as_records(identity_records.RoleAssignmentRecord)
 def role_assignments_list(request, project=None, user=None, role=None,
                           group=None, domain=None, effective=False):
     if VERSIONS.active < 3:
@@ -156,12 +720,15 @@ def get_default_role(request):
     return DEFAULT_ROLE
 
 
+@_prewarmed(lambda request: ('roles',))
+@_identity_read
 def role_list(request):
     """Returns a global list of available roles."""
     keystoneclient = get_keystone_client()
     return keystoneclient.roles.list()
 
 
+@_identity_read
 def roles_for_user(request, user, project=None, domain=None):
     """Returns a list of user roles scoped to a project or domain."""
     keystoneclient = get_keystone_client()
@@ -173,19 +740,25 @@ def roles_for_user(request, user, project=None, domain=None):
                                          project=project)
 
 
+@_identity_read
 def users_role_list(request, user_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.roles.list(user=user_id,
                                      project=request.user.project_id)
 
 
+@_identity_read
 def user_get(request, user_id):
     user = get_keystone_client().users.get(user=user_id)
     return VERSIONS.upgrade_v2_user(user)
 
 
+@_identity_write
 def user_create(request, name=None, email=None, password=None, project=None,
-                enabled=None, domain=None):
+                enabled=None, domain=None, **extra):
+    """Create a user; with Identity v3 the ``extra`` attributes are stored
+    with it.
+    """
     keystoneclient = get_keystone_client()
     try:
         if VERSIONS.active < 3:
@@ -195,11 +768,14 @@ def user_create(request, name=None, email=None, password=None, project=None,
         else:
             return keystoneclient.users.create(name, password=password,
                                                email=email, project=project,
-                                               enabled=enabled, domain=domain)
+                                               enabled=enabled, domain=domain,
+                                               **extra)
     except keystone_exceptions.Conflict:
         raise exceptions.Conflict()
 
 
+@_identity_read
+@_as_records(identity_records.UserRecord)
 def user_list(request, project=None, domain=None, group=None, filters=None):
     if VERSIONS.active < 3:
         kwargs = {"tenant_id": project}
@@ -216,6 +792,7 @@ def user_list(request, project=None, domain=None, group=None, filters=None):
     return [VERSIONS.upgrade_v2_user(user) for user in users]
 
 
+@_identity_write
 def user_update(request, user, **data):
     keystoneclient = get_keystone_client()
     error = None
@@ -258,11 +835,13 @@ def user_update(request, user, **data):
             raise exceptions.Conflict()
 
 
+@_identity_write
 def user_delete(request, user_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.users.delete(user_id)
 
 
+@_identity_write
 def user_update_project(request, user, project, admin=True):
     keystoneclient = get_keystone_client()
     if VERSIONS.active < 3:
@@ -271,21 +850,39 @@ def user_update_project(request, user, project, admin=True):
         return keystoneclient.users.update(user, project=project)
 
 
+@_identity_write
 def add_project_user_role(
-        request, project=None, user=None, role=None, group=None):
-    """Adds a role for a user on a tenant."""
+        request, project=None, user=None, role=None, group=None,
+        inherited=False):
+    """Adds a role for a user on a tenant, or with ``inherited`` on all
+    of its subprojects.
+    """
     keystoneclient = get_keystone_client()
     if VERSIONS.active < 3:
         return keystoneclient.roles.add_user_role(user, role, project)
     else:
         return keystoneclient.roles.grant(
-            role, user=user, project=project, group=group)
+            role, user=user, project=project, group=group,
+            **_inherit_kwargs(inherited))
 
 
-def remove_project_user_role(request, project, user, role, domain=None):
+@_identity_write
+def remove_project_user_role(request, project, user, role, domain=None,
+                             inherited=False):
     keystoneclient = get_keystone_client()
     return keystoneclient.roles.revoke(role, user=user,
-                                       project=project, domain=domain)
+                                       project=project, domain=domain,
+                                       **_inherit_kwargs(inherited))
+
+
+@_identity_read
+def inherited_roles_for_user(request, user, project):
+    """Returns the roles granted to the user on the subprojects of the
+    project.
+    """
+    keystoneclient = get_keystone_client()
+    return keystoneclient.roles.list(user=user, project=project,
+                                     **_inherit_kwargs(True))
 
 
 def remove_project_user(request, project=None, user=None, domain=None):
@@ -297,12 +894,24 @@ def remove_project_user(request, project=None, user=None, domain=None):
                                  project=project, domain=domain)
 
 
+@_identity_read
 def project_get(request, project, admin=True, parents=False):
     keystoneclient = get_keystone_client()
     kwargs = {'parents_as_list': True} if parents else {}
     return keystoneclient.projects.get(project, **kwargs)
 
 
+@_identity_read
+def project_subtree(request, project):
+    """Returns the ids of the subprojects of the project as nested
+    {project id: subprojects or None} dicts.
+    """
+    keystoneclient = get_keystone_client()
+    return getattr(keystoneclient.projects.get(project, subtree_as_ids=True),
+                   'subtree', None) or {}
+
+
+@_identity_write
 def project_create(request, name, description=None, enabled=None,
                    domain=None, **kwargs):
     keystoneclient = get_keystone_client()
@@ -319,11 +928,14 @@ def project_create(request, name, description=None, enabled=None,
                                               **kwargs)
 
 
+@_identity_write
 def project_delete(request, project):
     keystoneclient = get_keystone_client()
     return keystoneclient.projects.delete(project)
 
 
+@_identity_read
+@_as_records(identity_records.ProjectRecord)
 def project_list(request, paginate=False, marker=None, domain=None, user=None,
                  admin=True, filters=None):
     keystoneclient = get_keystone_client()
@@ -356,6 +968,7 @@ def project_list(request, paginate=False, marker=None, domain=None, user=None,
     return (projects, has_more_data)
 
 
+@_identity_write
 def project_update(request, project, name=None, description=None,
                    enabled=None, domain=None, **kwargs):
     keystoneclient = get_keystone_client()
@@ -374,32 +987,108 @@ def project_update(request, project, name=None, description=None,
                                               **kwargs)
 
 
+@_identity_read
 def group_get(request, group):
     keystoneclient = get_keystone_client()
     return keystoneclient.groups.get(group)
 
 
-def group_user_list(project=None, domain=None, group=None, filters=None):
-    keystoneclient = get_keystone_client()
-    group_users = keystoneclient.users.list(group=group)
-    project_users = keystoneclient.role_assignments.list(project=project)
-
-    project_user_ids = []
-    for project_user in project_users:
-        if not hasattr(project_user, 'user'):
-            continue
-        user_id = project_user.user['id']
-        project_user_ids.append(user_id)
+def group_user_list(project=None, domain=None, group=None, filters=None,
+                    marker=None, limit=None):
+    """Returns the members of the group which have a role on the project."""
+    source = _local_source()
+    if source is not None:
+        return source.group_users(project, group, filters=filters,
+                                  marker=marker, limit=limit)
+    users = _group_user_list(project=project, group=group)
+    return identity_state.select_objects(users, filters, marker, limit)
 
-    ret_users = []
-    for group_data in group_users:
-        if group_data.id in project_user_ids:
-            ret_users.append(group_data)
 
-    return ret_users
+@_identity_read
+@_as_records(identity_records.UserRecord)
+def _group_user_list(project=None, group=None):
+    keystoneclient = get_keystone_client()
+    user_ids = _assigned_ids(keystoneclient, 'user', project)
+    return _take(iter_users(keystoneclient, group=group), user_ids)
+
+
+def get_effective_project_roles(request, project):
+    """Returns {user id: frozenset of role ids} of the roles users hold on
+    the project, directly or through the groups they belong to.
+    """
+    source = _local_source()
+    if source is not None:
+        return source.project_effective_roles(project)
+    roles = effective_roles.CACHE.get(project)
+    if roles is None:
+        generation = effective_roles.CACHE.generation
+        roles = _effective_project_roles(project)
+        effective_roles.CACHE.put(project, roles, generation)
+    return roles
+
+
+def _ancestor_ids(keystoneclient, project):
+    """Return the ids of the parents of the project, nearest first."""
+    parents = getattr(keystoneclient.projects.get(project,
+                                                  parents_as_ids=True),
+                      'parents', None)
+    ancestor_ids = []
+    while parents:
+        parent_id, parents = list(parents.items())[0]
+        ancestor_ids.append(parent_id)
+    return ancestor_ids
+
+
+@_identity_read
+def _effective_project_roles(project):
+    keystoneclient = get_keystone_client()
+    if VERSIONS.active >= 3 and EFFECTIVE_ROLES_SETTING.get(
+            'use_effective_listing', True):
+        try:
+            # Keystone expands group assignments into user assignments.
+            return effective_roles.expand(
+                (('user', a.user['id'], a.role['id'])
+                 for a in iter_role_assignments(keystoneclient,
+                                                project=project,
+                                                effective=True)
+                 if hasattr(a, 'user')),
+                lambda group_id: ())
+        except (keystone_exceptions.BadRequest,
+                keystone_exceptions.HttpNotImplemented):
+            LOG.info('Keystone cannot list effective role assignments; '
+                     'expanding group assignments locally.')
+    scopes = [(project, False)]
+    if VERSIONS.active >= 3:
+        scopes.extend((parent_id, True) for parent_id
+                      in _ancestor_ids(keystoneclient, project))
+    assignments = []
+    for scope_id, inherited in scopes:
+        for assignment in iter_role_assignments(keystoneclient,
+                                                project=scope_id):
+            # Inherited grants only apply below the project they are on.
+            if _is_inherited(assignment) != inherited:
+                continue
+            for actor_type in ('user', 'group'):
+                if hasattr(assignment, actor_type):
+                    assignments.append((actor_type,
+                                        getattr(assignment, actor_type)['id'],
+                                        assignment.role['id']))
+    return effective_roles.expand(
+        assignments,
+        lambda group_id: [user.id for user in
+                          iter_users(keystoneclient, group=group_id)])
 
 
 def get_project_users_roles(request, project):
+    source = _local_source()
+    if source is not None:
+        return source.project_users_roles(project)
+    return _project_users_roles(request, project)
+
+
+@_prewarmed(lambda request, project: ('project_users_roles', project),
+            membership=True)
+def _project_users_roles(request, project):
     users_roles = collections.defaultdict(list)
     if VERSIONS.active < 3:
         project_users = user_list(request, project=project)
@@ -420,42 +1109,53 @@ def get_project_users_roles(request, project):
     return users_roles
 
 
-def roles_for_group(request, group, project):
+@_identity_read
+def roles_for_group(request, group, project, inherited=False):
+    """Returns the roles of the group on the project, or with
+    ``inherited`` the roles it is granted on the project's subprojects.
+    """
     keystoneclient = get_keystone_client()
-    return keystoneclient.roles.list(group=group, project=project)
+    return keystoneclient.roles.list(group=group, project=project,
+                                     **_inherit_kwargs(inherited))
 
 
-def add_group_role(request, role, group, project):
+@_identity_write
+def add_group_role(request, role, group, project, inherited=False):
     keystoneclient = get_keystone_client()
-    return keystoneclient.roles.grant(role=role, group=group, project=project)
+    return keystoneclient.roles.grant(role=role, group=group, project=project,
+                                      **_inherit_kwargs(inherited))
 
 
-def remove_group_role(request, role, group, project):
+@_identity_write
+def remove_group_role(request, role, group, project, inherited=False):
     keystoneclient = get_keystone_client()
     return keystoneclient.roles.revoke(role=role, group=group,
-                                       project=project)
-
-
-def project_group_list(project=None, domain=None, group=None, filters=None):
-    project_group_ids = []
+                                       project=project,
+                                       **_inherit_kwargs(inherited))
+
+
+def project_group_list(project=None, domain=None, group=None, filters=None,
+                       marker=None, limit=None):
+    """Returns the groups which have a role on the project."""
+    source = _local_source()
+    if source is not None:
+        return source.project_groups(project, domain=domain, filters=filters,
+                                     marker=marker, limit=limit)
+    groups = _project_group_list(project=project, domain=domain)
+    return identity_state.select_objects(groups, filters, marker, limit)
+
+
+@_prewarmed(lambda project=None, domain=None: (
+    'project_groups', project, domain), membership=True)
+@_identity_read
+@_as_records(identity_records.GroupRecord)
+def _project_group_list(project=None, domain=None):
     keystoneclient = get_keystone_client()
-    project_groups = keystoneclient.role_assignments.list(project=project)
-
-    for project_group in project_groups:
-        if not hasattr(project_group, 'group'):
-            continue
-        group_id = project_group.group['id']
-        project_group_ids.append(group_id)
-
-    ret_groups = []
-    all_groups = keystoneclient.groups.list(domain=domain)
-    for user_data in all_groups:
-        if user_data.id in project_group_ids:
-            ret_groups.append(user_data)
-
-    return ret_groups
+    group_ids = _assigned_ids(keystoneclient, 'group', project)
+    return _take(iter_groups(keystoneclient, domain=domain), group_ids)
 
 
+@_identity_write
 def group_create(request, domain_id, name, description=None):
     keystoneclient = get_keystone_client()
     return keystoneclient.groups.create(domain=domain_id,
@@ -463,6 +1163,7 @@ def group_create(request, domain_id, name, description=None):
                                         description=description)
 
 
+@_identity_write
 def group_update(request, group_id, name=None, description=None):
     keystoneclient = get_keystone_client()
     return keystoneclient.groups.update(group=group_id,
@@ -470,16 +1171,19 @@ def group_update(request, group_id, name=None, description=None):
                                         description=description)
 
 
+@_identity_write
 def add_group_user(request, group_id, user_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.users.add_to_group(group=group_id, user=user_id)
 
 
+@_identity_write
 def remove_group_user(request, group_id, user_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.users.remove_from_group(group=group_id, user=user_id)
 
 
+@_identity_write
 def group_delete(request, group_id):
     keystoneclient = get_keystone_client()
     return keystoneclient.groups.delete(group_id)
@@ -0,0 +1,21 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from django.dispatch import Signal
+
+# Sent after a mutating project_identity call succeeded. The sender is the
+# name of the call (e.g. 'add_group_user'), ``arguments`` maps each of its
+# parameter names to the value it was called with and ``result`` is what
+# Keystone returned.
+identity_changed = Signal(providing_args=['arguments', 'result'])
@@ -0,0 +1,317 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Creates users in bulk from a CSV or JSON file.
+
+The file is read one row at a time and rows are created in batches
+through a bounded worker pool, so that a large file is neither held in
+memory nor created one user after another. Names are checked against an
+index of the domain's user names before Keystone is called.
+
+An import can be run again after it was interrupted. Users are created
+with an IMPORT_MARKER attribute naming the project they were imported
+into; a user of the same name carrying the marker of the project is
+taken as created by the earlier run, and only its missing roles are
+granted. Any other user of the same name is a conflict.
+"""
+
+import collections
+import csv
+import itertools
+import json
+import logging
+import threading
+import time
+
+from django.core import exceptions as django_exceptions
+from django.core import validators
+import six
+
+from horizon import exceptions
+
+from nec_portal.api import parallel
+from nec_portal.api import project_identity
+from nec_portal.api import signals
+from nec_portal.local import nec_portal_settings as nec_set
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+LOG = logging.getLogger(__name__)
+IMPORT_SETTING = getattr(nec_set, 'IDENTITY_USER_IMPORT', {})
+
+FORMATS = ('csv', 'json')
+
+# The user attribute holding the project a user was imported into.
+IMPORT_MARKER = 'nec_portal_imported_into'
+
+# A row of the file; line is the line of a CSV file or the position of the
+# object in a JSON array, counted from 1.
+ImportRow = collections.namedtuple('ImportRow', ['line', 'name', 'email',
+                                                 'password', 'enabled'])
+
+# What happened to a row: status is 'created', 'resumed', 'invalid',
+# 'conflict' or 'failed', and error says why for the last three.
+RowResult = collections.namedtuple('RowResult', ['line', 'name', 'status',
+                                                 'user_id', 'error'])
+
+FAILED_STATUSES = ('invalid', 'conflict', 'failed')
+
+
+def detect_format(filename):
+    return 'json' if filename.lower().endswith('.json') else 'csv'
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def _enabled(value):
+    if isinstance(value, bool):
+        return value
+    if value is None or str(value).strip() == '':
+        return True
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def _lines(stream):
+    """Yield the lines of a text or binary stream as the csv module of
+    the running Python wants them.
+    """
+    for index, line in enumerate(stream):
+        if six.PY2:
+            line = line.encode('utf-8') if not isinstance(line,
+                                                          bytes) else line
+            if index == 0 and line.startswith(b'\xef\xbb\xbf'):
+                line = line[3:]
+        else:
+            line = _text(line)
+            if index == 0:
+                line = line.lstrip(u'\ufeff')
+        yield line
+
+
+def _row(line, record):
+    def field(key):
+        value = _text(record.get(key))
+        return value.strip() if isinstance(value, six.string_types) else value
+
+    return ImportRow(line, field('name') or '', field('email') or None,
+                     field('password') or None,
+                     _enabled(record.get('enabled')))
+
+
+def iter_rows(stream, fmt='csv'):
+    """Yield the ImportRows of a CSV file with a header line, or of a JSON
+    array of objects, as they are read.
+
+    Both carry 'name' and optionally 'email', 'password' and 'enabled'.
+    JSON is only parsed incrementally when ijson is installed.
+    """
+    if fmt == 'json':
+        if ijson is not None:
+            records = ijson.items(stream, 'item')
+        else:
+            records = iter(json.loads(_text(stream.read())))
+        for index, record in enumerate(records):
+            yield _row(index + 1, record)
+        return
+    reader = csv.DictReader(_lines(stream))
+    for record in reader:
+        yield _row(reader.line_num, record)
+
+
+class NameIndex(object):
+    """The names of the users of a domain, with their id and the project
+    they were imported into, kept current with the users created and
+    deleted through this process.
+    """
+
+    def __init__(self, users=()):
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._names = {}
+        self.loaded_at = time.time()
+        for user in users:
+            self.add(user)
+
+    def add(self, user):
+        with self._lock:
+            self._by_name[user.name] = (
+                user.id, getattr(user, IMPORT_MARKER, None))
+            self._names[user.id] = user.name
+
+    def remove(self, user_id):
+        with self._lock:
+            name = self._names.pop(user_id, None)
+            if name is not None:
+                self._by_name.pop(name, None)
+
+    def get(self, name):
+        """Return (user id, project imported into or None) of the user,
+        or None.
+        """
+        with self._lock:
+            return self._by_name.get(name)
+
+    def name_of(self, user_id):
+        """Return the name of the user, or None."""
+        with self._lock:
+            return self._names.get(user_id)
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_name_index(domain):
+    """Return the NameIndex of the domain, rebuilt once it is older than
+    IDENTITY_USER_IMPORT['index_ttl'] seconds.
+    """
+    ttl = IMPORT_SETTING.get('index_ttl', 300)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(domain)
+    if index is None or index.loaded_at + ttl <= time.time():
+        index = NameIndex(project_identity.iter_users(domain=domain))
+        with _INDEXES_LOCK:
+            _INDEXES[domain] = index
+    return index
+
+
+def _update_indexes(sender, arguments=None, result=None, **kwargs):
+    with _INDEXES_LOCK:
+        indexes = list(_INDEXES.values())
+    for index in indexes:
+        if sender == 'user_create' and result is not None:
+            index.add(result)
+        elif sender == 'user_delete':
+            index.remove((arguments or {}).get('user_id'))
+
+
+signals.identity_changed.connect(
+    _update_indexes, dispatch_uid='nec_portal.user_import')
+
+
+class UserImporter(object):
+    """Creates the users of an import in ``project`` and grants them
+    DEFAULT_USER_ROLES there.
+    """
+
+    def __init__(self, request, project, domain, concurrency=None,
+                 batch_size=None):
+        self.request = request
+        self.project = project
+        self.domain = domain
+        self.concurrency = concurrency or IMPORT_SETTING.get('concurrency',
+                                                             8)
+        self.batch_size = batch_size or IMPORT_SETTING.get('batch_size',
+                                                           200)
+        self.index = get_name_index(domain)
+        default_roles = getattr(nec_set, 'DEFAULT_USER_ROLES', [])
+        self.role_ids = [role.id for role in
+                         project_identity.role_list(request)
+                         if role.name in default_roles]
+        self._seen = set()
+
+    def validate(self, row):
+        """Return the RowResult of a row which is not to be created, or
+        None.
+        """
+        if not row.name:
+            return RowResult(row.line, row.name, 'invalid', None,
+                             'The user name is missing.')
+        if row.name in self._seen:
+            return RowResult(row.line, row.name, 'invalid', None,
+                             'The user name appears more than once.')
+        self._seen.add(row.name)
+        if row.email:
+            try:
+                validators.validate_email(row.email)
+            except django_exceptions.ValidationError:
+                return RowResult(row.line, row.name, 'invalid', None,
+                                 'The email address is not valid.')
+        existing = self.index.get(row.name)
+        if existing is not None and existing[1] != self.project:
+            return RowResult(row.line, row.name, 'conflict', existing[0],
+                             'The user name is already used.')
+        return None
+
+    def _grant_roles(self, user_id, resumed):
+        role_ids = self.role_ids
+        if resumed:
+            held = set(role.id for role in project_identity.roles_for_user(
+                self.request, user_id, self.project) or [])
+            role_ids = [role_id for role_id in role_ids
+                        if role_id not in held]
+        for role_id in role_ids:
+            project_identity.add_project_user_role(
+                self.request, role=role_id, user=user_id,
+                project=self.project)
+
+    def _create(self, row):
+        existing = self.index.get(row.name)
+        if existing is not None and existing[1] != self.project:
+            # Created by someone else since the row was validated.
+            raise exceptions.Conflict()
+        if existing is not None:
+            self._grant_roles(existing[0], resumed=True)
+            return RowResult(row.line, row.name, 'resumed', existing[0],
+                             None)
+        user = project_identity.user_create(
+            self.request, name=row.name, email=row.email,
+            password=row.password, project=self.project,
+            enabled=row.enabled, domain=self.domain,
+            **{IMPORT_MARKER: self.project})
+        self._grant_roles(user.id, resumed=False)
+        return RowResult(row.line, row.name, 'created', user.id, None)
+
+    def _run_batch(self, rows):
+        for outcome in parallel.run_bounded(self._create, rows,
+                                            self.concurrency):
+            if outcome.error is None:
+                yield outcome.result
+                continue
+            row = outcome.item
+            status = 'failed'
+            if isinstance(outcome.error, exceptions.Conflict):
+                status = 'conflict'
+            LOG.warning('Unable to import user %s (line %d): %s',
+                        row.name, row.line, outcome.error)
+            yield RowResult(row.line, row.name, status, None,
+                            str(outcome.error) or type(outcome.error)
+                            .__name__)
+
+    def run(self, rows):
+        """Yield a RowResult for each row, in the order of the rows."""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            valid = []
+            results = {}
+            for row in batch:
+                result = self.validate(row)
+                if result is None:
+                    valid.append(row)
+                else:
+                    results[row.line] = result
+            for result in self._run_batch(valid):
+                results[result.line] = result
+            for row in batch:
+                yield results[row.line]
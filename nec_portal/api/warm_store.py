@@ -0,0 +1,67 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import threading
+import time
+
+from nec_portal.api import signals
+
+
+class WarmStore(object):
+    """Pre-fetched identity data of this process, each entry with its own
+    time to live.
+
+    Entries put with ``volatile=True`` are dropped as soon as identity
+    data is changed through this process.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, value, ttl, volatile=False):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl, volatile)
+
+    def get(self, key):
+        """Return the value stored for ``key``, or None if it expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def drop_volatile(self):
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[2]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+STORE = WarmStore()
+
+
+def _drop_volatile(sender, **kwargs):
+    STORE.drop_volatile()
+
+
+signals.identity_changed.connect(
+    _drop_volatile, dispatch_uid='nec_portal.warm_store')
@@ -0,0 +1,32 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import os
+import sys
+
+from django.apps import AppConfig
+
+
+class NecPortalConfig(AppConfig):
+    name = 'nec_portal'
+    verbose_name = 'NEC Portal'
+
+    def ready(self):
+        # Management commands other than the development server do not
+        # serve pages and need no warm caches.
+        if (os.path.basename(sys.argv[0]) == 'manage.py' and
+                sys.argv[1:2] != ['runserver']):
+            return
+        from nec_portal.api import prewarm
+        prewarm.start_background()
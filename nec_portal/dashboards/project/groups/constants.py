@@ -17,11 +17,16 @@ GROUPS_INDEX_VIEW_TEMPLATE = 'project/groups/index.html'
 GROUPS_CREATE_URL = 'horizon:project:groups:create'
 GROUPS_CREATE_VIEW_TEMPLATE = 'project/groups/create.html'
 GROUPS_UPDATE_URL = 'horizon:project:groups:update'
+GROUPS_EXPORT_URL = 'horizon:project:groups:export'
 GROUPS_UPDATE_VIEW_TEMPLATE = 'project/groups/update.html'
 GROUPS_MANAGE_URL = 'horizon:project:groups:manage_members'
 GROUPS_MANAGE_VIEW_TEMPLATE = 'project/groups/manage.html'
 GROUPS_ADD_MEMBER_URL = 'horizon:project:groups:add_members'
 GROUPS_ADD_MEMBER_VIEW_TEMPLATE = 'project/groups/add_non_member.html'
 GROUPS_ADD_MEMBER_AJAX_VIEW_TEMPLATE = 'project/groups/_add_non_member.html'
+GROUPS_SYNC_MEMBERS_URL = 'horizon:project:groups:sync_members'
+GROUPS_SYNC_MEMBERS_VIEW_TEMPLATE = 'project/groups/sync_members.html'
 GROUPS_MODIFY_ROLES_URL = 'horizon:project:groups:modify_roles'
+GROUPS_MODIFY_ROLES_PREVIEW_URL = \
+    'horizon:project:groups:modify_roles_preview'
 GROUPS_MODIFY_ROLES_VIEW_TEMPLATE = 'project/groups/modify_roles.html'
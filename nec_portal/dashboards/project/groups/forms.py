@@ -22,11 +22,29 @@ from horizon import exceptions
 from horizon import forms
 from horizon import messages
 
+from nec_portal.api import group_sync
+from nec_portal.api import parallel
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project.groups import role_matrix
 from nec_portal.local import nec_portal_settings as nec_set
 
 LOG = logging.getLogger(__name__)
 
+# How many role grants and revocations are sent to Keystone at once.
+WRITE_CONCURRENCY = getattr(nec_set, 'IDENTITY_WRITE_CONCURRENCY', 8)
+
+FAILURE_MESSAGES = {
+    ('grant', False): _('Unable to grant role "%s".'),
+    ('revoke', False): _('Unable to revoke role "%s".'),
+    ('grant', True): _('Unable to grant role "%s" to the subprojects.'),
+    ('revoke', True): _('Unable to revoke role "%s" from the subprojects.'),
+}
+
+SYNC_FAILURE_MESSAGES = {
+    'add': _('Unable to add user "%s" to the group.'),
+    'remove': _('Unable to remove user "%s" from the group.'),
+}
+
 
 class CreateGroupForm(forms.SelfHandlingForm):
     name = forms.CharField(label=_("Name"))
@@ -94,84 +112,140 @@ class UpdateGroupForm(forms.SelfHandlingForm):
         return True
 
 
+def plan_group_roles(request, group_id, checked_roles, inherited=False):
+    """Returns the RolePlans of the Modify Roles dialog for the checked
+    role names on the project and on its subprojects, and the ids of the
+    roles by name.
+
+    The roles of the subprojects are granted once on the project with
+    OS-INHERIT: they follow the matrix when ``inherited`` is set and are
+    revoked otherwise. Their plan is None when inherited grants are not
+    enabled.
+    """
+    project_id = request.user.project_id
+    current_roles = project_identity.roles_for_group(
+        request, group=group_id, project=project_id)
+    all_roles = project_identity.role_list(request)
+    role_ids = dict((role.name, role.id) for role in all_roles)
+    role_ids.update((role.name, role.id) for role in current_roles)
+    default_roles = getattr(nec_set, 'DEFAULT_GROUP_ROLES', [])
+    plan = role_matrix.plan_changes(
+        all_roles, [role.name for role in current_roles], checked_roles,
+        default_roles)
+    inherited_plan = None
+    if project_identity.inherited_grants_enabled():
+        inherited_roles = project_identity.roles_for_group(
+            request, group=group_id, project=project_id, inherited=True)
+        role_ids.update((role.name, role.id) for role in inherited_roles)
+        inherited_plan = role_matrix.plan_changes(
+            all_roles, [role.name for role in inherited_roles],
+            checked_roles if inherited else [], default_roles)
+    return plan, inherited_plan, role_ids
+
+
+def _changes(plan, inherited):
+    return ([('grant', name, inherited) for name in sorted(plan.grant)] +
+            [('revoke', name, inherited) for name in sorted(plan.revoke)])
+
+
 class ModifyRolesForm(forms.SelfHandlingForm):
 
-    def __init__(self, request, *args, **kwargs):
-        super(ModifyRolesForm, self).__init__(request, *args, **kwargs)
+    def _apply(self, request, group_id, changes, role_ids):
+        """Grants and revokes roles concurrently; returns the
+        parallel.Outcome of each (action, role name, inherited) change.
+        """
+        def apply(change):
+            action, role_name, inherited = change
+            if action == 'grant':
+                call = project_identity.add_group_role
+            else:
+                call = project_identity.remove_group_role
+            kwargs = {'inherited': True} if inherited else {}
+            return call(request, role=role_ids[role_name], group=group_id,
+                        project=request.user.project_id, **kwargs)
 
-    def _add_roles_to_groups(self, request, data, project_id, group_id,
-                             role_ids, available_roles):
-        checked_role_list = data
-        current_role_ids = list(role_ids)
-        for role in available_roles:
-            if role.name in checked_role_list:
-                if role not in current_role_ids:
-                    project_identity.add_group_role(
-                        request,
-                        role=role.id,
-                        group=group_id,
-                        project=project_id)
-                else:
-                    index = current_role_ids.index(role)
-                    current_role_ids.pop(index)
-        return current_role_ids
-
-    def _remove_roles_from_groups(self, request, project_id, group_id,
-                                  current_role_ids):
-        for id_to_delete in current_role_ids:
-            if str(id_to_delete.name).count('__') == 2 or\
-               str(id_to_delete.name) == 'admin':
-                project_identity.remove_group_role(
-                    request,
-                    role=id_to_delete.id,
-                    group=group_id,
-                    project=project_id)
+        return parallel.run_bounded(apply, changes, WRITE_CONCURRENCY)
 
     def handle(self, request, data):
         group_id = request.POST['group_id']
-        role_data = request.POST.getlist('checked')
-        set_auth_conf = getattr(nec_set, 'TBL_ROLE_ALL', None)
         try:
-            old_role_list = project_identity.roles_for_group(
-                self.request,
-                group=group_id,
-                project=request.user.project_id)
-            all_role_list = project_identity.role_list(request)
-
-            if role_data == []:
-                default_roles = getattr(nec_set,
-                                        'DEFAULT_GROUP_ROLES', [])
-                for id_to_delete in old_role_list:
-                    if id_to_delete.name in default_roles:
-                        continue
-                    project_identity.remove_group_role(
-                        request,
-                        role=id_to_delete.id,
-                        group=group_id,
-                        project=request.user.project_id)
-            else:
-                admin_role_list = []
-                for set_auth in set_auth_conf:
-                    if set_auth['policy'] == 'admin':
-                        admin_role_list.append(set_auth['initial'])
-                for role_name in role_data:
-                    initial, region, rolename = str(role_name).split('__')
-                    if initial in admin_role_list:
-                        role_data.append('admin')
-                        break
-
-                modified_role_ids = self._add_roles_to_groups(
-                    request, role_data, request.user.project_id,
-                    group_id, old_role_list, all_role_list)
-
-                self._remove_roles_from_groups(
-                    request, request.user.project_id,
-                    group_id, modified_role_ids)
-
-            messages.success(request,
-                             _('User has been updated successfully.'))
+            plan, inherited_plan, role_ids = plan_group_roles(
+                request, group_id, request.POST.getlist('checked'),
+                inherited=bool(request.POST.get('inherited')))
+            changes = _changes(plan, False)
+            if inherited_plan is not None:
+                changes += _changes(inherited_plan, True)
+            outcomes = self._apply(request, group_id, changes, role_ids)
         except Exception:
             exceptions.handle(request, ignore=True)
             messages.error(request, _('Unable to update the user.'))
+            return True
+
+        failed = [outcome for outcome in outcomes if outcome.error]
+        for outcome in failed:
+            action, role_name, inherited = outcome.item
+            LOG.warning('Unable to %s role %s of group %s%s: %s',
+                        action, role_name, group_id,
+                        ' on subprojects' if inherited else '',
+                        outcome.error)
+            messages.error(request, FAILURE_MESSAGES[action, inherited] %
+                           role_name)
+        if not failed:
+            messages.success(request,
+                             _('User has been updated successfully.'))
+        elif len(failed) < len(outcomes):
+            messages.warning(request,
+                             _('%(done)d of %(total)d role changes were '
+                               'applied.') % {
+                                 'done': len(outcomes) - len(failed),
+                                 'total': len(outcomes)})
+        return True
+
+
+class SyncMembersForm(forms.SelfHandlingForm):
+    group_id = forms.CharField(widget=forms.HiddenInput())
+    members_file = forms.FileField(
+        label=_("File"),
+        help_text=_("The names or IDs of the users the group is to have, "
+                    "one per line."))
 
+    def handle(self, request, data):
+        group_id = data['group_id']
+        try:
+            group = project_identity.group_get(request, group_id)
+            result = group_sync.sync_group(
+                request, group_id,
+                group_sync.read_targets(data['members_file']),
+                domain=getattr(group, 'domain_id', None), require_all=True)
+        except group_sync.IncompleteTargets as error:
+            # A file which resolves to no one, or only in part, would
+            # remove the members it fails to name.
+            if error.unknown:
+                messages.error(request,
+                               _('Unknown users: %s. No group members were '
+                                 'changed.') % ', '.join(error.unknown))
+            else:
+                messages.error(request,
+                               _('The file lists no users. No group '
+                                 'members were changed.'))
+            return False
+        except Exception:
+            LOG.exception('Unable to synchronize the members of group %s.',
+                          group_id)
+            messages.error(request,
+                           _('Unable to synchronize the group members.'))
+            return False
+        failed = [outcome.item for outcome in result.outcomes
+                  if outcome.error]
+        for action, user_id in failed:
+            messages.error(request, SYNC_FAILURE_MESSAGES[action] % user_id)
+        messages.success(request,
+                         _('Added %(added)d and removed %(removed)d group '
+                           'members.') % {
+                             'added': len(result.plan.add) - len(
+                                 [item for item in failed
+                                  if item[0] == 'add']),
+                             'removed': len(result.plan.remove) - len(
+                                 [item for item in failed
+                                  if item[0] == 'remove'])})
         return True
@@ -0,0 +1,179 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""The role matrix of the Modify Roles dialog.
+
+Roles named ``<initial>__<region>__<role>`` are laid out in one table per
+initial (see TBL_ROLE_ALL), with a column per region and a row per role.
+The layout only depends on the role catalog, so it is parsed once per
+version of the catalog and shared; each request overlays its own flags.
+"""
+
+import collections
+import threading
+
+from nec_portal.local import nec_portal_settings as nec_set
+
+ROLE_SEPARATOR = '__'
+ADMIN_POLICY = 'admin'
+ADMIN_ROLE = 'admin'
+
+# A checkbox of the matrix. operator is 1 if the logged in user holds the
+# role and may grant it, 0 if not and EMPTY if the region has no such
+# role; target is 1 if the group holds it.
+Cell = collections.namedtuple('Cell', ['operator', 'target', 'role_id',
+                                       'role_name'])
+EMPTY = 3
+EMPTY_CELL = Cell(EMPTY, 0, '', '')
+
+# One table of the dialog: rows are (role, cells by column) pairs.
+RoleTable = collections.namedtuple('RoleTable', ['initial', 'name',
+                                                 'columns', 'rows'])
+
+# The role names to grant to and revoke from a group.
+RolePlan = collections.namedtuple('RolePlan', ['grant', 'revoke'])
+
+
+def parse_role_name(name):
+    """Return (initial, region, role) for matrix roles, else None."""
+    parts = str(name).split(ROLE_SEPARATOR)
+    if len(parts) != 3:
+        return None
+    return tuple(parts)
+
+
+class RoleCatalog(object):
+    """The parsed layout of a role catalog; never changed once built."""
+
+    def __init__(self, roles):
+        self.version = catalog_version(roles)
+        grid = collections.OrderedDict()
+        self.roles_by_name = {}
+        for role in roles:
+            self.roles_by_name[role.name] = role
+            parsed = parse_role_name(role.name)
+            if parsed is None:
+                continue
+            initial, region, rolename = parsed
+            regions, rolenames, cells = grid.setdefault(
+                initial, (set(), [], {}))
+            regions.add(region)
+            if rolename not in rolenames:
+                rolenames.append(rolename)
+            cells[rolename, region] = (role.id, role.name)
+        self.layout = dict(
+            (initial, (tuple(sorted(regions)), tuple(rolenames), cells))
+            for initial, (regions, rolenames, cells) in grid.items())
+
+    def matrix_roles(self, initials=None):
+        """Return the names of the matrix roles, optionally of some
+        initials only.
+        """
+        return frozenset(
+            name for initial, (_regions, _rolenames, cells)
+            in self.layout.items()
+            if initials is None or initial in initials
+            for _role_id, name in cells.values())
+
+
+def catalog_version(roles):
+    return hash(tuple(sorted((role.id, role.name) for role in roles)))
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog(roles):
+    """Return the parsed catalog of ``roles``, parsing it only when the
+    catalog changed since the last call.
+    """
+    global _CATALOG
+    version = catalog_version(roles)
+    catalog = _CATALOG
+    if catalog is None or catalog.version != version:
+        catalog = RoleCatalog(roles)
+        with _CATALOG_LOCK:
+            _CATALOG = catalog
+    return catalog
+
+
+def role_tables():
+    return getattr(nec_set, 'TBL_ROLE_ALL', None) or []
+
+
+def admin_initials():
+    return frozenset(table['initial'] for table in role_tables()
+                     if table['policy'] == ADMIN_POLICY)
+
+
+def build(roles, operator_roles, target_roles):
+    """Return the RoleTables of the dialog.
+
+    ``operator_roles`` and ``target_roles`` are the names of the roles of
+    the logged in user and of the group. Tables with the admin policy are
+    left out unless the user is an admin.
+    """
+    catalog = get_catalog(roles)
+    operator_roles = frozenset(operator_roles)
+    target_roles = frozenset(target_roles)
+    tables = []
+    for table in role_tables():
+        if (table['policy'] == ADMIN_POLICY and
+                ADMIN_ROLE not in operator_roles):
+            continue
+        initial = table['initial']
+        if initial not in catalog.layout:
+            continue
+        regions, rolenames, cells = catalog.layout[initial]
+        rows = []
+        for rolename in rolenames:
+            row = []
+            for region in regions:
+                cell = cells.get((rolename, region))
+                if cell is None:
+                    row.append(EMPTY_CELL)
+                    continue
+                role_id, role_name = cell
+                row.append(Cell(int(role_name in operator_roles),
+                                int(role_name in target_roles),
+                                role_id, role_name))
+            rows.append((rolename, tuple(row)))
+        tables.append(RoleTable(initial, table['name'], regions,
+                                tuple(rows)))
+    return tuple(tables)
+
+
+def plan_changes(roles, current_roles, checked_roles, default_roles=()):
+    """Return the RolePlan taking a group from ``current_roles`` to the
+    roles checked in the dialog.
+
+    Nothing checked revokes every role but ``default_roles``. Otherwise
+    the admin role goes with any role of an admin policy table, unknown
+    names are not granted and only matrix roles and the admin role are
+    revoked.
+    """
+    catalog = get_catalog(roles)
+    current = frozenset(current_roles)
+    checked = frozenset(checked_roles)
+    if not checked:
+        return RolePlan(frozenset(), current - frozenset(default_roles))
+    if any((parse_role_name(name) or ('',))[0] in admin_initials()
+           for name in checked):
+        checked |= frozenset([ADMIN_ROLE])
+    grant = frozenset(name for name in checked - current
+                      if name in catalog.roles_by_name)
+    revoke = frozenset(name for name in current - checked
+                       if name == ADMIN_ROLE or parse_role_name(name))
+    return RolePlan(grant, revoke)
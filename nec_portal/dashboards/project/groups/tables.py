@@ -23,9 +23,9 @@ from django.utils.translation import ungettext_lazy
 
 from horizon import tables
 
-from openstack_dashboard import api
-
+from nec_portal.api import policy_decisions
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import row_cache
 from nec_portal.dashboards.project.groups import constants
 
 
@@ -46,10 +46,19 @@ class CreateGroupLink(tables.LinkAction):
     policy_rules = (("identity", "identity:create_group"),)
 
     def allowed(self, request, group):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
+
+
+class ExportGroupsLink(tables.LinkAction):
+    name = "export"
+    verbose_name = _("Export Groups")
+    url = constants.GROUPS_EXPORT_URL
+    icon = "download"
+    policy_rules = (("identity", "identity:list_groups"),)
 
 
-class EditGroupLink(tables.LinkAction):
+class EditGroupLink(policy_decisions.PolicyDecisionMixin,
+                    tables.LinkAction):
     name = "edit"
     verbose_name = _("Edit Group")
     url = constants.GROUPS_UPDATE_URL
@@ -58,10 +67,11 @@ class EditGroupLink(tables.LinkAction):
     policy_rules = (("identity", "identity:update_group"),)
 
     def allowed(self, request, group):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
 
-class DeleteGroupsAction(tables.DeleteAction):
+class DeleteGroupsAction(policy_decisions.PolicyDecisionMixin,
+                         tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -86,14 +96,15 @@ class DeleteGroupsAction(tables.DeleteAction):
                   "if only have a role in this group.")
 
     def allowed(self, request, datum):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
     def delete(self, request, obj_id):
         LOG.info('Deleting group "%s".' % obj_id)
         project_identity.group_delete(request, obj_id)
 
 
-class ManageUsersLink(tables.LinkAction):
+class ManageUsersLink(policy_decisions.PolicyDecisionMixin,
+                      tables.LinkAction):
     name = "users"
     verbose_name = _("Manage Members")
     url = constants.GROUPS_MANAGE_URL
@@ -101,10 +112,11 @@ class ManageUsersLink(tables.LinkAction):
     policy_rules = (("identity", "identity:get_group"),)
 
     def allowed(self, request, datum):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
 
-class UpdateGroupRolesLink(tables.LinkAction):
+class UpdateGroupRolesLink(policy_decisions.PolicyDecisionMixin,
+                           tables.LinkAction):
     name = "modify_roles"
     verbose_name = _("Modify Roles")
     url = constants.GROUPS_MODIFY_ROLES_URL
@@ -114,7 +126,7 @@ class UpdateGroupRolesLink(tables.LinkAction):
     policy_target_attrs = (("group_id", "id"),)
 
     def allowed(self, request, user):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
 
 class GroupFilterAction(tables.FilterAction):
@@ -142,7 +154,8 @@ class GroupsTable(tables.DataTable):
         row_actions = (ManageUsersLink, EditGroupLink, UpdateGroupRolesLink,
                        DeleteGroupsAction)
         table_actions = (GroupFilterAction, CreateGroupLink,
-                         DeleteGroupsAction)
+                         ExportGroupsLink, DeleteGroupsAction)
+        row_class = row_cache.CachedRow
 
 
 class UserFilterAction(tables.FilterAction):
@@ -175,7 +188,7 @@ class RemoveMembers(tables.DeleteAction):
     policy_rules = (("identity", "identity:remove_user_from_group"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
     def action(self, request, obj_id):
         user_obj = self.table.get_object_by_id(obj_id)
@@ -199,7 +212,23 @@ class AddMembersLink(tables.LinkAction):
     policy_rules = (("identity", "identity:add_user_to_group"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
+
+    def get_link_url(self, datum=None):
+        return reverse(self.url, kwargs=self.table.kwargs)
+
+
+class SyncMembersLink(tables.LinkAction):
+    name = "sync_members"
+    verbose_name = _("Synchronize Members")
+    classes = ("ajax-modal",)
+    icon = "refresh"
+    url = constants.GROUPS_SYNC_MEMBERS_URL
+    policy_rules = (("identity", "identity:add_user_to_group"),
+                    ("identity", "identity:remove_user_from_group"))
+
+    def allowed(self, request, user=None):
+        return policy_decisions.can_edit(request, 'group')
 
     def get_link_url(self, datum=None):
         return reverse(self.url, kwargs=self.table.kwargs)
@@ -223,7 +252,8 @@ class GroupMembersTable(UsersTable):
     class Meta(object):
         name = "group_members"
         verbose_name = _("Group Members")
-        table_actions = (UserFilterAction, AddMembersLink, RemoveMembers)
+        table_actions = (UserFilterAction, AddMembersLink, SyncMembersLink,
+                         RemoveMembers)
 
 
 class AddMembers(tables.BatchAction):
@@ -250,7 +280,7 @@ class AddMembers(tables.BatchAction):
     policy_rules = (("identity", "identity:add_user_to_group"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_group()
+        return policy_decisions.can_edit(request, 'group')
 
     def action(self, request, obj_id):
         user_obj = self.table.get_object_by_id(obj_id)
@@ -12,16 +12,25 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+
 from mox3.mox import IgnoreArg
 from mox3.mox import IsA
 
+from django.core.files import uploadedfile
 from django.core.urlresolvers import reverse
 from django import http
 
+from horizon import tables
+
+from openstack_dashboard.api import base
 from openstack_dashboard.test import helpers as test
 
+from nec_portal.api import group_sync
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import row_cache
 from nec_portal.dashboards.project.groups import constants
+from nec_portal.dashboards.project.groups import role_matrix
 
 GROUPS_INDEX_URL = reverse(constants.GROUPS_INDEX_URL)
 GROUP_CREATE_URL = reverse(constants.GROUPS_CREATE_URL)
@@ -29,6 +38,10 @@ GROUP_UPDATE_URL = reverse(constants.GROUPS_UPDATE_URL, args=[1])
 GROUP_MANAGE_URL = reverse(constants.GROUPS_MANAGE_URL, args=[1])
 GROUP_ADD_MEMBER_URL = reverse(constants.GROUPS_ADD_MEMBER_URL, args=[1])
 GROUP_MODIFY_ROLES_URL = reverse(constants.GROUPS_MODIFY_ROLES_URL, args=[1])
+GROUP_MODIFY_ROLES_PREVIEW_URL = reverse(
+    constants.GROUPS_MODIFY_ROLES_PREVIEW_URL, args=[1])
+GROUPS_EXPORT_URL = reverse(constants.GROUPS_EXPORT_URL)
+GROUP_SYNC_MEMBERS_URL = reverse(constants.GROUPS_SYNC_MEMBERS_URL, args=[1])
 
 
 class GroupsViewTests(test.BaseAdminViewTests):
@@ -66,6 +79,30 @@ class GroupsViewTests(test.BaseAdminViewTests):
         self.assertContains(res, 'Edit')
         self.assertContains(res, 'Delete Group')
 
+    @test.create_stubs({project_identity: ('project_group_list',)})
+    def test_index_reuses_rows(self):
+        domain_id = self._get_domain_id()
+        groups = self._get_groups(domain_id)
+        project_identity.project_group_list(project=IsA('str'),
+                                            domain=domain_id) \
+            .MultipleTimes().AndReturn(groups)
+        row_cache.CACHE.clear()
+
+        self.mox.ReplayAll()
+
+        first = self.client.get(GROUPS_INDEX_URL)
+
+        def load_cells(row, datum=None):
+            raise AssertionError('row %s rendered again' % row.id)
+
+        self.mox.stubs.Set(tables.Row, 'load_cells', load_cells)
+        second = self.client.get(GROUPS_INDEX_URL)
+
+        self.assertEqual(len(row_cache.CACHE._entries), len(groups))
+        for group in groups:
+            self.assertContains(second, group.name)
+        self.assertEqual(second.status_code, first.status_code)
+
     @test.create_stubs({project_identity: ('group_create',
                                            'role_list')})
     def test_create(self):
@@ -157,6 +194,54 @@ class GroupsViewTests(test.BaseAdminViewTests):
         self.assertRedirectsNoFollow(res, GROUP_MANAGE_URL)
         self.assertMessageCount(success=1)
 
+    @test.create_stubs({project_identity: ('group_get',),
+                        group_sync: ('sync_group',)})
+    def test_sync_members(self):
+        group = self.groups.get(id="1")
+        plan = group_sync.MembershipPlan(['2', '3'], ['4'])
+
+        project_identity.group_get(IsA(http.HttpRequest), group.id).\
+            AndReturn(group)
+        group_sync.sync_group(IsA(http.HttpRequest), group.id, IgnoreArg(),
+                              domain=group.domain_id, require_all=True).\
+            AndReturn(group_sync.SyncResult(plan, [], []))
+
+        self.mox.ReplayAll()
+
+        members_file = uploadedfile.SimpleUploadedFile(
+            'members.txt', b'user_two\nuser_three\n')
+        res = self.client.post(GROUP_SYNC_MEMBERS_URL,
+                               {'method': 'SyncMembersForm',
+                                'group_id': group.id,
+                                'members_file': members_file})
+
+        self.assertNoFormErrors(res)
+        self.assertRedirectsNoFollow(res, GROUP_MANAGE_URL)
+        self.assertMessageCount(success=1)
+
+    @test.create_stubs({project_identity: ('group_get',),
+                        group_sync: ('sync_group',)})
+    def test_sync_members_refuses_unknown_users(self):
+        group = self.groups.get(id="1")
+
+        project_identity.group_get(IsA(http.HttpRequest), group.id).\
+            AndReturn(group)
+        group_sync.sync_group(IsA(http.HttpRequest), group.id, IgnoreArg(),
+                              domain=group.domain_id, require_all=True).\
+            AndRaise(group_sync.IncompleteTargets(['erin']))
+
+        self.mox.ReplayAll()
+
+        members_file = uploadedfile.SimpleUploadedFile(
+            'members.txt', b'user_two\nerin\n')
+        res = self.client.post(GROUP_SYNC_MEMBERS_URL,
+                               {'method': 'SyncMembersForm',
+                                'group_id': group.id,
+                                'members_file': members_file})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertMessageCount(error=1)
+
     @test.create_stubs({project_identity: ('group_user_list',
                                            'remove_group_user',)})
     def test_remove_user(self):
@@ -235,6 +320,82 @@ class GroupsViewTests(test.BaseAdminViewTests):
         self.assertRedirectsNoFollow(res, GROUPS_INDEX_URL)
         self.assertMessageCount(success=1)
 
+    @test.create_stubs({project_identity: ('roles_for_group',
+                                           'role_list',
+                                           'add_group_role',
+                                           'remove_group_role')})
+    def test_modify_role_update_grants_and_revokes(self):
+        group = self.groups.get(id="1")
+        roles = [base.APIDictWrapper({'id': 'r1', 'name': 'C__DC1__Reader'}),
+                 base.APIDictWrapper({'id': 'r2', 'name': 'C__DC2__Reader'})]
+
+        project_identity.roles_for_group(IsA(http.HttpRequest),
+                                         group=group.id, project=IsA('str')).\
+            AndReturn([roles[0]])
+        project_identity.role_list(IsA(http.HttpRequest)).AndReturn(roles)
+        # The changes are applied concurrently.
+        project_identity.add_group_role(IsA(http.HttpRequest), role='r2',
+                                        group=group.id, project=IsA('str')).\
+            InAnyOrder()
+        project_identity.remove_group_role(IsA(http.HttpRequest), role='r1',
+                                           group=group.id,
+                                           project=IsA('str')).\
+            InAnyOrder().AndRaise(self.exceptions.keystone)
+
+        self.mox.ReplayAll()
+
+        form_data = {'method': 'ModifyRolesForm',
+                     'group_id': group.id,
+                     'checked': ['C__DC2__Reader']}
+        res = self.client.post(GROUP_MODIFY_ROLES_URL, form_data)
+
+        self.assertRedirectsNoFollow(res, GROUPS_INDEX_URL)
+        self.assertMessageCount(success=0, warning=1, error=1)
+
+    @test.create_stubs({project_identity: ('roles_for_group',
+                                           'role_list')})
+    def test_modify_role_preview(self):
+        group = self.groups.get(id="1")
+        roles = [base.APIDictWrapper({'id': 'r1', 'name': 'C__DC1__Reader'}),
+                 base.APIDictWrapper({'id': 'r2', 'name': 'C__DC2__Reader'})]
+
+        project_identity.roles_for_group(IsA(http.HttpRequest),
+                                         group=group.id, project=IsA('str')).\
+            AndReturn([roles[0]])
+        project_identity.role_list(IsA(http.HttpRequest)).AndReturn(roles)
+
+        self.mox.ReplayAll()
+
+        res = self.client.post(GROUP_MODIFY_ROLES_PREVIEW_URL,
+                               {'checked': ['C__DC2__Reader']})
+
+        self.assertEqual(json.loads(res.content.decode('utf-8')),
+                         {'grant': ['C__DC2__Reader'],
+                          'revoke': ['C__DC1__Reader']})
+
+    @test.create_stubs({project_identity: ('project_group_refs',
+                                           'iter_users')})
+    def test_export_groups(self):
+        domain_id = self._get_domain_id()
+        group = self.groups.get(id="1")
+        users = self.users.list()[:2]
+
+        project_identity.project_group_refs(project=IsA('str'),
+                                            domain=domain_id) \
+            .AndReturn([group])
+        project_identity.iter_users(group=group.id).AndReturn(iter(users))
+
+        self.mox.ReplayAll()
+
+        res = self.client.get(GROUPS_EXPORT_URL, {'format': 'json'})
+
+        self.assertEqual(res['Content-Disposition'],
+                         'attachment; filename="groups.json"')
+        exported = json.loads(b''.join(res.streaming_content)
+                              .decode('utf-8'))
+        self.assertEqual([row['user_id'] for row in exported],
+                         [user.id for user in users])
+
     @test.create_stubs({project_identity: ('project_group_list',)})
     def test_delete_group(self):
         domain_id = self._get_domain_id()
@@ -249,3 +410,65 @@ class GroupsViewTests(test.BaseAdminViewTests):
         res = self.client.post(GROUPS_INDEX_URL, formData)
 
         self.assertRedirectsNoFollow(res, GROUPS_INDEX_URL)
+
+
+class RoleMatrixTests(test.TestCase):
+
+    def _roles(self, *names):
+        return [base.APIDictWrapper({'id': str(i), 'name': name})
+                for i, name in enumerate(names)]
+
+    def test_build(self):
+        roles = self._roles('C__DC1__Reader', 'C__DC2__Reader',
+                            'C__DC2__Writer', 'O__DC1__Admin', 'admin')
+
+        tables = role_matrix.build(roles, ['C__DC1__Reader'],
+                                   ['C__DC2__Writer'])
+
+        self.assertEqual([t.initial for t in tables], ['C'])
+        table = tables[0]
+        self.assertEqual(table.columns, ('DC1', 'DC2'))
+        self.assertEqual([name for name, _row in table.rows],
+                         ['Reader', 'Writer'])
+        reader, writer = [row for _name, row in table.rows]
+        self.assertEqual(reader[0], role_matrix.Cell(1, 0, '0',
+                                                     'C__DC1__Reader'))
+        self.assertEqual(writer[0], role_matrix.EMPTY_CELL)
+        self.assertEqual(writer[1].target, 1)
+
+    def test_admin_tables_need_admin(self):
+        roles = self._roles('O__DC1__Admin', 'admin')
+
+        self.assertEqual(role_matrix.build(roles, [], []), ())
+        tables = role_matrix.build(roles, ['admin'], [])
+        self.assertEqual([t.initial for t in tables], ['O'])
+
+    def test_catalog_parsed_once_per_version(self):
+        roles = self._roles('C__DC1__Reader')
+        catalog = role_matrix.get_catalog(roles)
+
+        self.assertIs(role_matrix.get_catalog(self._roles('C__DC1__Reader')),
+                      catalog)
+        self.assertIsNot(role_matrix.get_catalog(
+            self._roles('C__DC1__Reader', 'C__DC1__Writer')), catalog)
+
+    def test_plan_changes(self):
+        roles = self._roles('C__DC1__Reader', 'C__DC2__Reader',
+                            'O__DC1__Admin', 'admin', '_member_')
+
+        plan = role_matrix.plan_changes(
+            roles, ['C__DC1__Reader', '_member_'],
+            ['C__DC2__Reader', 'O__DC1__Admin', 'unknown'])
+
+        self.assertEqual(plan.grant, frozenset(['C__DC2__Reader',
+                                                'O__DC1__Admin', 'admin']))
+        self.assertEqual(plan.revoke, frozenset(['C__DC1__Reader']))
+
+    def test_plan_changes_nothing_checked(self):
+        roles = self._roles('C__DC1__Reader', '_member_')
+
+        plan = role_matrix.plan_changes(
+            roles, ['C__DC1__Reader', '_member_'], [], ['_member_'])
+
+        self.assertEqual(plan, role_matrix.RolePlan(
+            frozenset(), frozenset(['C__DC1__Reader'])))
@@ -23,12 +23,20 @@ urlpatterns = patterns(
     '',
     url(r'^$', views.IndexView.as_view(), name='index'),
     url(r'^create$', views.CreateView.as_view(), name='create'),
+    url(r'^export/$', views.ExportView.as_view(), name='export'),
+    url(r'^row_updates/$', views.RowUpdatesView.as_view(),
+        name='row_updates'),
+    url(r'^events/$', views.ChangeEventsView.as_view(), name='events'),
     url(r'^(?P<group_id>[^/]+)/update/$',
         views.UpdateView.as_view(), name='update'),
     url(r'^(?P<group_id>[^/]+)/manage_members/$',
         views.ManageMembersView.as_view(), name='manage_members'),
     url(r'^(?P<group_id>[^/]+)/add_members/$',
         views.NonMembersView.as_view(), name='add_members'),
+    url(r'^(?P<group_id>[^/]+)/sync_members/$',
+        views.SyncMembersView.as_view(), name='sync_members'),
     url(r'^(?P<group_id>[^/]+)/modify_roles/$',
         views.ModifyRolesView.as_view(), name='modify_roles'),
+    url(r'^(?P<group_id>[^/]+)/modify_roles/preview/$',
+        views.ModifyRolesPreviewView.as_view(), name='modify_roles_preview'),
 )
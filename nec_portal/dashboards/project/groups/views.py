@@ -17,7 +17,9 @@ import logging
 
 from django.core.urlresolvers import reverse
 from django.core.urlresolvers import reverse_lazy
+from django import http
 from django.utils.translation import ugettext_lazy as _
+from django.views import generic
 
 from horizon import exceptions
 from horizon import forms
@@ -27,18 +29,23 @@ from horizon.utils import memoized
 from openstack_auth import utils as auth_utils
 
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import identity_views
 from nec_portal.dashboards.project.groups import constants
 from nec_portal.dashboards.project.groups \
     import forms as project_forms
+from nec_portal.dashboards.project.groups import role_matrix
 from nec_portal.dashboards.project.groups \
     import tables as project_tables
-from nec_portal.local import nec_portal_settings as nec_set
 
 LOG = logging.getLogger(__name__)
 
 
-class IndexView(tables.DataTableView):
+class IndexView(identity_views.IdentityStatusMixin,
+                identity_views.ConditionalListingMixin,
+                identity_views.StreamingListingMixin,
+                tables.DataTableView):
     table_class = project_tables.GroupsTable
+    listing = 'groups'
     template_name = constants.GROUPS_INDEX_VIEW_TEMPLATE
     page_title = _("Groups")
 
@@ -54,6 +61,28 @@ class IndexView(tables.DataTableView):
                               _('Unable to retrieve group list.'))
         return groups
 
+    def iter_data(self):
+        return project_identity.iter_project_groups(
+            project=self.request.user.project_id,
+            domain=self.request.session.get('domain_context', None))
+
+
+class RowUpdatesView(identity_views.RowUpdatesView):
+    table_class = project_tables.GroupsTable
+
+    def get_objects(self, ids):
+        wanted = set(ids)
+        return dict((group.id, group) for group in
+                    project_identity.project_group_list(
+                        project=self.request.user.project_id,
+                        domain=self.request.session.get('domain_context',
+                                                        None))
+                    if group.id in wanted)
+
+
+class ChangeEventsView(identity_views.ChangeEventsView):
+    listing = 'groups'
+
 
 class CreateView(forms.ModalFormView):
     template_name = constants.GROUPS_CREATE_VIEW_TEMPLATE
@@ -100,6 +129,29 @@ class UpdateView(forms.ModalFormView):
                 'description': group.description}
 
 
+class SyncMembersView(forms.ModalFormView):
+    template_name = constants.GROUPS_SYNC_MEMBERS_VIEW_TEMPLATE
+    modal_header = _("Synchronize Members")
+    form_id = "sync_members_form"
+    form_class = project_forms.SyncMembersForm
+    submit_url = constants.GROUPS_SYNC_MEMBERS_URL
+    submit_label = _("Synchronize")
+    page_title = _("Synchronize Members")
+
+    def get_success_url(self):
+        return reverse(constants.GROUPS_MANAGE_URL,
+                       args=(self.kwargs['group_id'],))
+
+    def get_context_data(self, **kwargs):
+        context = super(SyncMembersView, self).get_context_data(**kwargs)
+        context['submit_url'] = reverse(self.submit_url,
+                                        args=(self.kwargs['group_id'],))
+        return context
+
+    def get_initial(self):
+        return {'group_id': self.kwargs['group_id']}
+
+
 class GroupManageMixin(object):
     @memoized.memoized_method
     def _get_group(self):
@@ -123,7 +175,8 @@ class GroupManageMixin(object):
                       all_project_users)
 
 
-class ManageMembersView(GroupManageMixin, tables.DataTableView):
+class ManageMembersView(identity_views.IdentityStatusMixin,
+                        GroupManageMixin, tables.DataTableView):
     table_class = project_tables.GroupMembersTable
     template_name = constants.GROUPS_MANAGE_VIEW_TEMPLATE
     page_title = _("Group Management: {{ group.name }}")
@@ -181,64 +234,18 @@ class ModifyRolesView(forms.ModalFormView):
         context = super(ModifyRolesView, self).get_context_data(**kwargs)
         args = (self.kwargs['group_id'],)
         context['submit_url'] = reverse(self.submit_url, args=args)
+        context['preview_url'] = reverse(
+            constants.GROUPS_MODIFY_ROLES_PREVIEW_URL, args=args)
         context['group_id'] = self.kwargs['group_id']
         context['group_name'] = self.get_group_object().name
-        context['roles_list'] = []
-
-        role_operator = self.get_user_role(self.request.user.id)
-        role_target = self.get_group_role(self.kwargs['group_id'])
-        role_all = self.get_data()
-        roles_list = {}
-        dsp_role = {}
-
-        for role in role_all:
-            if str(role.name).count('__') == 2:
-
-                initial, region, rolename = str(role.name).split('__')
-                if initial not in roles_list:
-                    roles_list[initial] = {}
-                    dsp_role[initial] = []
-                if region not in roles_list[initial]:
-                    roles_list[initial][region] = {}
-                if rolename not in roles_list[initial][region]:
-                    roles_list[initial][region][rolename] = []
-                if rolename not in dsp_role[initial]:
-                    dsp_role[initial].append(rolename)
-
-                flg_operator = 0
-                flg_target = 0
-                if role.name in role_operator:
-                    flg_operator = 1
-                if role.name in role_target:
-                    flg_target = 1
-                roles_list[initial][region][rolename] = [flg_operator,
-                                                         flg_target,
-                                                         role.id,
-                                                         role.name]
-
-        set_role_conf = getattr(nec_set, 'TBL_ROLE_ALL', None)
-        for set_role in set_role_conf:
-
-            if set_role['policy'] == 'admin':
-                if 'admin' not in role_operator:
-                    continue
-            initial = set_role['initial']
-            if initial not in roles_list:
-                continue
-
-            set_role['dsp_col'] = []
-            set_role['dsp_row'] = {}
-            for region, role in sorted(roles_list[initial].iteritems()):
-                for key in dsp_role[initial]:
-                    if key not in set_role['dsp_row']:
-                        set_role['dsp_row'][key] = []
-                    value = [3, 0, '', '']
-                    if key in role:
-                        value = role[key]
-                    set_role['dsp_row'][key].append(value)
-                set_role['dsp_col'].append(region)
-            context['roles_list'].append(set_role)
-
+        context['roles_list'] = role_matrix.build(
+            self.get_data(),
+            self.get_user_role(self.request.user.id),
+            self.get_group_role(self.kwargs['group_id']))
+        context['inheritance'] = project_identity.inherited_grants_enabled()
+        if context['inheritance']:
+            context['inherited'] = bool(self.get_group_role(
+                self.kwargs['group_id'], inherited=True))
         return context
 
     @memoized.memoized_method
@@ -265,12 +272,13 @@ class ModifyRolesView(forms.ModalFormView):
         return role_names
 
     @memoized.memoized_method
-    def get_group_role(self, group_id):
+    def get_group_role(self, group_id, inherited=False):
         role_name_list = []
+        kwargs = {'inherited': True} if inherited else {}
         try:
             roles = project_identity.roles_for_group(
                 self.request, group=group_id,
-                project=self.request.user.project_id)
+                project=self.request.user.project_id, **kwargs)
         except Exception:
             redirect = self.get_redirect_url()
             exceptions.handle(self.request,
@@ -290,3 +298,32 @@ class ModifyRolesView(forms.ModalFormView):
             exceptions.handle(self.request,
                               _('Unable to retrieve user information.'),
                               redirect=redirect)
+
+
+class ModifyRolesPreviewView(generic.View):
+    """Returns the roles saving the Modify Roles dialog would grant and
+    revoke, as JSON, without changing anything.
+    """
+
+    def post(self, request, group_id):
+        try:
+            plan, inherited_plan, _role_ids = project_forms.plan_group_roles(
+                request, group_id, request.POST.getlist('checked'),
+                inherited=bool(request.POST.get('inherited')))
+        except Exception:
+            LOG.exception('Unable to plan the roles of group %s.', group_id)
+            return http.HttpResponseServerError()
+        changes = {'grant': sorted(plan.grant),
+                   'revoke': sorted(plan.revoke)}
+        if inherited_plan is not None:
+            changes['grant_inherited'] = sorted(inherited_plan.grant)
+            changes['revoke_inherited'] = sorted(inherited_plan.revoke)
+        return http.JsonResponse(changes)
+
+
+class ExportView(identity_views.ExportView):
+    export = 'groups'
+
+    def get_export_arguments(self):
+        return {'project': self.request.user.project_id,
+                'domain': self.request.session.get('domain_context', None)}
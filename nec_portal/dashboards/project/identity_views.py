@@ -0,0 +1,391 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import datetime
+import functools
+import json
+import logging
+import time
+
+from django.contrib.messages import get_messages
+from django import http
+from django.utils import cache as cache_utils
+from django.utils.html import format_html
+from django.utils.translation import ugettext_lazy as _
+from django.views.decorators import http as http_decorators
+from django.views import generic
+
+from horizon import messages
+
+from nec_portal.api import deadline
+from nec_portal.api import identity_events
+from nec_portal.api import identity_export
+from nec_portal.api import identity_generations
+from nec_portal.api import policy_decisions
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+
+LOG = logging.getLogger(__name__)
+VIEW_DEADLINE = getattr(nec_set, 'IDENTITY_VIEW_DEADLINE', None)
+STALE_DATA_MESSAGE = _("The identity service is not responding. "
+                       "The data shown may be stale and changes are "
+                       "disabled until it recovers.")
+PARTIAL_DATA_MESSAGE = _("The identity service took too long to answer. "
+                         "Some of the information on this page could not "
+                         "be retrieved.")
+STREAMING_SETTING = getattr(nec_set, 'IDENTITY_STREAMING', {})
+STREAM_ERROR_MESSAGE = _("Unable to retrieve the complete list.")
+ROWS_MARKER = '<!--nec-portal-streamed-rows-->'
+FOOTER_COUNT_SCRIPT = ('<script type="text/javascript">$(function () {'
+                       ' horizon.datatables.update_footer_count($("#%s"));'
+                       ' });</script>')
+
+
+def _add_server_timing(request, start, response):
+    entries = [policy_decisions.server_timing(request)]
+    # A streamed page is only timed up to its first row.
+    name = 'shell' if getattr(response, 'streaming', False) else 'total'
+    entries.append('%s;dur=%.1f' % (name, (time.time() - start) * 1000))
+    response['Server-Timing'] = ', '.join(
+        entry for entry in entries if entry)
+
+
+class IdentityStatusMixin(object):
+    """Runs the view within the identity deadline and shows a banner when
+    the data is stale or incomplete.
+
+    The response reports the time spent authorizing and in total, table
+    rendering included, in a Server-Timing header.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        start = time.time()
+        with deadline.deadline_scope(VIEW_DEADLINE):
+            response = super(IdentityStatusMixin, self).dispatch(
+                request, *args, **kwargs)
+        if policy_decisions.AUTHORIZATION_SETTING.get('server_timing',
+                                                      True):
+            add = functools.partial(_add_server_timing, request, start)
+            if getattr(response, 'is_rendered', True):
+                add(response)
+            else:
+                response.add_post_render_callback(add)
+        return response
+
+    def render_to_response(self, context, **response_kwargs):
+        # The context is complete at this point, so every identity call
+        # the page needs has either been made or been cut short.
+        if project_identity.is_degraded():
+            messages.warning(self.request, STALE_DATA_MESSAGE)
+        budget = deadline.current()
+        if budget is not None and budget.exhausted:
+            messages.warning(self.request, PARTIAL_DATA_MESSAGE)
+        return super(IdentityStatusMixin, self).render_to_response(
+            context, **response_kwargs)
+
+
+class ConditionalListingMixin(object):
+    """Serves ETag and Last-Modified on a listing page and on its row
+    updates, and answers 304 without building the table while the
+    identity_generations version of the listing did not change.
+    """
+    listing = None
+
+    def get_listing_project(self):
+        return self.request.user.project_id
+
+    def _version(self, request):
+        if getattr(self, '_listing_version', None) is not None:
+            return self._listing_version
+        user = request.user
+        scope = [request.get_full_path(), user.id, user.project_id,
+                 sorted(role['name'] for role in
+                        getattr(user, 'roles', None) or []),
+                 request.session.get('domain_context'),
+                 getattr(request, 'LANGUAGE_CODE', None),
+                 # Renewed with the CSRF token of the forms at login.
+                 request.session.session_key]
+        self._listing_version = identity_generations.version(
+            self.listing, self.get_listing_project(), scope)
+        return self._listing_version
+
+    def _etag(self, request, *args, **kwargs):
+        # Messages waiting to be shown must not be swallowed by a 304.
+        if len(get_messages(request)):
+            return None
+        return self._version(request)[0]
+
+    def _last_modified(self, request, *args, **kwargs):
+        # Only trusted with the ETag, which also covers the user and the
+        # query string.
+        if 'HTTP_IF_NONE_MATCH' not in request.META and \
+                'HTTP_IF_MODIFIED_SINCE' in request.META:
+            return None
+        if len(get_messages(request)):
+            return None
+        return datetime.datetime.utcfromtimestamp(
+            self._version(request)[1])
+
+    def get(self, request, *args, **kwargs):
+        get = super(ConditionalListingMixin, self).get
+        if not identity_generations.enabled():
+            return get(request, *args, **kwargs)
+        response = http_decorators.condition(
+            etag_func=self._etag,
+            last_modified_func=self._last_modified)(get)(
+                request, *args, **kwargs)
+        budget = deadline.current()
+        if project_identity.is_degraded() or response.streaming or (
+                budget is not None and budget.exhausted):
+            # Stale or partial data is not to be revalidated as current,
+            # nor rows not yet read.
+            for header in ('ETag', 'Last-Modified'):
+                if response.has_header(header):
+                    del response[header]
+        cache_utils.patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class _RowsMarker(object):
+    """Stands for the streamed rows in the rendered table."""
+    id = None
+
+    def render(self):
+        return ROWS_MARKER
+
+
+class StreamingListingMixin(object):
+    """Streams the page of a large listing: the page up to the table rows
+    goes out at once, then the rows in chunks of
+    IDENTITY_STREAMING['chunk_size'] as iter_data() yields their objects,
+    then the rest of the page.
+
+    Used when IDENTITY_STREAMING['enabled'] is set, or asked for with
+    ``?stream=1``.
+    """
+
+    def streaming_requested(self):
+        value = self.request.GET.get('stream')
+        if value is not None:
+            return value not in ('', '0', 'false')
+        return STREAMING_SETTING.get('enabled', False)
+
+    def iter_data(self):
+        """Return an iterator over the objects of the table."""
+        return iter(self.get_data())
+
+    def iter_rows(self, table, data):
+        """Yield the rows of the objects of ``data``, in table order."""
+        for datum in data:
+            yield table._meta.row_class(table, datum)
+
+    def _get_data_dict(self):
+        if getattr(self, '_streamed_data', None) is not None:
+            # The table is rendered without rows; they follow.
+            return {self.table_class._meta.name: []}
+        return super(StreamingListingMixin, self)._get_data_dict()
+
+    def get(self, request, *args, **kwargs):
+        get = super(StreamingListingMixin, self).get
+        if request.is_ajax() or not self.streaming_requested():
+            return get(request, *args, **kwargs)
+        # Views whose listing is not lazy read it before the table
+        # header, which may depend on it.
+        self._streamed_data = self.iter_data()
+        response = get(request, *args, **kwargs)
+        if not hasattr(response, 'render'):
+            return response
+        table = self.get_table()
+        table.get_rows = lambda: [_RowsMarker()]
+        response.render()
+        content = response.content.decode(response.charset)
+        if ROWS_MARKER not in content:
+            return response
+        head, tail = content.split(ROWS_MARKER, 1)
+        streamed = http.StreamingHttpResponse(
+            self._stream(table, head, tail),
+            content_type=response['Content-Type'])
+        for header, value in response.items():
+            streamed[header] = value
+        streamed.cookies = response.cookies
+        return streamed
+
+    def _message_row(self, table, message):
+        return format_html('<tr class="odd empty"><td colspan="{0}">{1}'
+                           '</td></tr>', len(table.get_columns()), message)
+
+    def _stream(self, table, head, tail):
+        chunk_size = STREAMING_SETTING.get('chunk_size', 200)
+        yield head
+        chunk = []
+        count = 0
+        try:
+            for row in self.iter_rows(table, self._streamed_data):
+                chunk.append(row.render())
+                count += 1
+                if len(chunk) >= chunk_size:
+                    yield ''.join(chunk)
+                    chunk = []
+        except Exception:
+            # The head is sent; all that is left is to say so in the table.
+            LOG.exception('Unable to stream the rows of %s.', table.name)
+            chunk.append(self._message_row(table, STREAM_ERROR_MESSAGE))
+        else:
+            if not count:
+                chunk.append(self._message_row(table,
+                                               table.get_empty_message()))
+        # The footer was rendered while the table had no rows.
+        body_end = tail.rfind('</body>')
+        if body_end != -1:
+            tail = (tail[:body_end] +
+                    FOOTER_COUNT_SCRIPT % table.slugify_name() +
+                    tail[body_end:])
+        chunk.append(tail)
+        yield ''.join(chunk)
+
+
+class RowUpdatesView(generic.View):
+    """Renders the rows of many objects of a table at once, so that the
+    ajax-update rows of a page are refreshed with a single request.
+
+    Returns {object id: row html} for ``?ids=...``; an object no longer
+    found maps to an empty string.
+    """
+    table_class = None
+    max_ids = 100
+
+    def get_objects(self, ids):
+        """Return {object id: datum} for the ids found."""
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        ids = request.GET.getlist('ids')[:self.max_ids]
+        table = self.table_class(request, **kwargs)
+        try:
+            objects = self.get_objects(ids) if ids else {}
+        except Exception:
+            LOG.exception('Unable to retrieve the rows of %s.',
+                          table._meta.name)
+            return http.HttpResponseServerError()
+        rows = {}
+        for obj_id in ids:
+            datum = objects.get(obj_id)
+            rows[obj_id] = '' if datum is None else \
+                table._meta.row_class(table, datum).render()
+        return http.JsonResponse(rows)
+
+
+def _server_sent_event(event, event_id, data):
+    return 'event: %s\nid: %d\ndata: %s\n\n' % (
+        event, event_id, json.dumps(data))
+
+
+def _retry():
+    return identity_events.CHANGE_EVENTS_SETTING.get('retry', 5)
+
+
+class ChangeEventsView(generic.View):
+    """Follows the identity_events journal of a listing for an open table.
+
+    Clients accepting text/event-stream get server-sent events for
+    IDENTITY_CHANGE_EVENTS['wait'] seconds, then reconnect with
+    Last-Event-ID after IDENTITY_CHANGE_EVENTS['retry'] seconds. Others
+    poll with ``?since=<last_id>`` and get
+    {'last_id': ..., 'reset': ..., 'events': [...], 'retry': ...}.
+
+    The request holds a worker while it waits, so 'wait' is kept short
+    unless the portal runs with asynchronous workers.
+    """
+    listing = None
+
+    def get_since(self):
+        value = (self.request.META.get('HTTP_LAST_EVENT_ID') or
+                 self.request.GET.get('since'))
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, request, *args, **kwargs):
+        if not identity_events.enabled():
+            # EventSource gives up on a 204 instead of reconnecting.
+            return http.HttpResponse(status=204)
+        since = self.get_since()
+        seconds = identity_events.CHANGE_EVENTS_SETTING.get('wait', 2)
+        if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+            response = http.StreamingHttpResponse(
+                self.stream(since, seconds),
+                content_type='text/event-stream')
+            response['X-Accel-Buffering'] = 'no'
+        else:
+            if since is None:
+                events, latest = [], identity_events.last_id()
+            else:
+                events, latest = identity_events.wait(
+                    since, seconds, self.listing, request.user.project_id)
+            response = http.JsonResponse({
+                'last_id': latest,
+                'reset': events is None,
+                'events': [{'id': event.id, 'ids': event.ids}
+                           for event in events or ()],
+                'retry': _retry()})
+        cache_utils.add_never_cache_headers(response)
+        return response
+
+    def stream(self, since, seconds):
+        end = time.time() + seconds
+        yield 'retry: %d\n\n' % (_retry() * 1000)
+        if since is None:
+            since = identity_events.last_id()
+            yield _server_sent_event('ready', since, {})
+        while time.time() < end:
+            events, latest = identity_events.wait(
+                since, end - time.time(), self.listing,
+                self.request.user.project_id)
+            if events is None:
+                yield _server_sent_event('reset', latest, {})
+            for event in events or ():
+                yield _server_sent_event('change', event.id,
+                                         {'ids': event.ids})
+            since = latest
+
+
+class ExportView(generic.View):
+    """Streams an identity_export export as a CSV or JSON attachment.
+
+    ``?format=json`` selects JSON; CSV is the default.
+    """
+    export = None
+
+    def get_export_arguments(self):
+        """Return the arguments of the export's row generator besides the
+        request.
+        """
+        return {'project': self.request.user.project_id}
+
+    def get_filename(self):
+        return self.export
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in identity_export.FORMATS:
+            raise http.Http404
+        fields, row_generator = identity_export.EXPORTS[self.export]
+        rows = row_generator(request, **self.get_export_arguments())
+        response = http.StreamingHttpResponse(
+            identity_export.SERIALIZERS[fmt](fields, rows),
+            content_type=identity_export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = (
+            'attachment; filename="%s.%s"' % (self.get_filename(), fmt))
+        return response
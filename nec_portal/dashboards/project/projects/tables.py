@@ -15,28 +15,33 @@ import logging
 
 from django.core.urlresolvers import reverse
 from django.template import defaultfilters as filters
+from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
 
 from openstack_auth import utils as auth_utils
 
+from horizon import messages
 from horizon import tables
 from keystoneclient.exceptions import Conflict
 
+from nec_portal.api import policy_decisions
+from nec_portal.api import project_cascade
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import row_cache
 from nec_portal.local import nec_portal_settings as nec_set
 
-from openstack_dashboard import api
-from openstack_dashboard import policy
-
 LOG = logging.getLogger(__name__)
+CASCADE_DELETE_SETTING = getattr(nec_set, 'IDENTITY_CASCADE_DELETE', {})
+PROJECT_TREE_SETTING = getattr(nec_set, 'IDENTITY_PROJECT_TREE', {})
 STATUS_CHOICES = (
     ("true", True),
     ("false", False)
 )
 
 
-class UpdateMembersLink(tables.LinkAction):
+class UpdateMembersLink(policy_decisions.PolicyDecisionMixin,
+                        tables.LinkAction):
     name = "users"
     verbose_name = _("Manage Members")
     url = "horizon:project:projects:manage_members"
@@ -46,7 +51,7 @@ class UpdateMembersLink(tables.LinkAction):
     def allowed(self, request, project):
         if request.user.project_id == project.id:
             return False
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
 
 
 class CreateProject(tables.LinkAction):
@@ -58,10 +63,33 @@ class CreateProject(tables.LinkAction):
     policy_rules = (('identity', 'identity:create_project'),)
 
     def allowed(self, request, project):
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
+
 
+class CloneProject(policy_decisions.PolicyDecisionMixin,
+                   tables.LinkAction):
+    name = "clone"
+    verbose_name = _("Clone Project")
+    url = "horizon:project:projects:clone"
+    classes = ("ajax-modal",)
+    icon = "plus"
+    policy_rules = (('identity', 'identity:create_project'),)
+
+    def allowed(self, request, project):
+        return policy_decisions.can_edit(request, 'project')
 
-class UpdateProject(tables.LinkAction):
+
+class ExportRolesLink(policy_decisions.PolicyDecisionMixin,
+                      tables.LinkAction):
+    name = "export_roles"
+    verbose_name = _("Export Role Assignments")
+    url = "horizon:project:projects:export_roles"
+    icon = "download"
+    policy_rules = (("identity", "identity:list_role_assignments"),)
+
+
+class UpdateProject(policy_decisions.PolicyDecisionMixin,
+                    tables.LinkAction):
     name = "update"
     verbose_name = _("Edit Project")
     url = "horizon:project:projects:update"
@@ -70,10 +98,11 @@ class UpdateProject(tables.LinkAction):
     policy_rules = (('identity', 'identity:update_project'),)
 
     def allowed(self, request, project):
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
 
 
-class DeleteTenantsAction(tables.DeleteAction):
+class DeleteTenantsAction(policy_decisions.PolicyDecisionMixin,
+                          tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -93,7 +122,7 @@ class DeleteTenantsAction(tables.DeleteAction):
     policy_rules = (("identity", "identity:delete_project"),)
 
     def allowed(self, request, project):
-        if not api.keystone.keystone_can_edit_project() or \
+        if not policy_decisions.can_edit(request, 'project') or \
                 (project and project.id == request.user.project_id):
             return False
         return True
@@ -111,6 +140,61 @@ class DeleteTenantsAction(tables.DeleteAction):
         return response
 
 
+class CascadeDeleteTenantsAction(DeleteTenantsAction):
+    name = "cascade_delete"
+
+    @staticmethod
+    def action_present(count):
+        return ungettext_lazy(
+            u"Delete Project and Subprojects",
+            u"Delete Projects and Subprojects",
+            count
+        )
+
+    @staticmethod
+    def action_past(count):
+        return ungettext_lazy(
+            u"Deleted Project and Subprojects",
+            u"Deleted Projects and Subprojects",
+            count
+        )
+
+    def allowed(self, request, project):
+        if not CASCADE_DELETE_SETTING.get('enabled', False):
+            return False
+        return super(CascadeDeleteTenantsAction, self).allowed(request,
+                                                               project)
+
+    def delete(self, request, obj_id):
+        # Neither the selected project nor a subtree holding it can be
+        # deleted.
+        if request.user.project_id == obj_id:
+            raise Conflict
+        try:
+            result = project_cascade.cascade_delete(
+                request, obj_id,
+                revoke_assignments=CASCADE_DELETE_SETTING.get(
+                    'revoke_assignments', False),
+                concurrency=CASCADE_DELETE_SETTING.get('concurrency'),
+                protected=[request.user.project_id])
+        except project_cascade.ProtectedProject:
+            raise Conflict
+        if result.failed or result.skipped:
+            messages.warning(
+                request,
+                _('Deleted %(deleted)d of %(total)d projects; %(failed)d '
+                  'could not be deleted and %(skipped)d were kept for '
+                  'their subprojects.') % {
+                    'deleted': len(result.deleted),
+                    'total': (len(result.deleted) + len(result.failed) +
+                              len(result.skipped)),
+                    'failed': len(result.failed),
+                    'skipped': len(result.skipped)})
+            # Reported by the action as a failure to delete the project.
+            raise Conflict('Subtree of project %s partially deleted.'
+                           % obj_id)
+
+
 class TenantFilterAction(tables.FilterAction):
     def filter(self, table, tenants, filter_string):
         """Really naive case-insensitive search."""
@@ -125,7 +209,7 @@ class TenantFilterAction(tables.FilterAction):
         return filter(comp, tenants)
 
 
-class UpdateRow(tables.Row):
+class UpdateRow(row_cache.CachedRowMixin, tables.Row):
     ajax = True
 
     def get_data(self, request, project_id):
@@ -133,12 +217,23 @@ class UpdateRow(tables.Row):
                                                     admin=True)
         return project_info
 
+    def is_unloaded_branch(self, datum):
+        return datum.id in getattr(self.table, 'unloaded_branches', ())
+
+    def get_fragment_key(self, datum):
+        key = super(UpdateRow, self).get_fragment_key(datum)
+        if key and self.is_unloaded_branch(datum):
+            return key + ':branch'
+        return key
+
     def load_cells(self, datum=None):
         super(UpdateRow, self).load_cells(datum=datum)
         if hasattr(self.datum, 'parent'):
             self.attrs['data-tt-id'] = self.datum.id
             if self.datum.parent:
                 self.attrs['data-tt-parent-id'] = self.datum.parent.id
+            if self.is_unloaded_branch(self.datum):
+                self.attrs['data-tt-branch'] = 'true'
 
 
 class TenantsTable(tables.DataTable):
@@ -217,51 +312,117 @@ class TenantsTable(tables.DataTable):
                         project.parent = search_parent_project
                         break
 
-    def get_rows(self):
+    def arrange_tree(self):
+        """Set the parent and immediate_subprojects of the projects, and
+        return the project of the user, the root of the tree, or None when
+        the projects cannot be shown as a tree.
+        """
+        self.unloaded_branches = set()
         projects = self.filtered_data
         if (projects and hasattr(projects[0], 'parent_id')
                 and project_identity.VERSIONS.active >= 3):
 
             self.set_immediate_parent(projects)
-            if policy.check((("identity", "identity:get_project"),),
-                            self.request):
+            if policy_decisions.check(
+                    (("identity", "identity:get_project"),), self.request):
                 self.set_closer_parent(projects, self.request)
 
         if not projects or not hasattr(projects[0], 'parent'):
-            return super(TenantsTable, self).get_rows()
+            return None
 
+        children = {}
         for project in projects:
-            project.immediate_subprojects = []
-            for child in projects:
-                if child.parent and child.parent.id == project.id:
-                    project.immediate_subprojects.append(child)
+            if project.parent:
+                children.setdefault(project.parent.id, []).append(project)
+        for project in projects:
+            project.immediate_subprojects = children.get(project.id, [])
 
         for project in projects:
             if project.id == self.request.user.project_id:
-                root_projects = [project]
+                return project
+        return None
+
+    def _make_row(self, project):
+        row = self._meta.row_class(self, project)
+        if self.get_object_id(project) == self.current_item_id:
+            self.selected = True
+            row.classes.append('current_selected')
+        return row
+
+    def get_rows(self):
+        root = self.arrange_tree()
+        if root is None:
+            return super(TenantsTable, self).get_rows()
+
+        # Subprojects below initial_depth, and those of a project with more
+        # than branch_size of them, are rendered when their parent is
+        # expanded (see get_branch_rows).
+        lazy = PROJECT_TREE_SETTING.get('lazy', True)
+        initial_depth = PROJECT_TREE_SETTING.get('initial_depth', 1)
+        branch_size = PROJECT_TREE_SETTING.get('branch_size', 200)
         rows = []
-        while root_projects:
-            p = root_projects[0]
-            row = self._meta.row_class(self, p)
-            if self.get_object_id(p) == self.current_item_id:
-                self.selected = True
-                row.classes.append('current_selected')
-            rows.append(row)
-
-            root_projects.remove(p)
-            root_projects[0:0] = sorted(p.immediate_subprojects,
-                                        key=lambda project: project.name)
+        pending = [(root, 0)]
+        while pending:
+            p, depth = pending.pop()
+            subprojects = p.immediate_subprojects
+            if lazy and subprojects and (depth >= initial_depth or
+                                         len(subprojects) > branch_size):
+                self.unloaded_branches.add(p.id)
+                subprojects = []
+            rows.append(self._make_row(p))
+            pending.extend(
+                (child, depth + 1)
+                for child in sorted(subprojects,
+                                    key=lambda project: project.name,
+                                    reverse=True))
         return rows
 
+    def get_branch_rows(self, project_id, offset=0, limit=None):
+        """Return the rows of the subprojects of the project, from
+        ``offset`` and at most ``limit`` of them, and their number.
+
+        Their own subprojects are left to be loaded in turn.
+        """
+        self.arrange_tree()
+        parent = None
+        for project in self.filtered_data or []:
+            if project.id == project_id:
+                parent = project
+                break
+        subprojects = sorted(getattr(parent, 'immediate_subprojects', []),
+                             key=lambda project: project.name)
+        end = offset + limit if limit else None
+        rows = []
+        for project in subprojects[offset:end]:
+            if project.immediate_subprojects:
+                self.unloaded_branches.add(project.id)
+            rows.append(self._make_row(project))
+        return rows, len(subprojects)
+
+    def render_more_row(self, project_id, offset):
+        """Return the row loading the subprojects of the project from
+        ``offset`` on.
+        """
+        return format_html(
+            '<tr class="tree-more" data-tt-id="{0}__more__{1}" '
+            'data-tt-parent-id="{0}" data-offset="{1}"><td></td>'
+            '<td colspan="{2}"><a href="#">{3}</a></td></tr>',
+            project_id, offset, len(self.get_columns()) - 1,
+            _("Show more"))
+
     class Meta(object):
         name = "tenants"
         verbose_name = _("Projects")
         row_class = UpdateRow
         row_actions = (UpdateMembersLink,
                        UpdateProject,
-                       DeleteTenantsAction,)
+                       CloneProject,
+                       ExportRolesLink,
+                       DeleteTenantsAction,
+                       CascadeDeleteTenantsAction,)
         table_actions = (TenantFilterAction, CreateProject,
-                         DeleteTenantsAction,)
+                         DeleteTenantsAction,
+                         CascadeDeleteTenantsAction,)
         pagination_param = "tenant_marker"
 
 
@@ -295,7 +456,7 @@ class RemoveMembers(tables.DeleteAction):
     policy_rules = (("identity", "identity:update_project"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
 
     def action(self, request, obj_id):
         user_obj = self.table.get_object_by_id(obj_id)
@@ -350,7 +511,7 @@ class AddMembersLink(tables.LinkAction):
     policy_rules = (("identity", "identity:update_project"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
 
     def get_link_url(self, datum=None):
         return reverse(self.url, kwargs=self.table.kwargs)
@@ -401,7 +562,7 @@ class AddMembers(tables.BatchAction):
     policy_rules = (("identity", "identity:update_project"),)
 
     def allowed(self, request, user=None):
-        return api.keystone.keystone_can_edit_project()
+        return policy_decisions.can_edit(request, 'project')
 
     def action(self, request, obj_id):
         user_obj = self.table.get_object_by_id(obj_id)
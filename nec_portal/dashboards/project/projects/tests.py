@@ -12,17 +12,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+
 from mox3.mox import IsA
 
 from django.core.urlresolvers import reverse
 from django import http
 
 from openstack_dashboard import api
+from openstack_dashboard import policy
 from openstack_dashboard.test import helpers as test
 
 from horizon.workflows import views
 
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project.projects \
+    import tables as project_tables
 from nec_portal.dashboards.project.projects import workflows
 from nec_portal.local import nec_portal_settings as nec_set
 
@@ -63,6 +68,58 @@ class TenantsViewTests(test.BaseAdminViewTests):
 
         self.assertRedirectsNoFollow(res, INDEX_URL)
 
+    @test.create_stubs({policy: ('check',)})
+    def test_project_list_kwargs_own_projects(self):
+        policy.check((("identity", "identity:list_projects"),),
+                     IsA(http.HttpRequest)).AndReturn(False)
+        policy.check((("identity", "identity:list_user_projects"),),
+                     IsA(http.HttpRequest)).AndReturn(True)
+        self.mox.ReplayAll()
+
+        self.assertEqual(workflows.project_list_kwargs(self.request),
+                         {'user': self.request.user.id, 'admin': False})
+
+    @test.create_stubs({project_identity: ('project_list',)})
+    def test_row_updates(self):
+        project = self.tenants.first()
+        project_identity.project_list(IsA(http.HttpRequest), domain=None) \
+            .AndReturn([self.tenants.list(), False])
+        self.mox.ReplayAll()
+
+        res = self.client.get(
+            reverse('horizon:project:projects:row_updates'),
+            {'ids': [project.id, 'unknown']})
+        rows = json.loads(res.content.decode('utf-8'))
+
+        self.assertIn(project.name, rows[project.id])
+        self.assertEqual(rows['unknown'], '')
+
+    def _project_tree(self):
+        def project(project_id, parent=None):
+            project = api.base.APIDictWrapper({'id': project_id,
+                                               'name': project_id,
+                                               'description': '',
+                                               'enabled': True})
+            project.parent = parent
+            return project
+
+        root = project(self.request.user.project_id)
+        child = project('child', root)
+        return [project('grandchild', child), child, root]
+
+    def test_tree_loads_branches_lazily(self):
+        table = project_tables.TenantsTable(self.request,
+                                            data=self._project_tree())
+        rows = table.get_rows()
+        self.assertEqual([row.datum.id for row in rows],
+                         [self.request.user.project_id, 'child'])
+        self.assertEqual(rows[1].attrs.get('data-tt-branch'), 'true')
+
+        rows, count = table.get_branch_rows('child')
+        self.assertEqual(count, 1)
+        self.assertEqual([row.datum.id for row in rows], ['grandchild'])
+        self.assertNotIn('data-tt-branch', rows[0].attrs)
+
 
 class DetailProjectViewTests(test.BaseAdminViewTests):
     @test.create_stubs({project_identity: ('project_get',)})
@@ -137,6 +194,20 @@ class CreateProjectWorkflowTests(test.BaseAdminViewTests):
                       if group.domain_id == domain_id]
         return groups
 
+    def test_clone_refused_for_foreign_project(self):
+        self.mox.stubs.Set(project_identity, 'project_subtree',
+                           lambda request, project: {'child': None})
+        self.mox.stubs.Set(project_identity, 'project_list',
+                           lambda request, **kwargs:
+                           (self.tenants.list(), False))
+        self.mox.StubOutWithMock(project_identity, 'project_get')
+        self.mox.ReplayAll()
+
+        res = self.client.get(reverse('horizon:project:projects:clone',
+                                      args=['foreign']))
+
+        self.assertRedirectsNoFollow(res, INDEX_URL)
+
     @test.create_stubs({project_identity: ('get_default_domain',)})
     def test_add_project_get(self):
         self.roles.first()
@@ -194,6 +265,8 @@ class CreateProjectWorkflowTests(test.BaseAdminViewTests):
         self.assertQuerysetEqual(
             workflow.steps,
             ['<UpdateProjectInfo: update_info>'])
+        self.assertNotIn('inherit_roles',
+                         workflow.steps[0].action.fields)
 
     @test.create_stubs({project_identity: ('project_get',
                                            'project_user_list',)})
@@ -27,13 +27,22 @@ urlpatterns = patterns(
     '',
     url(r'^$', views.IndexView.as_view(), name='index'),
     url(r'^create$', views.CreateProjectView.as_view(), name='create'),
+    url(r'^row_updates/$', views.RowUpdatesView.as_view(),
+        name='row_updates'),
+    url(r'^events/$', views.ChangeEventsView.as_view(), name='events'),
+    url(r'^(?P<project_id>[^/]+)/clone/$',
+        views.CloneProjectView.as_view(), name='clone'),
     url(r'^(?P<project_id>[^/]+)/update/$',
         views.UpdateProjectView.as_view(), name='update'),
     url(r'^(?P<project_id>[^/]+)/detail/$',
         views.DetailProjectView.as_view(), name='detail'),
+    url(r'^(?P<project_id>[^/]+)/branch/$',
+        views.BranchView.as_view(), name='branch'),
 
     url(r'^(?P<project_id>[^/]+)/manage_members/$',
         views.ManageMembersView.as_view(), name='manage_members'),
     url(r'^(?P<project_id>[^/]+)/add_members/$',
         views.NonMembersView.as_view(), name='add_members'),
+    url(r'^(?P<project_id>[^/]+)/export_roles/$',
+        views.ExportRolesView.as_view(), name='export_roles'),
 )
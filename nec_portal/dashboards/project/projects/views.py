@@ -18,6 +18,7 @@
 #
 
 from django.core.urlresolvers import reverse
+from django import http
 from django.utils.translation import ugettext_lazy as _
 from django.views import generic
 
@@ -29,9 +30,10 @@ from horizon.utils import memoized
 from horizon import workflows
 
 from openstack_dashboard.api import keystone
-from openstack_dashboard import policy
 
+from nec_portal.api import deadline
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import identity_views
 from nec_portal.dashboards.project.projects \
     import tables as project_tables
 from nec_portal.dashboards.project.projects \
@@ -65,8 +67,12 @@ class TenantContextMixin(object):
         return context
 
 
-class IndexView(tables.DataTableView):
+class IndexView(identity_views.IdentityStatusMixin,
+                identity_views.ConditionalListingMixin,
+                identity_views.StreamingListingMixin,
+                tables.DataTableView):
     table_class = project_tables.TenantsTable
+    listing = 'projects'
     template_name = 'project/projects/index.html'
     page_title = _("Projects")
 
@@ -77,37 +83,80 @@ class IndexView(tables.DataTableView):
         projects = []
         marker = self.request.GET.get(
             project_tables.TenantsTable._meta.pagination_param, None)
-        domain_context = self.request.session.get('domain_context', None)
         self._more = False
-        if policy.check((("identity", "identity:list_projects"),),
-                        self.request):
-            try:
-                projects, self._more = project_identity.project_list(
-                    self.request,
-                    domain=domain_context,
-                    paginate=True,
-                    marker=marker)
-            except Exception:
-                exceptions.handle(self.request,
-                                  _("Unable to retrieve project list."))
-        elif policy.check((("identity", "identity:list_user_projects"),),
-                          self.request):
-            try:
-                projects, self._more = project_identity.project_list(
-                    self.request,
-                    user=self.request.user.id,
-                    paginate=True,
-                    marker=marker,
-                    admin=False)
-            except Exception:
-                exceptions.handle(self.request,
-                                  _("Unable to retrieve project information."))
-        else:
+        kwargs = project_workflows.project_list_kwargs(self.request)
+        if kwargs is None:
             msg = \
                 _("Insufficient privilege level to view project information.")
             messages.info(self.request, msg)
+            return projects
+        try:
+            projects, self._more = project_identity.project_list(
+                self.request, paginate=True, marker=marker, **kwargs)
+        except Exception:
+            if 'user' in kwargs:
+                msg = _("Unable to retrieve project information.")
+            else:
+                msg = _("Unable to retrieve project list.")
+            exceptions.handle(self.request, msg)
         return projects
 
+    def iter_rows(self, table, data):
+        # The tree needs every project of the page before its first row,
+        # so only the rendering of the rows is progressive.
+        tree = self.table_class(self.request, data=list(data))
+        return iter(tree.get_rows())
+
+
+class BranchView(IndexView):
+    """Renders the rows of the subprojects of a project, for its branch of
+    the tree of the index page to be loaded when it is expanded.
+
+    The projects are those of the same page of the index, ``?offset=``
+    subprojects on; a last row loads the next ones, if any.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+        except ValueError:
+            return http.HttpResponseBadRequest()
+        limit = project_tables.PROJECT_TREE_SETTING.get('branch_size', 200)
+        table = self.table_class(request, data=self.get_data())
+        rows, count = table.get_branch_rows(kwargs['project_id'],
+                                            offset, limit)
+        html = ''.join(row.render() for row in rows)
+        if offset + limit < count:
+            html += table.render_more_row(kwargs['project_id'],
+                                          offset + limit)
+        return http.HttpResponse(html)
+
+
+class RowUpdatesView(identity_views.RowUpdatesView):
+    table_class = project_tables.TenantsTable
+
+    def get_objects(self, ids):
+        # Only the projects the index lists, lest rows of projects the
+        # user may not list be added to the page.
+        kwargs = project_workflows.project_list_kwargs(self.request)
+        if kwargs is None:
+            return {}
+        wanted = set(ids)
+        projects, _more = project_identity.project_list(self.request,
+                                                        **kwargs)
+        by_id = dict((project.id, project) for project in projects)
+        found = {}
+        for obj_id in wanted & set(by_id):
+            project = by_id[obj_id]
+            # Keeps the row in its place in the tree.
+            project.parent = by_id.get(getattr(project, 'parent_id', None))
+            found[obj_id] = project
+        return found
+
+
+class ChangeEventsView(identity_views.ChangeEventsView):
+    listing = 'projects'
+
 
 class CreateProjectView(workflows.WorkflowView):
     workflow_class = project_workflows.CreateProject
@@ -123,6 +172,32 @@ class CreateProjectView(workflows.WorkflowView):
         return initial
 
 
+class CloneProjectView(workflows.WorkflowView):
+    workflow_class = project_workflows.CloneProject
+
+    def get_initial(self):
+        initial = super(CloneProjectView, self).get_initial()
+
+        project_id = self.kwargs['project_id']
+        initial['source_id'] = project_id
+
+        try:
+            if not project_workflows.may_clone_from(self.request,
+                                                    project_id):
+                raise exceptions.NotFound()
+            source = project_identity.project_get(self.request, project_id,
+                                                  admin=True)
+            domain = project_identity.get_default_domain(self.request)
+        except Exception:
+            exceptions.handle(self.request,
+                              _('Unable to retrieve project details.'),
+                              redirect=reverse(INDEX_URL))
+        initial["domain_id"] = domain.id
+        initial["domain_name"] = domain.name
+        initial["description"] = getattr(source, 'description', None)
+        return initial
+
+
 class UpdateProjectView(workflows.WorkflowView):
     workflow_class = project_workflows.UpdateProject
 
@@ -160,7 +235,8 @@ class UpdateProjectView(workflows.WorkflowView):
         return initial
 
 
-class DetailProjectView(generic.TemplateView):
+class DetailProjectView(identity_views.IdentityStatusMixin,
+                        generic.TemplateView):
     template_name = 'project/projects/detail.html'
 
     def get_context_data(self, **kwargs):
@@ -194,6 +270,8 @@ class DetailProjectView(generic.TemplateView):
         try:
             project = project_identity.project_get(
                 self.request, project.parent_id)
+        except deadline.DeadlineExceeded:
+            return None
         except Exception:
             exceptions.handle(self.request,
                               _('Unable to retrieve parent project details.'),
@@ -222,7 +300,8 @@ class ProjectManageMixin(object):
         return filter(lambda u: u.id not in project_member_ids, all_users)
 
 
-class ManageMembersView(ProjectManageMixin, tables.DataTableView):
+class ManageMembersView(identity_views.IdentityStatusMixin,
+                        ProjectManageMixin, tables.DataTableView):
     table_class = project_tables.ProjectMembersTable
     template_name = 'project/projects/manage.html'
     page_title = _("Project Management: {{ project.name }}")
@@ -269,3 +348,13 @@ class NonMembersView(ProjectManageMixin, forms.ModalFormMixin,
             exceptions.handle(self.request,
                               _('Unable to retrieve users.'))
         return project_non_members
+
+
+class ExportRolesView(identity_views.ExportView):
+    export = 'roles'
+
+    def get_export_arguments(self):
+        return {'project': self.kwargs['project_id']}
+
+    def get_filename(self):
+        return 'roles-%s' % self.kwargs['project_id']
@@ -26,10 +26,13 @@ from openstack_auth import utils as auth_utils
 
 from horizon import exceptions
 from horizon import forms
+from horizon import messages
 from horizon import workflows
 
 from openstack_dashboard.api import keystone
+from openstack_dashboard import policy
 
+from nec_portal.api import project_clone
 from nec_portal.api import project_identity
 from nec_portal.local import nec_portal_settings as nec_set
 
@@ -39,6 +42,45 @@ ADD_USER_URL = "horizon:project:projects:create_user"
 COMMON_HORIZONTAL_TEMPLATE = "project/projects/_common_horizontal_form.html"
 
 
+def project_list_kwargs(request):
+    """Return the project_identity.project_list() arguments listing the
+    projects the user may see by policy, or None when they may see none.
+    """
+    if policy.check((("identity", "identity:list_projects"),), request):
+        return {'domain': request.session.get('domain_context', None)}
+    if policy.check((("identity", "identity:list_user_projects"),),
+                    request):
+        return {'user': request.user.id, 'admin': False}
+    return None
+
+
+def _subtree_ids(subtree):
+    ids = set()
+    pending = [subtree]
+    while pending:
+        for project_id, children in (pending.pop() or {}).items():
+            ids.add(project_id)
+            pending.append(children)
+    return ids
+
+
+def may_clone_from(request, project_id):
+    """Whether the user may copy the role assignments of the project: it
+    is their project, one of its subprojects or listed to them by policy.
+    """
+    user_project = request.user.project_id
+    if project_id == user_project:
+        return True
+    if project_identity.VERSIONS.active >= 3 and project_id in _subtree_ids(
+            project_identity.project_subtree(request, user_project)):
+        return True
+    kwargs = project_list_kwargs(request)
+    if kwargs is None:
+        return False
+    projects, _more = project_identity.project_list(request, **kwargs)
+    return any(project.id == project_id for project in projects)
+
+
 class CreateProjectInfoAction(workflows.Action):
     # Hide the domain_id and domain_name by default
     domain_id = forms.CharField(label=_("Domain ID"),
@@ -60,12 +102,20 @@ class CreateProjectInfoAction(workflows.Action):
     enabled = forms.BooleanField(label=_("Enabled"),
                                  required=False,
                                  initial=True)
+    inherit_roles = forms.BooleanField(
+        label=_("Grant my roles on all subprojects"),
+        help_text=_("Grant your roles once on the parent project for all "
+                    "of its subprojects, instead of on the new project "
+                    "only."),
+        required=False)
 
     def __init__(self, request, *args, **kwargs):
         super(CreateProjectInfoAction, self).__init__(request,
                                                       *args,
                                                       **kwargs)
         self.fields['enabled'].widget.attrs['disabled'] = True
+        if not project_identity.inherited_grants_enabled():
+            del self.fields['inherit_roles']
 
         # For keystone V3, display the two fields in read-only
         if keystone.VERSIONS.active >= 3:
@@ -104,7 +154,8 @@ class CreateProjectInfo(workflows.Step):
                    "name",
                    "description",
                    "parent_id",
-                   "enabled")
+                   "enabled",
+                   "inherit_roles")
 
 
 class CreateProject(workflows.Workflow):
@@ -147,24 +198,48 @@ class CreateProject(workflows.Workflow):
             exceptions.handle(request, ignore=True)
             return
 
-    def _add_project_user_role(self, request, project_id):
+    def _inherited_role_names(self, request, user):
+        """Returns the names of the roles the user already holds on every
+        subproject of the current project.
+        """
+        if not project_identity.inherited_grants_enabled():
+            return set()
+        return set(role.name for role in
+                   project_identity.inherited_roles_for_user(
+                       request, user, request.user.project_id))
+
+    def _add_project_user_role(self, request, project_id,
+                               inherit_roles=False):
         try:
             role_list = {role.name: role.id
                          for role in project_identity.role_list(request)}
 
             user = auth_utils.get_user(request)
             role_name_list = [role['name'] for role in user.roles]
+            inherited = self._inherited_role_names(request, user)
 
             for role_name in role_name_list:
                 if role_name in getattr(nec_set,
                                         'DISINHERITED_ROLES', []):
                     continue
+                if role_name in inherited:
+                    # Already granted on the new project through its parent.
+                    continue
 
-                project_identity.add_project_user_role(
-                    request,
-                    project=project_id,
-                    user=user,
-                    role=role_list.get(role_name))
+                if inherit_roles:
+                    # One grant on the parent covers every subproject.
+                    project_identity.add_project_user_role(
+                        request,
+                        project=request.user.project_id,
+                        user=user,
+                        role=role_list.get(role_name),
+                        inherited=True)
+                else:
+                    project_identity.add_project_user_role(
+                        request,
+                        project=project_id,
+                        user=user,
+                        role=role_list.get(role_name))
             return True
         except Exception:
             exceptions.handle(request, ignore=True)
@@ -177,7 +252,89 @@ class CreateProject(workflows.Workflow):
         if not project:
             return False
 
-        return self._add_project_user_role(request, project.id)
+        return self._add_project_user_role(
+            request, project.id,
+            inherit_roles=bool(data.get('inherit_roles')) and
+            project_identity.inherited_grants_enabled())
+
+
+class CloneProjectInfoAction(CreateProjectInfoAction):
+    source_id = forms.CharField(widget=forms.HiddenInput())
+
+    def __init__(self, request, *args, **kwargs):
+        super(CloneProjectInfoAction, self).__init__(request, *args,
+                                                     **kwargs)
+        self.fields.pop('inherit_roles', None)
+
+    class Meta(object):
+        name = _("Project Information")
+        slug = 'clone_info'
+        help_text = _("Create a project in which the groups and users of "
+                      "the source project have the same roles.")
+
+
+class CloneProjectInfo(workflows.Step):
+    action_class = CloneProjectInfoAction
+    template_name = COMMON_HORIZONTAL_TEMPLATE
+    depends_on = ("source_id",)
+    contributes = ("domain_id",
+                   "domain_name",
+                   "name",
+                   "description",
+                   "enabled")
+
+
+class CloneProject(workflows.Workflow):
+    slug = "clone_project"
+    name = _("Clone Project")
+    finalize_button_name = _("Clone Project")
+    success_message = _('Cloned project "%s".')
+    failure_message = _('Unable to clone project "%s".')
+    success_url = "horizon:project:projects:index"
+    default_steps = (CloneProjectInfo,)
+
+    def format_status_message(self, message):
+        return message % self.context.get('name', 'unknown project')
+
+    def _report(self, request, result):
+        failed = [outcome for outcome in result.outcomes if outcome.error]
+        for outcome in failed:
+            grant = outcome.item
+            messages.error(request,
+                           _('Unable to grant role "%(role)s" to '
+                             '%(actor_type)s %(actor)s.') % {
+                               'role': grant.role_name,
+                               'actor_type': grant.actor_type,
+                               'actor': grant.actor_id})
+        messages.info(request,
+                      _('Copied %(done)d of %(total)d role assignments; '
+                        '%(skipped)d were not copied by configuration.') % {
+                          'done': len(result.outcomes) - len(failed),
+                          'total': len(result.outcomes),
+                          'skipped': len(result.skipped)})
+
+    def handle(self, request, data):
+        try:
+            if not may_clone_from(request, data['source_id']):
+                messages.error(request,
+                               _('The project to clone was not found.'))
+                return False
+            result = project_clone.clone_project(
+                request,
+                data['source_id'],
+                name=data['name'],
+                description=data['description'],
+                enabled=data['enabled'],
+                domain=data['domain_id'],
+                parent=request.user.project_id)
+        except Exception:
+            exceptions.handle(request, ignore=True)
+            return False
+        finally:
+            auth_utils.remove_project_cache(request.user.token.id)
+        self.object = result.project
+        self._report(request, result)
+        return True
 
 
 class UpdateProjectInfoAction(CreateProjectInfoAction):
@@ -189,6 +346,8 @@ class UpdateProjectInfoAction(CreateProjectInfoAction):
     def __init__(self, request, initial, *args, **kwargs):
         super(UpdateProjectInfoAction, self).__init__(
             request, initial, *args, **kwargs)
+        # Roles are only inherited when a project is created.
+        self.fields.pop('inherit_roles', None)
         if initial['project_id'] == request.user.token.project['id']:
             self.fields['enabled'].widget.attrs['disabled'] = True
             self.fields['enabled'].help_text = _(
@@ -0,0 +1,162 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+"""Rendered table rows reused across requests.
+
+A row is cached under its table, its object, the values of its cells and
+the policy scope of the request: the user, their project and roles, the
+domain context and the language. An unchanged row is therefore rendered
+once, without running the column filters, the row actions or their
+policy checks again. The cache is per process and bounded by the size of
+the HTML it keeps, evicting the least recently used rows.
+"""
+
+import collections
+import hashlib
+import threading
+
+from horizon import tables
+
+from nec_portal.local import nec_portal_settings as nec_set
+
+ROW_CACHE_SETTING = getattr(nec_set, 'IDENTITY_ROW_CACHE', {})
+
+
+class FragmentCache(object):
+    """A bounded LRU store of rendered fragments, holding at most
+    ``max_chars`` characters.
+    """
+
+    def __init__(self, max_chars=16 * 1024 * 1024):
+        self.max_chars = max_chars
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._entries.pop(key, None)
+            if fragment is not None:
+                self._entries[key] = fragment
+            return fragment
+
+    def put(self, key, fragment):
+        if len(fragment) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = fragment
+            self.size += len(fragment)
+            while self.size > self.max_chars:
+                _key, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+CACHE = FragmentCache(
+    max_chars=ROW_CACHE_SETTING.get('max_chars', 16 * 1024 * 1024))
+
+
+def enabled():
+    return ROW_CACHE_SETTING.get('enabled', True)
+
+
+def _object_version(datum):
+    """Return the data of the object, or None if it cannot be told."""
+    to_dict = getattr(datum, 'to_dict', None)
+    if to_dict is None:
+        return None
+    parent = getattr(datum, 'parent', None)
+    # The projects table places a project in its tree by its parent.
+    return sorted(to_dict().items()), getattr(parent, 'id', parent)
+
+
+def policy_scope(table):
+    """Return what the rows of the table depend on besides their object.
+    """
+    scope = getattr(table, '_row_cache_scope', None)
+    if scope is None:
+        request = table.request
+        user = request.user
+        scope = (user.id,
+                 getattr(user, 'project_id', None),
+                 tuple(sorted(role['name']
+                              for role in getattr(user, 'roles', ()))),
+                 request.session.get('domain_context', None),
+                 getattr(request, 'LANGUAGE_CODE', None))
+        table._row_cache_scope = scope
+    return scope
+
+
+def fragment_key(table, datum):
+    """Return the cache key of the row of ``datum``, or None when the row
+    is not to be cached.
+    """
+    version = _object_version(datum)
+    if version is None:
+        return None
+    object_id = table.get_object_id(datum)
+    cells = [column.get_raw_data(datum)
+             for column in table.columns.values() if not column.auto]
+    digest = hashlib.sha1()
+    for part in (type(table).__module__, type(table).__name__,
+                 table.name, object_id, version, cells,
+                 object_id == getattr(table, 'current_item_id', None),
+                 policy_scope(table)):
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CachedRowMixin(object):
+    """Renders the row from CACHE when an identical one was rendered."""
+    fragment = None
+    fragment_key = None
+
+    def get_fragment_key(self, datum):
+        """Return the cache key of the row, or None not to cache it."""
+        return fragment_key(self.table, datum)
+
+    def load_cells(self, datum=None):
+        datum = self.datum if datum is None else datum
+        key = None
+        if datum is not None and enabled():
+            key = self.get_fragment_key(datum)
+            fragment = CACHE.get(key) if key else None
+            if fragment is not None:
+                self.datum = datum
+                self.id = '%s__row__%s' % (self.table.name,
+                                           self.table.get_object_id(datum))
+                self.fragment = fragment
+                return
+        self.fragment_key = key
+        super(CachedRowMixin, self).load_cells(datum)
+
+    def render(self):
+        if self.fragment is not None:
+            return self.fragment
+        fragment = super(CachedRowMixin, self).render()
+        if self.fragment_key:
+            CACHE.put(self.fragment_key, fragment)
+        return fragment
+
+
+class CachedRow(CachedRowMixin, tables.Row):
+    pass
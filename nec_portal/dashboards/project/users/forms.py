@@ -30,6 +30,7 @@ from horizon import messages
 from horizon.utils import validators
 
 from nec_portal.api import project_identity
+from nec_portal.api import user_import
 from nec_portal.local import nec_portal_settings as nec_set
 
 from openstack_dashboard import api
@@ -37,6 +38,8 @@ from openstack_dashboard import api
 
 LOG = logging.getLogger(__name__)
 PROJECT_REQUIRED = api.keystone.VERSIONS.active < 3
+# Failed rows of an import reported as messages; the others are logged.
+IMPORT_REPORTED_FAILURES = 20
 
 
 class PasswordMixin(forms.SelfHandlingForm):
@@ -203,3 +206,60 @@ class UpdateUserForm(BaseUserForm):
             return response
         else:
             return True
+
+
+class ImportUsersForm(forms.SelfHandlingForm):
+    users_file = forms.FileField(
+        label=_("File"),
+        help_text=_("A CSV file with a header line, or a JSON array of "
+                    "objects, with the columns name, email, password and "
+                    "enabled."))
+    file_format = forms.ChoiceField(
+        label=_("Format"),
+        required=False,
+        choices=[('', _("Detect from the file name")),
+                 ('csv', 'CSV'), ('json', 'JSON')])
+
+    def _report(self, request, counts, failures):
+        for result in failures[:IMPORT_REPORTED_FAILURES]:
+            messages.error(request,
+                           _('Line %(line)d, user "%(name)s": %(error)s') % {
+                               'line': result.line, 'name': result.name,
+                               'error': result.error})
+        if len(failures) > IMPORT_REPORTED_FAILURES:
+            messages.error(request,
+                           _('%d more rows could not be imported.') %
+                           (len(failures) - IMPORT_REPORTED_FAILURES))
+        messages.success(request,
+                         _('Imported users: %(created)d created, '
+                           '%(resumed)d already imported, %(failed)d '
+                           'failed.') % {
+                             'created': counts['created'],
+                             'resumed': counts['resumed'],
+                             'failed': len(failures)})
+
+    def handle(self, request, data):
+        users_file = data['users_file']
+        file_format = (data.get('file_format') or
+                       user_import.detect_format(users_file.name))
+        domain = project_identity.get_default_domain(request)
+        counts = {'created': 0, 'resumed': 0}
+        failures = []
+        try:
+            importer = user_import.UserImporter(
+                request, request.user.project_id, domain.id)
+            for result in importer.run(user_import.iter_rows(users_file,
+                                                             file_format)):
+                if result.status in user_import.FAILED_STATUSES:
+                    failures.append(result)
+                else:
+                    counts[result.status] += 1
+        except Exception:
+            # Parse errors of the file end the import where they occur.
+            LOG.exception('Import of users from %s stopped.',
+                          users_file.name)
+            messages.error(request, _('Unable to import users.'))
+            if not (failures or any(counts.values())):
+                return False
+        self._report(request, counts, failures)
+        return True
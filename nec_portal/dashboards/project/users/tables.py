@@ -12,6 +12,8 @@
 #
 #
 
+import logging
+
 from django.core import exceptions as django_exceptions
 from django.template import defaultfilters
 from django.utils.translation import ugettext_lazy as _
@@ -21,10 +23,15 @@ from horizon import exceptions as horizon_exceptions
 from horizon import forms
 from horizon import messages
 from horizon import tables
+from horizon.utils import memoized
 from openstack_dashboard import api
 from openstack_dashboard import policy
 
+from nec_portal.api import policy_decisions
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import row_cache
+
+LOG = logging.getLogger(__name__)
 
 ENABLE = 0
 DISABLE = 1
@@ -40,10 +47,32 @@ class CreateUserLink(tables.LinkAction):
                     ("identity", "identity:create_user"),)
 
     def allowed(self, request, user):
-        return api.keystone.keystone_can_edit_user()
+        return policy_decisions.can_edit(request, 'user')
+
+
+class ImportUsersLink(tables.LinkAction):
+    name = "import"
+    verbose_name = _("Import Users")
+    url = "horizon:project:users:import"
+    classes = ("ajax-modal",)
+    icon = "upload"
+    policy_rules = (('identity', 'identity:create_grant'),
+                    ("identity", "identity:create_user"),)
+
+    def allowed(self, request, user):
+        return policy_decisions.can_edit(request, 'user')
 
 
-class EditUserLink(policy.PolicyTargetMixin, tables.LinkAction):
+class ExportUsersLink(tables.LinkAction):
+    name = "export"
+    verbose_name = _("Export Users")
+    url = "horizon:project:users:export"
+    icon = "download"
+    policy_rules = (("identity", "identity:list_users"),)
+
+
+class EditUserLink(policy_decisions.PolicyDecisionMixin,
+                   policy.PolicyTargetMixin, tables.LinkAction):
     name = "edit"
     verbose_name = _("Edit")
     url = "horizon:project:users:update"
@@ -53,10 +82,11 @@ class EditUserLink(policy.PolicyTargetMixin, tables.LinkAction):
     policy_target_attrs = (("user_id", "id"),)
 
     def allowed(self, request, user):
-        return api.keystone.keystone_can_edit_user()
+        return policy_decisions.can_edit(request, 'user')
 
 
-class DeleteUsersAction(tables.DeleteAction):
+class DeleteUsersAction(policy_decisions.PolicyDecisionMixin,
+                        tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -75,7 +105,7 @@ class DeleteUsersAction(tables.DeleteAction):
     policy_rules = (("identity", "identity:delete_user"),)
 
     def allowed(self, request, datum):
-        if not api.keystone.keystone_can_edit_user() or \
+        if not policy_decisions.can_edit(request, 'user') or \
                 (datum and datum.id == request.user.id):
             return False
         return True
@@ -128,7 +158,7 @@ class UserFilterAction(tables.FilterAction):
                 or q in (getattr(user, 'email', None) or '').lower()]
 
 
-class UpdateRow(tables.Row):
+class UpdateRow(row_cache.CachedRowMixin, tables.Row):
     ajax = True
 
     def get_data(self, request, user_id):
@@ -138,7 +168,7 @@ class UpdateRow(tables.Row):
 
 class UpdateCell(tables.UpdateAction):
     def allowed(self, request, user, cell):
-        return api.keystone.keystone_can_edit_user() and \
+        return policy_decisions.can_edit(request, 'user') and \
             policy.check((("identity", "identity:update_user"),),
                          request)
 
@@ -166,6 +196,16 @@ class UpdateCell(tables.UpdateAction):
         return True
 
 
+class EffectiveRolesColumn(tables.Column):
+    """The roles a user holds on the current project, including those
+    granted to the user's groups.
+    """
+
+    def get_raw_data(self, datum):
+        role_names = self.table.get_effective_role_names()
+        return ', '.join(sorted(role_names.get(datum.id, ())))
+
+
 class UsersTable(tables.DataTable):
     STATUS_CHOICES = (
         ("true", True),
@@ -194,10 +234,29 @@ class UsersTable(tables.DataTable):
                             filters=(defaultfilters.yesno,
                                      defaultfilters.capfirst),
                             empty_value="False")
+    effective_roles = EffectiveRolesColumn('effective_roles',
+                                           verbose_name=_('Effective Roles'))
 
     class Meta(object):
         name = "users"
         verbose_name = _("Users")
         row_actions = (EditUserLink, DeleteUsersAction)
-        table_actions = (UserFilterAction, CreateUserLink, DeleteUsersAction)
+        table_actions = (UserFilterAction, CreateUserLink, ImportUsersLink,
+                         ExportUsersLink, DeleteUsersAction)
         row_class = UpdateRow
+
+    @memoized.memoized_method
+    def get_effective_role_names(self):
+        """Returns {user id: role names} for the current project."""
+        try:
+            roles = project_identity.get_effective_project_roles(
+                self.request, self.request.user.project_id)
+            names = dict((role.id, role.name) for role in
+                         project_identity.role_list(self.request))
+        except Exception:
+            LOG.warning('Unable to retrieve effective roles of project %s.',
+                        self.request.user.project_id)
+            return {}
+        return dict((user_id, [names.get(role_id, role_id)
+                               for role_id in role_ids])
+                    for user_id, role_ids in roles.items())
@@ -15,12 +15,15 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import json
+
 from mox3.mox import IgnoreArg
 from mox3.mox import IsA
 
 from django.core.urlresolvers import reverse
 from django import http
 
+from nec_portal.api import identity_events
 from nec_portal.api import project_identity
 from openstack_dashboard import api
 from openstack_dashboard.test import helpers as test
@@ -48,13 +51,21 @@ class UsersViewTests(test.BaseAdminViewTests):
                      if user.domain_id == domain_id]
         return users
 
-    @test.create_stubs({project_identity: ('project_user_list',)})
+    @test.create_stubs({project_identity: ('project_user_list',
+                                           'get_effective_project_roles',
+                                           'role_list')})
     def test_index(self):
         domain = self._get_default_domain()
         domain_id = domain.id
         users = self._get_users(domain_id)
+        role = self.roles.first()
         project_identity.project_user_list(project=IsA('str')). \
             AndReturn(users)
+        project_identity.get_effective_project_roles(
+            IsA(http.HttpRequest), IsA('str')). \
+            AndReturn({users[0].id: frozenset([role.id])})
+        project_identity.role_list(IsA(http.HttpRequest)). \
+            AndReturn(self.roles.list())
 
         self.mox.ReplayAll()
         res = self.client.get(USERS_INDEX_URL)
@@ -64,6 +75,86 @@ class UsersViewTests(test.BaseAdminViewTests):
         if domain_id:
             for user in res.context['table'].data:
                 self.assertItemsEqual(user.domain_id, domain_id)
+        self.assertContains(res, role.name)
+        self.assertIn('total;dur=', res['Server-Timing'])
+
+    @test.create_stubs({project_identity: ('project_user_list',
+                                           'get_effective_project_roles',
+                                           'role_list')})
+    def test_index_not_modified(self):
+        users = self.users.list()
+        project_identity.project_user_list(project=IsA('str')). \
+            AndReturn(users)
+        project_identity.get_effective_project_roles(
+            IsA(http.HttpRequest), IsA('str')).AndReturn({})
+        project_identity.role_list(IsA(http.HttpRequest)). \
+            AndReturn(self.roles.list())
+
+        self.mox.ReplayAll()
+        res = self.client.get(USERS_INDEX_URL)
+        self.assertTrue(res.has_header('ETag'))
+
+        res = self.client.get(USERS_INDEX_URL,
+                              HTTP_IF_NONE_MATCH=res['ETag'],
+                              HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(res.status_code, 304)
+
+    @test.create_stubs({project_identity: ('iter_project_users',
+                                           'get_effective_project_roles',
+                                           'role_list')})
+    def test_index_streamed(self):
+        users = self.users.list()
+        project_identity.iter_project_users(project=IsA('str')). \
+            AndReturn(iter(users))
+        project_identity.get_effective_project_roles(
+            IsA(http.HttpRequest), IsA('str')).AndReturn({})
+        project_identity.role_list(IsA(http.HttpRequest)). \
+            AndReturn(self.roles.list())
+
+        self.mox.ReplayAll()
+        res = self.client.get(USERS_INDEX_URL, {'stream': '1'})
+        self.assertTrue(res.streaming)
+        self.assertFalse(res.has_header('ETag'))
+        content = b''.join(res.streaming_content).decode('utf-8')
+        for user in users:
+            self.assertIn('users__row__%s' % user.id, content)
+        self.assertIn('update_footer_count', content)
+
+    @test.create_stubs({project_identity: ('project_user_list',
+                                           'get_effective_project_roles',
+                                           'role_list')})
+    def test_row_updates(self):
+        user = self.users.first()
+        role = self.roles.first()
+        project_identity.project_user_list(project=IsA('str')). \
+            AndReturn(self.users.list())
+        project_identity.get_effective_project_roles(
+            IsA(http.HttpRequest), IsA('str')). \
+            AndReturn({user.id: frozenset([role.id])})
+        project_identity.role_list(IsA(http.HttpRequest)). \
+            AndReturn(self.roles.list())
+
+        self.mox.ReplayAll()
+        res = self.client.get(reverse('horizon:project:users:row_updates'),
+                              {'ids': [user.id, 'unknown']})
+        rows = json.loads(res.content.decode('utf-8'))
+        self.assertEqual(sorted(rows), sorted([user.id, 'unknown']))
+        self.assertIn(user.name, rows[user.id])
+        self.assertIn(role.name, rows[user.id])
+        self.assertEqual(rows['unknown'], '')
+
+    def test_change_events(self):
+        since = identity_events.last_id()
+        identity_events.publish('users', ['u1'], self.tenant.id)
+        identity_events.publish('groups', ['g1'])
+
+        res = self.client.get(reverse('horizon:project:users:events'),
+                              {'since': since})
+        body = json.loads(res.content.decode('utf-8'))
+        self.assertEqual(body['events'], [{'id': since + 1, 'ids': ['u1']}])
+        self.assertEqual(body['last_id'], since + 2)
+        self.assertFalse(body['reset'])
+        self.assertEqual(body['retry'], 5)
 
     @test.create_stubs({project_identity: ('user_create',
                                            'get_default_domain',
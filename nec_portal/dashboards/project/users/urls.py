@@ -29,5 +29,10 @@ urlpatterns = patterns(
     url(r'^(?P<user_id>[^/]+)/update/$',
         views.UpdateView.as_view(), name='update'),
     url(r'^create/$', views.CreateView.as_view(), name='create'),
+    url(r'^import/$', views.ImportView.as_view(), name='import'),
+    url(r'^export/$', views.ExportView.as_view(), name='export'),
+    url(r'^row_updates/$', views.RowUpdatesView.as_view(),
+        name='row_updates'),
+    url(r'^events/$', views.ChangeEventsView.as_view(), name='events'),
     url(r'^(?P<user_id>[^/]+)/detail/$',
         views.DetailView.as_view(), name='detail'))
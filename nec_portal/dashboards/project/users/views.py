@@ -34,7 +34,9 @@ from horizon import views
 
 from openstack_dashboard import api
 
+from nec_portal.api import deadline
 from nec_portal.api import project_identity
+from nec_portal.dashboards.project import identity_views
 from nec_portal.dashboards.project.users \
     import forms as project_forms
 from nec_portal.dashboards.project.users \
@@ -43,8 +45,12 @@ from nec_portal.dashboards.project.users \
 LOG = logging.getLogger(__name__)
 
 
-class IndexView(tables.DataTableView):
+class IndexView(identity_views.IdentityStatusMixin,
+                identity_views.ConditionalListingMixin,
+                identity_views.StreamingListingMixin,
+                tables.DataTableView):
     table_class = project_tables.UsersTable
+    listing = 'users'
     template_name = 'project/users/index.html'
     page_title = _("Users")
 
@@ -53,6 +59,8 @@ class IndexView(tables.DataTableView):
         self.request.session.get('domain_context', None)
 
         try:
+            # The role assignment listing names the users but leaves
+            # out email and enabled, which every row shows.
             ret_users = project_identity.project_user_list(
                 project=self.request.user.project_id)
         except Exception:
@@ -61,6 +69,27 @@ class IndexView(tables.DataTableView):
 
         return ret_users
 
+    def iter_data(self):
+        return project_identity.iter_project_users(
+            project=self.request.user.project_id)
+
+
+class RowUpdatesView(identity_views.RowUpdatesView):
+    table_class = project_tables.UsersTable
+
+    def get_objects(self, ids):
+        # The members of the project come from the local copy or the
+        # warm store when there is one.
+        wanted = set(ids)
+        return dict((user.id, user) for user in
+                    project_identity.project_user_list(
+                        project=self.request.user.project_id)
+                    if user.id in wanted)
+
+
+class ChangeEventsView(identity_views.ChangeEventsView):
+    listing = 'users'
+
 
 class UpdateView(forms.ModalFormView):
     template_name = 'project/users/update.html'
@@ -150,7 +179,28 @@ class CreateView(forms.ModalFormView):
                 'role_id': getattr(default_role, "id", None)}
 
 
-class DetailView(views.HorizonTemplateView):
+class ImportView(forms.ModalFormView):
+    template_name = 'project/users/import.html'
+    modal_header = _("Import Users")
+    form_id = "import_users_form"
+    form_class = project_forms.ImportUsersForm
+    submit_label = _("Import Users")
+    submit_url = reverse_lazy("horizon:project:users:import")
+    success_url = reverse_lazy('horizon:project:users:index')
+    page_title = _("Import Users")
+
+
+class ExportView(identity_views.ExportView):
+    export = 'users'
+
+    def get_export_arguments(self):
+        domain = project_identity.get_default_domain(self.request)
+        return {'project': self.request.user.project_id,
+                'domain': getattr(domain, 'id', None)}
+
+
+class DetailView(identity_views.IdentityStatusMixin,
+                 views.HorizonTemplateView):
     template_name = 'project/users/detail.html'
     page_title = "{{ user.name }}"
 
@@ -165,6 +215,8 @@ class DetailView(views.HorizonTemplateView):
             try:
                 domain = project_identity.domain_get(self.request, domain_id)
                 domain_name = domain.name
+            except deadline.DeadlineExceeded:
+                pass
             except Exception:
                 exceptions.handle(self.request,
                                   _('Unable to retrieve project domain.'))
@@ -185,6 +237,8 @@ class DetailView(views.HorizonTemplateView):
             try:
                 tenant = project_identity.project_get(self.request, project_id,
                                                       admin=True)
+            except deadline.DeadlineExceeded:
+                pass
             except Exception as e:
                 msg = ('Failed to get tenant %(project_id)s: %(reason)s' %
                        {'project_id': project_id, 'reason': e})
@@ -55,3 +55,224 @@ TBL_ROLE_ALL = [
     TBL_ROLE_OPERATOR,
     TBL_ROLE_TENANT_USER,
 ]
+
+# Circuit breaker around the Keystone calls made by the identity panels.
+# When the share of failed or slower than 'slow_call_seconds' calls among
+# the last 'window' calls reaches 'failure_ratio', reads are served from the
+# last-known-good copies (at most 'stale_cache_size' of them) and changes
+# are refused for 'open_seconds'.
+IDENTITY_CIRCUIT_BREAKER = {
+    'enabled': True,
+    'window': 20,
+    'min_calls': 10,
+    'failure_ratio': 0.5,
+    'slow_call_seconds': 5.0,
+    'open_seconds': 30,
+    'stale_cache_size': 1000,
+}
+
+# Client timeouts in seconds for the Keystone calls made by the identity
+# panels, keyed by the name of the project_identity function. Calls
+# without an entry use 'default'; None leaves the client default.
+IDENTITY_API_TIMEOUTS = {
+    'default': 30,
+    'domain_get': 5,
+    'group_get': 5,
+    'project_get': 5,
+    'user_get': 5,
+    'role_list': 10,
+    'role_assignments_list': 60,
+    'project_user_list': 60,
+    'group_user_list': 60,
+    'project_group_list': 60,
+}
+
+# Overall time budget in seconds for the identity calls of one page. Once
+# it is spent the remaining calls are skipped and the page is rendered
+# with the data retrieved so far.
+IDENTITY_VIEW_DEADLINE = 20
+
+# Optional local SQLite copy of users, groups, projects and role
+# assignments. When enabled, the project and group membership listings are
+# answered from the file at 'path', which all workers share. It is rebuilt
+# by "manage.py sync_identity_replica" and ignored while it is older than
+# 'max_age' seconds.
+IDENTITY_REPLICA = {
+    'enabled': False,
+    'path': '/var/lib/openstack-dashboard/identity_replica.sqlite3',
+    'max_age': 900,
+    'timeout': 5.0,
+}
+
+# Keeps an in-process copy of the identity data current from Keystone
+# notifications, so that the membership listings are up to date without
+# waiting for the next replica sync. 'transport' is 'oslo' (the message
+# bus given by 'url' and 'topic'), 'file' (JSON lines appended to 'path')
+# or the dotted path of a Transport class. The copy is reloaded in full
+# every 'reconcile_interval' seconds in case a notification was lost.
+# Keystone must send basic notifications for this to work.
+IDENTITY_NOTIFICATIONS = {
+    'enabled': False,
+    'transport': 'oslo',
+    'url': None,
+    'topic': 'notifications',
+    'reconcile_interval': 3600,
+}
+
+# Pre-fetches the role catalog, the 'domains' and the membership of the
+# 'projects' (ids) in the background when a worker starts, after a random
+# delay of up to 'jitter' seconds. Each worker runs at most 'concurrency'
+# fetches at once, and at most 'fleet_concurrency' workers pre-warm at the
+# same time when the Django cache is shared between them; a worker which
+# waited 'fleet_wait' seconds for its turn skips pre-warming. Pre-fetched
+# membership is used for 'membership_ttl' seconds and dropped as soon as
+# the worker changes identity data; the catalog for 'catalog_ttl' seconds.
+IDENTITY_PREWARM = {
+    'enabled': False,
+    'projects': [],
+    'domains': ['default'],
+    'concurrency': 4,
+    'jitter': 30,
+    'fleet_concurrency': 2,
+    'fleet_wait': 300,
+    'fleet_lease': 120,
+    'membership_ttl': 300,
+    'catalog_ttl': 3600,
+}
+
+# Return the user, group, project and role assignment listings as compact
+# read-only records instead of keystoneclient resources. They hold only the
+# fields the identity panels show, which keeps large cached listings small.
+IDENTITY_COMPACT_RECORDS = False
+
+# Parse user, group and role assignment listings as they arrive instead of
+# loading them whole, so that the membership listings do not need memory
+# for every user of the domain. Requires the ijson package; without it the
+# listings are loaded whole.
+IDENTITY_STREAM_LISTINGS = True
+
+# Effective roles of the users of a project, including the roles of their
+# groups, as shown on the Users panel. They are read from Keystone's
+# effective role assignment listing unless 'use_effective_listing' is
+# False, in which case group assignments are expanded here. Results are
+# kept for 'ttl' seconds for at most 'max_projects' projects, and dropped
+# when roles or group membership are changed through this dashboard.
+IDENTITY_EFFECTIVE_ROLES = {
+    'use_effective_listing': True,
+    'ttl': 60,
+    'max_projects': 1000,
+}
+
+# Number of role grants and revocations sent to Keystone at once when the
+# roles of a group are saved.
+IDENTITY_WRITE_CONCURRENCY = 8
+
+# Offer to grant roles on all subprojects with a single OS-INHERIT grant on
+# the parent project, in the Modify Roles dialog of groups and when
+# creating a project. Requires the OS-INHERIT extension of Keystone.
+IDENTITY_INHERITED_GRANTS = False
+
+# "Delete Project and Subprojects" action of the Projects panel. The
+# subtree is deleted from the leaves up, 'concurrency' projects at once
+# (IDENTITY_WRITE_CONCURRENCY when None). With 'revoke_assignments' the
+# role assignments on each project are revoked before it is deleted.
+# A subtree holding the user's current project is never deleted.
+IDENTITY_CASCADE_DELETE = {
+    'enabled': False,
+    'revoke_assignments': False,
+    'concurrency': None,
+}
+
+# Bulk user import of the Users panel and of the import_users command.
+# Rows are read in batches of 'batch_size' and created 'concurrency' at a
+# time. User names are checked against an index of the domain's users,
+# which is read again after 'index_ttl' seconds.
+IDENTITY_USER_IMPORT = {
+    'concurrency': 8,
+    'batch_size': 200,
+    'index_ttl': 300,
+}
+
+# CSV and JSON exports of the Users, Groups and Projects panels. The users
+# export looks up the projects of 'batch_size' users at a time,
+# 'concurrency' of them at once.
+IDENTITY_EXPORT = {
+    'batch_size': 50,
+    'concurrency': 8,
+}
+
+# Reconciliation of the reconcile_identity command. Changes are made
+# 'concurrency' at a time and a call failing because Keystone is
+# unavailable is retried 'retries' times, 'backoff' seconds after the
+# first failure and twice as long after each next one.
+IDENTITY_RECONCILE = {
+    'concurrency': 8,
+    'retries': 3,
+    'backoff': 1.0,
+}
+
+# ETag and Last-Modified on the Users, Groups and Projects index pages.
+# Changes made through the portal start a new version of the listings
+# they affect; 'max_age' bounds how long changes made elsewhere go
+# unnoticed. The versions are kept in the Django cache for 'timeout'
+# seconds.
+IDENTITY_CONDITIONAL_GET = {
+    'enabled': True,
+    'max_age': 60,
+    'timeout': 86400,
+}
+
+# Pushes the changes made through the portal to open Users, Groups and
+# Projects tables, which then re-fetch only the changed rows. A request
+# following the changes is held for at most 'wait' seconds, checking for
+# new ones every 'interval' seconds, and the browser asks again 'retry'
+# seconds after it ends. Each held request ties up a worker, so keep 'wait'
+# short unless the portal runs with asynchronous workers. The changes are
+# kept in the Django cache for 'timeout' seconds; a table more than 'keep'
+# changes behind refreshes all of its rows instead.
+IDENTITY_CHANGE_EVENTS = {
+    'enabled': True,
+    'wait': 2,
+    'interval': 1,
+    'retry': 5,
+    'keep': 1000,
+    'timeout': 3600,
+}
+
+# Rendered rows of the Users, Groups and Projects tables are reused while
+# their object, cell values and the viewer's policy scope are unchanged.
+# Each process keeps at most 'max_chars' characters of row HTML, evicting
+# the least recently used rows.
+IDENTITY_ROW_CACHE = {
+    'enabled': True,
+    'max_chars': 16 * 1024 * 1024,
+}
+
+# Policy and keystone_can_edit_* decisions made while rendering a page are
+# asked once per request when 'memoize' is set. With 'server_timing' the
+# identity index pages report the time spent deciding, and in total, in a
+# Server-Timing response header.
+IDENTITY_AUTHORIZATION = {
+    'memoize': True,
+    'server_timing': True,
+}
+
+# Streams the Users, Groups and Projects index pages: the page up to the
+# table rows is sent at once, then the rows in chunks of 'chunk_size' as
+# the listing is read. Users are then shown in listing order rather than
+# by name. A page can also be streamed on request with ?stream=1.
+IDENTITY_STREAMING = {
+    'enabled': False,
+    'chunk_size': 200,
+}
+
+# The Projects tree renders the subprojects of the first 'initial_depth'
+# levels with the page; deeper branches, and those with more than
+# 'branch_size' subprojects, are fetched when expanded, 'branch_size'
+# rows at a time, and dropped again when collapsed. Set 'lazy' to False
+# to render the whole tree with the page.
+IDENTITY_PROJECT_TREE = {
+    'lazy': True,
+    'initial_depth': 1,
+    'branch_size': 200,
+}
@@ -0,0 +1,58 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from nec_portal.api import project_cascade
+
+
+class Command(BaseCommand):
+    help = ("Delete a project together with all of its subprojects, "
+            "from the leaves up.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help='Id of the project to delete.')
+        parser.add_argument('--revoke-assignments', action='store_true',
+                            dest='revoke_assignments', default=False,
+                            help='Revoke the role assignments on each '
+                                 'project before deleting it.')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Number of projects deleted at once.')
+
+    def handle(self, *args, **options):
+        start = time.time()
+
+        def progress(project_id, error, done, total):
+            if error:
+                self.stderr.write('[%d/%d] %s: %s' % (done, total,
+                                                      project_id, error))
+            else:
+                self.stdout.write('[%d/%d] %s: deleted' % (done, total,
+                                                           project_id))
+
+        result = project_cascade.cascade_delete(
+            None, options['project'],
+            revoke_assignments=options['revoke_assignments'],
+            concurrency=options['concurrency'], progress=progress)
+        for project_id in result.skipped:
+            self.stderr.write('%s: kept, a subproject was not deleted' %
+                              project_id)
+        self.stdout.write('Deleted %d projects in %.1f seconds.' % (
+            len(result.deleted), time.time() - start))
+        if result.failed or result.skipped:
+            raise CommandError('%d projects could not be deleted.' % (
+                len(result.failed) + len(result.skipped)))
@@ -0,0 +1,65 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from nec_portal.api import user_import
+
+
+class Command(BaseCommand):
+    help = ("Create the users listed in a CSV or JSON file in a project "
+            "and grant them DEFAULT_USER_ROLES there. Running it again "
+            "with the same file completes an interrupted import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV or JSON file of users.')
+        parser.add_argument('--project', required=True,
+                            help='Primary project of the users.')
+        parser.add_argument('--domain', default='default',
+                            help='Domain of the users.')
+        parser.add_argument('--format', choices=user_import.FORMATS,
+                            default=None,
+                            help='Format of the file; detected from its '
+                                 'name by default.')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Number of users created at once.')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        file_format = (options['format'] or
+                       user_import.detect_format(options['file']))
+        importer = user_import.UserImporter(
+            None, options['project'], options['domain'],
+            concurrency=options['concurrency'])
+        failed = 0
+        with io.open(options['file'], 'rb') as stream:
+            for result in importer.run(user_import.iter_rows(stream,
+                                                             file_format)):
+                if result.status in user_import.FAILED_STATUSES:
+                    failed += 1
+                    self.stderr.write('%d %s: %s, %s' % (
+                        result.line, result.name, result.status,
+                        result.error))
+                else:
+                    self.stdout.write('%d %s: %s %s' % (
+                        result.line, result.name, result.status,
+                        result.user_id))
+        self.stdout.write('Imported the users of %s in %.1f seconds.' % (
+            options['file'], time.time() - start))
+        if failed:
+            raise CommandError('%d rows could not be imported.' % failed)
@@ -0,0 +1,56 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from nec_portal.api import identity_replica
+from nec_portal.api import prewarm
+from nec_portal.api import project_identity
+
+
+class Command(BaseCommand):
+    help = ("Fetch the identity data pre-warmed at worker startup and "
+            "report how long each fetch takes. Workers keep their own "
+            "warm store, so this is a check of the IDENTITY_PREWARM "
+            "setting; when the identity replica is enabled it is rebuilt "
+            "as well, which all workers share.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', action='append', dest='projects',
+                            help='Project to pre-warm instead of the '
+                                 'configured ones. May be repeated.')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Number of fetches run at once.')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        outcomes = prewarm.prewarm(projects=options['projects'],
+                                   concurrency=options['concurrency'])
+        for outcome in outcomes:
+            if outcome.error:
+                self.stderr.write('%s: %s' % (outcome.item[0], outcome.error))
+            else:
+                self.stdout.write('%s: ok' % outcome.item[0])
+        self.stdout.write('Pre-warmed %d listings in %.1f seconds.' % (
+            len(outcomes), time.time() - start))
+
+        replica = identity_replica.get_replica(fresh=False)
+        if replica is not None:
+            counts = replica.sync(project_identity.get_keystone_client())
+            self.stdout.write('Synchronized %s: %s' % (
+                replica.path, ', '.join('%d %s' % (count, name)
+                                        for name, count in
+                                        sorted(counts.items()))))
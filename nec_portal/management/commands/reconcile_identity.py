@@ -0,0 +1,133 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from nec_portal.api import identity_reconcile
+
+
+def _describe(change):
+    words = [change.action, change.target]
+    if change.actor is not None:
+        words.append('%s %s' % (change.actor_type, change.actor))
+    if change.role is not None:
+        words.append(change.role)
+    words.extend('%s=%s' % item for item in change.values)
+    return ' '.join(words)
+
+
+class Command(BaseCommand):
+    help = ("Bring the projects, groups, group members and role grants "
+            "declared in a JSON or YAML file to the state it describes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='JSON or YAML desired state.')
+        parser.add_argument('--format', choices=identity_reconcile.FORMATS,
+                            default=None,
+                            help='Format of the file; detected from its '
+                                 'name by default.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Only print the plan and the Keystone '
+                                 'calls it takes.')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Number of Keystone calls made at once.')
+        parser.add_argument('--retries', type=int, default=None,
+                            help='Attempts more of a call failing because '
+                                 'Keystone is unavailable.')
+        parser.add_argument('--checkpoint', default=None,
+                            help='File recording the plan and its '
+                                 'progress; a run given the file of an '
+                                 'interrupted one with the same desired '
+                                 'state resumes it. It is removed once '
+                                 'the plan was made.')
+        parser.add_argument('--ignore-errors', action='store_true',
+                            default=False,
+                            help='Apply the plan even though parts of the '
+                                 'desired state could not be planned.')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        with io.open(options['file'], 'rb') as stream:
+            data = stream.read()
+        digest = identity_reconcile.source_digest(data)
+        checkpoint = None
+        plan = None
+        if options['checkpoint'] and not options['dry_run']:
+            checkpoint = identity_reconcile.Checkpoint(options['checkpoint'])
+            plan = checkpoint.plan
+        if plan is not None:
+            if checkpoint.digest != digest:
+                raise CommandError(
+                    '%s holds the plan of another desired state; remove it '
+                    'to reconcile %s.' % (options['checkpoint'],
+                                          options['file']))
+            self.stdout.write('Resuming the plan of %s, %d changes made.' % (
+                options['checkpoint'], len(checkpoint.done)))
+        else:
+            file_format = (options['format'] or
+                           identity_reconcile.detect_format(options['file']))
+            try:
+                desired = identity_reconcile.load_desired(io.BytesIO(data),
+                                                          file_format)
+            except ValueError as e:
+                raise CommandError('%s: %s' % (options['file'], e))
+            plan = identity_reconcile.compute_plan(
+                None, desired, concurrency=options['concurrency'])
+
+        for error in plan.errors:
+            self.stderr.write(error)
+        calls = identity_reconcile.estimate_calls(plan)
+        if options['dry_run']:
+            for number, stage in enumerate(plan.stages):
+                for change in stage:
+                    self.stdout.write('%d %s' % (number + 1,
+                                                 _describe(change)))
+            self.stdout.write('%d Keystone calls (%s) after %d listings '
+                              'read to plan.' % (
+                                  sum(calls.values()),
+                                  ', '.join('%s %d' % item for item
+                                            in sorted(calls.items())),
+                                  plan.reads))
+            return
+        if plan.errors and not options['ignore_errors']:
+            raise CommandError('%d parts of the desired state could not '
+                               'be planned; nothing was changed.' %
+                               len(plan.errors))
+        if checkpoint is not None and checkpoint.plan is not plan:
+            checkpoint.start(plan, digest)
+
+        def progress(change, error):
+            if error is not None:
+                self.stderr.write('Failed: %s: %s' % (_describe(change),
+                                                      error))
+
+        result = identity_reconcile.apply(
+            None, plan, concurrency=options['concurrency'],
+            retries=options['retries'], checkpoint=checkpoint,
+            progress=progress)
+        for change in result.skipped:
+            self.stderr.write('Skipped: %s' % _describe(change))
+        made = len([outcome for outcome in result.outcomes
+                    if outcome.error is None])
+        failed = len(result.outcomes) - made + len(result.skipped)
+        self.stdout.write('Made %d of %d changes in %.1f seconds.' % (
+            made, sum(calls.values()), time.time() - start))
+        if failed:
+            raise CommandError('%d changes were not made.' % failed)
+        if checkpoint is not None:
+            checkpoint.finish()
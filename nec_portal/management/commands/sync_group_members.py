@@ -0,0 +1,74 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from nec_portal.api import group_sync
+
+
+class Command(BaseCommand):
+    help = ("Make the users listed in a file, one name or ID per line, "
+            "the members of a group: listed users are added and members "
+            "who are not listed are removed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('group', help='ID of the group.')
+        parser.add_argument('file', help='File listing the members.')
+        parser.add_argument('--domain', default='default',
+                            help='Domain of the users.')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Number of changes made at once.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Only print the changes.')
+        parser.add_argument('--allow-empty', action='store_true',
+                            default=False,
+                            help='Remove every member when the file lists '
+                                 'no users.')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        with io.open(options['file'], 'rb') as stream:
+            targets = list(group_sync.read_targets(stream))
+        if not targets and not options['allow_empty']:
+            raise CommandError('%s lists no users; use --allow-empty to '
+                               'remove every member.' % options['file'])
+        result = group_sync.sync_group(
+            None, options['group'], targets, domain=options['domain'],
+            concurrency=options['concurrency'],
+            dry_run=options['dry_run'])
+        for target in result.unknown:
+            self.stderr.write('Unknown user: %s' % target)
+        if options['dry_run']:
+            for user_id in result.plan.add:
+                self.stdout.write('add %s' % user_id)
+            for user_id in result.plan.remove:
+                self.stdout.write('remove %s' % user_id)
+            return
+        failed = 0
+        for outcome in result.outcomes:
+            action, user_id = outcome.item
+            if outcome.error:
+                failed += 1
+                self.stderr.write('Unable to %s %s: %s' % (
+                    action, user_id, outcome.error))
+        self.stdout.write('Added %d and removed %d members of %s in %.1f '
+                          'seconds.' % (
+                              len(result.plan.add), len(result.plan.remove),
+                              options['group'], time.time() - start))
+        if failed:
+            raise CommandError('%d changes failed.' % failed)
@@ -0,0 +1,40 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from nec_portal.api import identity_replica
+from nec_portal.api import project_identity
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the local identity replica from Keystone. "
+            "Run it periodically, e.g. from cron, more often than the "
+            "replica 'max_age' setting.")
+
+    def handle(self, *args, **options):
+        replica = identity_replica.get_replica(fresh=False)
+        if replica is None:
+            raise CommandError('IDENTITY_REPLICA is not enabled.')
+
+        start = time.time()
+        counts = replica.sync(project_identity.get_keystone_client())
+        self.stdout.write(
+            'Synchronized %s in %.1f seconds: %s' % (
+                replica.path, time.time() - start,
+                ', '.join('%d %s' % (count, name)
+                          for name, count in sorted(counts.items()))))
@@ -0,0 +1,139 @@
+/*
+ * Refreshes the ajax-update rows of a table with one request per poll.
+ *
+ * Tables carrying a data-batch-update-url attribute have the rows whose
+ * status is unknown fetched together from that URL, which answers
+ * {object id: row html}; an empty string removes the row. Pages with
+ * other polling tables keep Horizon's row by row update.
+ */
+(function ($, horizon) {
+  "use strict";
+
+  var rowByRowUpdate = horizon.datatables.update;
+  var MAX_IDS = 100;
+
+  function objectId($row) {
+    return $row.attr("data-object-id") || $row.attr("id").split("__row__")[1];
+  }
+
+  // Moves the jquery.treetable node of a replaced row to its new row.
+  function keepTreeNode($table, $row, $newRow) {
+    var tree = $table.data("treetable");
+    var node = tree && tree.tree[$row.data("ttId")];
+    if (!node) {
+      return;
+    }
+    $.each(["branch", "leaf", "expanded", "collapsed"], function (i, name) {
+      $newRow.toggleClass(name, $row.hasClass(name));
+    });
+    $newRow.attr("style", $row.attr("style") || null);
+    if ($row.data("ttBranch") !== undefined) {
+      $newRow.data("ttBranch", $row.data("ttBranch"));
+    }
+    node.row = $newRow;
+    node.treeCell = $($newRow.children(tree.settings.columnElType)
+      [tree.settings.column]);
+    node.treeCell.prepend(node.indenter);
+  }
+
+  function replaceRows($table, rows) {
+    var tree = $table.data("treetable");
+    $.each(rows, function (objId, html) {
+      var $row = $table.find("tbody > tr[id]").filter(function () {
+        return objectId($(this)) === objId;
+      });
+      if (!$row.length) {
+        // A created row has no place in a tree until it is reloaded.
+        if (html && !tree) {
+          // Created since the page was rendered.
+          $table.find("tbody > tr.empty").remove();
+          $table.find("tbody").append(html);
+          horizon.datatables.update_footer_count($table);
+        }
+        return;
+      }
+      if (!html) {
+        $row.fadeOut(400, function () {
+          if (tree && tree.tree[$row.data("ttId")]) {
+            $table.treetable("removeNode", $row.data("ttId"));
+          }
+          $row.remove();
+          horizon.datatables.update_footer_count($table);
+        });
+        return;
+      }
+      var $newRow = $(html);
+      if ($newRow.html() !== $row.html()) {
+        // Keep the selection of the row checkbox.
+        var checked = $row.find(".table-row-multi-select:checkbox")
+          .is(":checked");
+        $newRow.find(".table-row-multi-select:checkbox")
+          .prop("checked", checked);
+        $row.replaceWith($newRow);
+        keepTreeNode($table, $row, $newRow);
+        horizon.datatables.validate_button();
+      }
+    });
+  }
+
+  // Fetches the rows of the objects ids of the table, then calls complete.
+  function fetchRows($table, ids, complete) {
+    var pending = 0;
+    for (var start = 0; start < ids.length; start += MAX_IDS) {
+      pending += 1;
+      horizon.ajax.queue({
+        url: $table.attr("data-batch-update-url"),
+        data: {ids: ids.slice(start, start + MAX_IDS)},
+        traditional: true,
+        dataType: "json",
+        success: function (rows) {
+          replaceRows($table, rows);
+        },
+        complete: function () {
+          pending -= 1;
+          if (pending === 0 && complete) {
+            complete();
+          }
+        }
+      });
+    }
+    if (!pending && complete) {
+      complete();
+    }
+  }
+
+  horizon.datatables.fetch_rows = fetchRows;
+  horizon.datatables.row_object_id = objectId;
+
+  horizon.datatables.update = function () {
+    var $rows = $("tr.status_unknown.ajax-update");
+    if (!$rows.length) {
+      return;
+    }
+    var $tables = $rows.closest("table");
+    if ($tables.not("[data-batch-update-url]").length) {
+      rowByRowUpdate();
+      return;
+    }
+    var interval = parseInt($rows.attr("data-update-interval"), 10) || 2500;
+    var pending = 0;
+    if ($rows.find(".actions_column .btn-group.open").length ||
+        $tables.closest("form").attr("data-submitted")) {
+      setTimeout(horizon.datatables.update, interval);
+      return;
+    }
+    $tables.each(function () {
+      var $table = $(this);
+      var ids = $table.find("tr.status_unknown.ajax-update").map(function () {
+        return objectId($(this));
+      }).get();
+      pending += 1;
+      fetchRows($table, ids, function () {
+        pending -= 1;
+        if (pending === 0) {
+          setTimeout(horizon.datatables.update, interval);
+        }
+      });
+    });
+  };
+}(jQuery, horizon));
@@ -0,0 +1,64 @@
+/*
+ * Refreshes the rows of a table changed by other requests.
+ *
+ * Tables carrying a data-change-events-url attribute follow that URL with
+ * server-sent events; each change event names the objects whose rows are
+ * fetched again through data-batch-update-url (see batch_row_update.js).
+ * An event without ids, or a reset, refreshes every row.
+ */
+(function ($, horizon) {
+  "use strict";
+
+  // Changes arriving together are fetched with one request.
+  var DELAY = 500;
+
+  function follow($table) {
+    var changed = {};
+    var all = false;
+    var timer = null;
+
+    function flush() {
+      timer = null;
+      var ids = all ? $table.find("tbody > tr[id]").map(function () {
+        return horizon.datatables.row_object_id($(this));
+      }).get() : Object.keys(changed);
+      changed = {};
+      all = false;
+      horizon.datatables.fetch_rows($table, ids);
+    }
+
+    function schedule(ids) {
+      if (ids) {
+        $.each(ids, function (i, objId) {
+          changed[objId] = true;
+        });
+      } else {
+        all = true;
+      }
+      if (!timer) {
+        timer = setTimeout(flush, DELAY);
+      }
+    }
+
+    var source = new EventSource($table.attr("data-change-events-url"));
+    source.addEventListener("change", function (event) {
+      schedule(JSON.parse(event.data).ids);
+    });
+    source.addEventListener("reset", function () {
+      schedule(null);
+    });
+    $(window).on("beforeunload", function () {
+      source.close();
+    });
+  }
+
+  horizon.addInitFunction(function () {
+    if (!window.EventSource || !horizon.datatables.fetch_rows) {
+      return;
+    }
+    $("table[data-change-events-url][data-batch-update-url]").each(
+      function () {
+        follow($(this));
+      });
+  });
+}(jQuery, horizon));
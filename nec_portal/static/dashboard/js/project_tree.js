@@ -0,0 +1,73 @@
+/*
+ * Loads the branches of the projects tree as they are expanded.
+ *
+ * Rows marked data-tt-branch="true" have subprojects which were not
+ * rendered with the page; expanding one fetches them from the branch URL,
+ * a "Show more" row fetching the next ones of a large branch. Collapsing
+ * the branch drops them again, so that the table only holds the rows of
+ * the expanded part of the tree.
+ */
+(function ($, horizon) {
+  "use strict";
+
+  function pageMarker() {
+    var found = /[?&]tenant_marker=([^&]*)/.exec(window.location.search);
+    return found ? decodeURIComponent(found[1].replace(/\+/g, " ")) : null;
+  }
+
+  function loadBranch($table, url, node, offset) {
+    if (node.loading) {
+      return;
+    }
+    node.loading = true;
+    var data = {offset: offset};
+    var marker = pageMarker();
+    if (marker) {
+      data.tenant_marker = marker;
+    }
+    $.ajax({
+      url: url.replace("__id__", encodeURIComponent(node.id)),
+      data: data,
+      dataType: "html"
+    }).done(function (html) {
+      $table.find("tbody > tr.tree-more").filter(function () {
+        return String($(this).data("ttParentId")) === String(node.id);
+      }).each(function () {
+        $table.treetable("removeNode", $(this).data("ttId"));
+      });
+      var $rows = $($.parseHTML($.trim(html) || ""));
+      if (!$rows.length && !node.children.length) {
+        // The subprojects are gone.
+        node.row.data("ttBranch", false);
+      }
+      $table.treetable("loadBranch", node, $rows);
+    }).always(function () {
+      node.loading = false;
+    });
+  }
+
+  function init($table, url) {
+    $table.treetable({
+      expandable: true,
+      column: 1,
+      onNodeExpand: function () {
+        if (this.row.data("ttBranch") === true && !this.children.length) {
+          loadBranch($table, url, this, 0);
+        }
+      },
+      onNodeCollapse: function () {
+        if (this.row.data("ttBranch") === true) {
+          $table.treetable("unloadBranch", this);
+        }
+      }
+    });
+    $table.on("click", "tbody > tr.tree-more a", function (event) {
+      event.preventDefault();
+      var $row = $(this).closest("tr");
+      loadBranch($table, url, $table.treetable("node", $row.data("ttParentId")),
+                 $row.data("offset"));
+    });
+  }
+
+  horizon.project_tree = {init: init};
+}(jQuery, horizon));
@@ -0,0 +1,83 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import circuit_breaker
+
+
+class CircuitBreakerTests(test.TestCase):
+
+    def _breaker(self, **kwargs):
+        kwargs.setdefault('window', 4)
+        kwargs.setdefault('min_calls', 4)
+        kwargs.setdefault('failure_ratio', 0.5)
+        kwargs.setdefault('slow_call_seconds', 1.0)
+        kwargs.setdefault('open_seconds', 30)
+        return circuit_breaker.CircuitBreaker(**kwargs)
+
+    def test_stays_closed_below_min_calls(self):
+        breaker = self._breaker()
+        for _i in range(3):
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_opens_on_failure_ratio(self):
+        breaker = self._breaker()
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        breaker.record(True, 0.1)
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = self._breaker()
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        breaker.record(False, 2.0)
+        breaker.record(False, 2.0)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_OPEN)
+
+    def test_half_open_allows_single_trial(self):
+        breaker = self._breaker(open_seconds=0)
+        for _i in range(4):
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_CLOSED)
+
+    def test_failed_trial_reopens(self):
+        breaker = self._breaker(open_seconds=0)
+        for _i in range(4):
+            breaker.record(True, 0.1)
+        self.assertTrue(breaker.allow_request())
+        breaker.open_seconds = 30
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_OPEN)
+
+    def test_last_known_good_is_bounded(self):
+        store = circuit_breaker.LastKnownGood(max_entries=2)
+        store.put('a', 1)
+        store.put('b', 2)
+        store.get('a')
+        store.put('c', 3)
+
+        self.assertEqual(store.get('a')[0], 1)
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('c')[0], 3)
@@ -0,0 +1,72 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import circuit_breaker
+from nec_portal.api import deadline
+from nec_portal.api import project_identity
+
+
+class DeadlineTests(test.TestCase):
+
+    def test_scope_sets_and_restores_deadline(self):
+        self.assertIsNone(deadline.current())
+        with deadline.deadline_scope(10) as budget:
+            self.assertIs(deadline.current(), budget)
+            self.assertTrue(0 < budget.remaining() <= 10)
+        self.assertIsNone(deadline.current())
+
+    def test_nested_scope_does_not_extend_budget(self):
+        with deadline.deadline_scope(5) as outer:
+            with deadline.deadline_scope(60) as inner:
+                self.assertIs(inner, outer)
+
+    def test_expired_deadline_is_marked_exhausted(self):
+        with deadline.deadline_scope(0) as budget:
+            self.assertRaises(deadline.DeadlineExceeded, budget.check)
+            self.assertTrue(budget.exhausted)
+
+    def test_call_timeout_is_clamped_to_deadline(self):
+        with deadline.deadline_scope(1):
+            self.assertTrue(project_identity._call_timeout('group_get') <= 1)
+
+    def test_identity_call_skipped_after_deadline(self):
+        self.mox.StubOutWithMock(project_identity, 'get_keystone_client')
+        self.mox.ReplayAll()
+
+        with deadline.deadline_scope(0) as budget:
+            self.assertRaises(deadline.DeadlineExceeded,
+                              project_identity.group_get,
+                              self.request, 'group_id_0000-1111-2222')
+        self.assertTrue(budget.exhausted)
+
+    def test_deadline_during_half_open_trial_releases_it(self):
+        breaker = circuit_breaker.CircuitBreaker(window=4, min_calls=2,
+                                                 open_seconds=0)
+        breaker.record(True, 0.1)
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.STATE_HALF_OPEN)
+        self.mox.stubs.Set(project_identity, 'BREAKER', breaker)
+        self.mox.StubOutWithMock(project_identity, '_call_timeout')
+        # The deadline runs out after the trial was allowed.
+        project_identity._call_timeout('group_get').AndRaise(
+            deadline.DeadlineExceeded())
+        self.mox.ReplayAll()
+
+        self.assertRaises(deadline.DeadlineExceeded,
+                          project_identity.group_get,
+                          self.request, 'group_id_0000-1111-2222')
+        self.assertEqual(breaker.state, circuit_breaker.STATE_HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
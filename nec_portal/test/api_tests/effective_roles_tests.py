@@ -0,0 +1,71 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import effective_roles
+from nec_portal.api import signals
+
+
+class EffectiveRolesTests(test.TestCase):
+
+    def setUp(self):
+        super(EffectiveRolesTests, self).setUp()
+        effective_roles.CACHE.invalidate()
+
+    def test_expand_group_assignments(self):
+        roles = effective_roles.expand(
+            [('user', 'u1', 'r1'), ('group', 'g1', 'r2'),
+             ('group', 'g1', 'r3')],
+            lambda group_id: {'g1': ['u1', 'u2']}[group_id])
+
+        self.assertEqual(roles, {'u1': frozenset(['r1', 'r2', 'r3']),
+                                 'u2': frozenset(['r2', 'r3'])})
+
+    def test_cache_invalidated_by_role_change(self):
+        cache = effective_roles.CACHE
+        cache.put('p1', {'u1': frozenset(['r1'])}, cache.generation)
+        cache.put('p2', {}, cache.generation)
+
+        signals.identity_changed.send(
+            sender='add_group_role',
+            arguments={'project': 'p1', 'group': 'g1', 'role': 'r2'},
+            result=None)
+
+        self.assertIsNone(cache.get('p1'))
+        self.assertEqual(cache.get('p2'), {})
+
+    def test_cache_invalidated_by_inherited_role_change(self):
+        cache = effective_roles.CACHE
+        cache.put('p1', {}, cache.generation)
+        cache.put('p2', {}, cache.generation)
+
+        signals.identity_changed.send(
+            sender='add_group_role',
+            arguments={'project': 'p1', 'group': 'g1', 'role': 'r2',
+                       'inherited': True},
+            result=None)
+
+        # The subprojects of p1 are affected as well.
+        self.assertIsNone(cache.get('p2'))
+
+    def test_cache_skips_results_fetched_during_a_change(self):
+        cache = effective_roles.CACHE
+        generation = cache.generation
+        signals.identity_changed.send(
+            sender='remove_group_user',
+            arguments={'group_id': 'g1', 'user_id': 'u1'}, result=None)
+        cache.put('p1', {'u1': frozenset(['r1'])}, generation)
+
+        self.assertIsNone(cache.get('p1'))
@@ -0,0 +1,99 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import threading
+
+from keystoneclient import exceptions as keystone_exceptions
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import group_sync
+from nec_portal.api import identity_records
+from nec_portal.api import project_identity
+from nec_portal.api import user_import
+
+
+class GroupSyncTests(test.TestCase):
+
+    def setUp(self):
+        super(GroupSyncTests, self).setUp()
+        user_import._INDEXES.clear()
+        self.lock = threading.Lock()
+        self.changes = []
+        users = [identity_records.UserRecord(id='u-%s' % name, name=name)
+                 for name in ('alice', 'bob', 'carol', 'dave')]
+        members = [users[0], users[1]]
+
+        def iter_users(domain=None, group=None):
+            return iter(members if group else users)
+
+        self.mox.stubs.Set(project_identity, 'iter_users', iter_users)
+        self.mox.stubs.Set(project_identity, 'add_group_user',
+                           self._add_group_user)
+        self.mox.stubs.Set(project_identity, 'remove_group_user',
+                           self._remove_group_user)
+
+    def _add_group_user(self, request, group_id, user_id):
+        if user_id == 'u-dave':
+            raise keystone_exceptions.Forbidden()
+        with self.lock:
+            self.changes.append(('add', group_id, user_id))
+
+    def _remove_group_user(self, request, group_id, user_id):
+        with self.lock:
+            self.changes.append(('remove', group_id, user_id))
+
+    def test_read_targets(self):
+        stream = io.BytesIO(b'alice\n\n# HR list\n  bob  \n')
+
+        self.assertEqual(list(group_sync.read_targets(stream)),
+                         ['alice', 'bob'])
+
+    def test_plan_membership(self):
+        plan = group_sync.plan_membership(['u1', 'u2'], ['u2', 'u3'])
+
+        self.assertEqual(plan, group_sync.MembershipPlan(['u3'], ['u1']))
+
+    def test_sync_group(self):
+        result = group_sync.sync_group(
+            None, 'g1', ['alice', 'u-carol', 'dave', 'erin'], domain='d1')
+
+        self.assertEqual(result.plan.add, ['u-carol', 'u-dave'])
+        self.assertEqual(result.plan.remove, ['u-bob'])
+        self.assertEqual(result.unknown, ['erin'])
+        self.assertEqual(sorted(self.changes),
+                         [('add', 'g1', 'u-carol'),
+                          ('remove', 'g1', 'u-bob')])
+        self.assertEqual([outcome.item for outcome in result.outcomes
+                          if outcome.error], [('add', 'u-dave')])
+
+    def test_sync_group_dry_run(self):
+        result = group_sync.sync_group(None, 'g1', ['alice'], domain='d1',
+                                       dry_run=True)
+
+        self.assertEqual(result.plan.remove, ['u-bob'])
+        self.assertEqual(result.outcomes, [])
+        self.assertEqual(self.changes, [])
+
+    def test_sync_group_require_all(self):
+        for targets, unknown in ((['alice', 'erin'], ['erin']), ([], [])):
+            try:
+                group_sync.sync_group(None, 'g1', targets, domain='d1',
+                                      require_all=True)
+            except group_sync.IncompleteTargets as error:
+                self.assertEqual(error.unknown, unknown)
+            else:
+                self.fail('IncompleteTargets not raised')
+        self.assertEqual(self.changes, [])
@@ -0,0 +1,91 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from django.core.cache import cache
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_events
+from nec_portal.api import signals
+
+
+class IdentityEventsTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityEventsTests, self).setUp()
+        cache.clear()
+        self.mox.stubs.Set(identity_events, 'CHANGE_EVENTS_SETTING',
+                           {'keep': 3, 'interval': 0})
+
+    def test_events_since(self):
+        since = identity_events.last_id()
+        identity_events.publish('users', ['u1'], 'p1')
+        identity_events.publish('groups', ['g1'])
+        identity_events.publish('users', ['u2'], 'p2')
+
+        events, latest = identity_events.events_since(since, 'users', 'p1')
+
+        self.assertEqual([event.ids for event in events], [['u1']])
+        self.assertEqual(latest, since + 3)
+        self.assertEqual(identity_events.events_since(latest), ([], latest))
+
+    def test_events_since_lost(self):
+        for user_id in ('u1', 'u2', 'u3', 'u4'):
+            identity_events.publish('users', [user_id])
+
+        events, latest = identity_events.events_since(0)
+
+        self.assertIsNone(events)
+        self.assertEqual(latest, 4)
+
+    def test_events_since_stops_at_gap(self):
+        identity_events.publish('users', ['u1'])
+        identity_events.publish('users', ['u2'])
+        identity_events.publish('users', ['u3'])
+        # The second event is still being written.
+        cache.delete(identity_events.EVENT_KEY % 2)
+
+        events, latest = identity_events.events_since(0)
+
+        self.assertEqual([event.ids for event in events], [['u1']])
+        self.assertEqual(latest, 1)
+
+        identity_events.publish('users', ['u4'])
+        identity_events.publish('users', ['u5'])
+
+        events, latest = identity_events.events_since(latest)
+
+        self.assertIsNone(events)
+        self.assertEqual(latest, 5)
+
+    def test_wait_times_out(self):
+        self.assertEqual(identity_events.wait(0, 0), ([], 0))
+
+    def test_group_role_change_refreshes_members(self):
+        signals.identity_changed.send(
+            sender='add_group_role',
+            arguments={'role': 'r1', 'group': 'g1', 'project': 'p1',
+                       'inherited': False},
+            result=None)
+
+        events, _latest = identity_events.events_since(0)
+
+        self.assertEqual([tuple(event)[1:] for event in events],
+                         [('groups', ['g1'], 'p1'), ('users', None, 'p1')])
+
+    def test_unknown_operation_is_ignored(self):
+        signals.identity_changed.send(sender='role_list', arguments={},
+                                      result=None)
+
+        self.assertEqual(identity_events.last_id(), 0)
@@ -0,0 +1,134 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import json
+
+from openstack_dashboard.api import base
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_export
+from nec_portal.api import project_identity
+from nec_portal.test.api_tests.identity_replica_tests import Assignment
+
+ROLE_NAMES = {'r1': 'C__DC1__Reader', 'r2': 'T__DC1__ObjectStore'}
+
+
+def _user(user_id, name):
+    return base.APIDictWrapper({'id': user_id, 'name': name,
+                                'email': '%s@example.com' % name,
+                                'enabled': True})
+
+
+class IdentityExportTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityExportTests, self).setUp()
+        self.mox.stubs.Set(project_identity, 'role_list', lambda request: [
+            base.APIDictWrapper({'id': role_id, 'name': name})
+            for role_id, name in ROLE_NAMES.items()])
+
+    def test_user_rows(self):
+        # u3 is a member of p1 through a group only.
+        assignments = {'u1': [Assignment('r1', 'p1', user_id='u1'),
+                              Assignment('r2', 'p1', user_id='u1'),
+                              Assignment('r1', 'p2', user_id='u1')],
+                       'u2': [Assignment('r1', 'p2', user_id='u2')],
+                       'u3': [Assignment('r2', 'p1', user_id='u3')]}
+        looked_up = []
+
+        def iter_role_assignments(project=None, user=None, effective=False,
+                                  include_names=False):
+            self.assertTrue(effective)
+            if project:
+                return iter([assignment
+                             for listed in assignments.values()
+                             for assignment in listed
+                             if assignment.scope['project']['id'] ==
+                             project])
+            looked_up.append(user)
+            return iter(assignments[user])
+
+        self.mox.stubs.Set(project_identity, 'iter_users',
+                           lambda domain=None: iter([_user('u1', 'alice'),
+                                                     _user('u2', 'bob'),
+                                                     _user('u3', 'carol')]))
+        self.mox.stubs.Set(project_identity, 'iter_role_assignments',
+                           iter_role_assignments)
+
+        rows = list(identity_export.user_rows(None, 'p1', domain='d1'))
+
+        self.assertEqual([(row['user_id'], row['project_id'], row['roles'])
+                          for row in rows],
+                         [('u1', 'p1', 'C__DC1__Reader;T__DC1__ObjectStore'),
+                          ('u1', 'p2', 'C__DC1__Reader'),
+                          ('u3', 'p1', 'T__DC1__ObjectStore')])
+        self.assertItemsEqual(looked_up, ['u1', 'u3'])
+
+    def test_group_rows(self):
+        groups = [base.APIDictWrapper({'id': 'g1', 'name': 'admins'}),
+                  base.APIDictWrapper({'id': 'g2', 'name': 'empty'})]
+        members = {'g1': [_user('u1', 'alice'), _user('u2', 'bob')],
+                   'g2': []}
+        self.mox.stubs.Set(project_identity, 'project_group_refs',
+                           lambda project=None, domain=None: groups)
+        self.mox.stubs.Set(project_identity, 'iter_users',
+                           lambda group=None: iter(members[group]))
+
+        rows = list(identity_export.group_rows(None, 'p1'))
+
+        self.assertEqual([(row['group_id'], row['user_name'])
+                          for row in rows],
+                         [('g1', 'alice'), ('g1', 'bob'), ('g2', '')])
+
+    def test_role_rows_without_names(self):
+        def iter_role_assignments(project=None, **filters):
+            if filters:
+                raise TypeError('include_names')
+            return iter([Assignment('r1', project, user_id='u1'),
+                         Assignment('r2', project, group_id='g1')])
+
+        self.mox.stubs.Set(project_identity, 'iter_role_assignments',
+                           iter_role_assignments)
+
+        rows = list(identity_export.role_rows(None, 'p1'))
+
+        self.assertEqual([(row['actor_type'], row['actor_id'],
+                           row['role_name'], row['inherited'])
+                          for row in rows],
+                         [('user', 'u1', 'C__DC1__Reader', False),
+                          ('group', 'g1', 'T__DC1__ObjectStore', False)])
+
+    def test_iter_csv(self):
+        rows = [{'actor_type': 'user', 'actor_id': 'u1',
+                 'actor_name': u'al,ice', 'role_id': 'r1',
+                 'role_name': 'C__DC1__Reader', 'inherited': True}]
+
+        lines = list(identity_export.iter_csv(identity_export.ROLE_FIELDS,
+                                              iter(rows)))
+
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].strip(),
+                         'user,u1,"al,ice",r1,C__DC1__Reader,true')
+
+    def test_iter_json(self):
+        rows = [{'group_id': 'g1', 'group_name': 'admins'},
+                {'group_id': 'g2', 'group_name': 'empty'}]
+
+        chunks = list(identity_export.iter_json(identity_export.GROUP_FIELDS,
+                                                iter(rows)))
+
+        self.assertEqual(len(chunks), 4)
+        exported = json.loads(''.join(chunks))
+        self.assertEqual([row['group_id'] for row in exported], ['g1', 'g2'])
+        self.assertEqual(exported[1]['user_id'], '')
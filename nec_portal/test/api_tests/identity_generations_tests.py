@@ -0,0 +1,81 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from django.core.cache import cache
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_generations
+from nec_portal.api import signals
+
+
+class IdentityGenerationsTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityGenerationsTests, self).setUp()
+        cache.clear()
+        self.mox.stubs.Set(identity_generations, 'CONDITIONAL_GET_SETTING',
+                           {'max_age': 3600})
+
+    def _token(self, listing, project='p1', scope=('user',)):
+        return identity_generations.version(listing, project, scope)[0]
+
+    def test_version_is_stable(self):
+        self.assertEqual(self._token('users'), self._token('users'))
+        self.assertNotEqual(self._token('users'),
+                            self._token('users', scope=('other user',)))
+
+    def test_bump_project(self):
+        users = self._token('users')
+        other_project = self._token('users', project='p2')
+        groups = self._token('groups')
+
+        identity_generations.bump('users', 'p1')
+
+        self.assertNotEqual(self._token('users'), users)
+        self.assertEqual(self._token('users', project='p2'), other_project)
+        self.assertEqual(self._token('groups'), groups)
+
+    def test_version_survives_eviction(self):
+        users = self._token('users')
+        identity_generations.bump('users', 'p1')
+
+        cache.clear()
+
+        self.assertNotEqual(self._token('users'), users)
+
+    def test_role_change_bumps_project(self):
+        users = self._token('users')
+        other_project = self._token('users', project='p2')
+
+        signals.identity_changed.send(
+            sender='add_group_role',
+            arguments={'role': 'r1', 'group': 'g1', 'project': 'p1',
+                       'inherited': False},
+            result=None)
+
+        self.assertNotEqual(self._token('users'), users)
+        self.assertEqual(self._token('users', project='p2'), other_project)
+
+    def test_inherited_role_change_bumps_all_projects(self):
+        other_project = self._token('groups', project='p2')
+
+        signals.identity_changed.send(
+            sender='add_group_role',
+            arguments={'role': 'r1', 'group': 'g1', 'project': 'p1',
+                       'inherited': True},
+            result=None)
+
+        self.assertNotEqual(self._token('groups', project='p2'),
+                            other_project)
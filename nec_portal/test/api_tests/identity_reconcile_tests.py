@@ -0,0 +1,234 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from keystoneclient import exceptions as keystone_exceptions
+
+from openstack_dashboard.api import base
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_reconcile
+from nec_portal.api import identity_records
+from nec_portal.api import project_identity
+from nec_portal.api import user_import
+from nec_portal.test.api_tests.identity_replica_tests import Assignment
+
+DESIRED = {
+    'groups': [{'name': 'developers', 'members': ['alice', 'bob']},
+               {'name': 'ops', 'description': 'Operators',
+                'members': ['carol']}],
+    'projects': [{'name': 'web', 'parent': 'platform',
+                  'description': 'Web services',
+                  'users': {'carol': ['reader']},
+                  'groups': {'ops': ['member']}},
+                 {'name': 'api', 'parent': 'web2'},
+                 {'name': 'web2', 'parent': 'platform'}],
+}
+
+
+def _wrap(**values):
+    return base.APIDictWrapper(values)
+
+
+class IdentityReconcileTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityReconcileTests, self).setUp()
+        user_import._INDEXES.clear()
+        self.lock = threading.Lock()
+        self.calls = []
+        self.tmp_dir = tempfile.mkdtemp()
+        users = [identity_records.UserRecord(id='u-%s' % name, name=name)
+                 for name in ('alice', 'bob', 'carol', 'dave')]
+
+        def iter_users(domain=None, group=None):
+            return iter(users[::3] if group else users)
+
+        self.mox.stubs.Set(project_identity, 'role_list', lambda request: [
+            _wrap(id='r1', name='reader'), _wrap(id='r2', name='member')])
+        self.mox.stubs.Set(project_identity, 'iter_projects',
+                           lambda domain=None: iter([
+                               _wrap(id='p-platform', name='platform',
+                                     description='', enabled=True,
+                                     parent_id=None),
+                               _wrap(id='p-web', name='web',
+                                     description='Web', enabled=True,
+                                     parent_id='p-platform')]))
+        self.mox.stubs.Set(project_identity, 'iter_groups',
+                           lambda domain=None: iter([
+                               _wrap(id='g-dev', name='developers',
+                                     description='')]))
+        self.mox.stubs.Set(project_identity, 'iter_users', iter_users)
+        self.mox.stubs.Set(project_identity, 'iter_role_assignments',
+                           lambda project=None: iter([
+                               Assignment('r1', project, user_id='u-carol'),
+                               Assignment('r2', project,
+                                          user_id='u-dave')]))
+        for name, result in (('group_create', _wrap(id='g-new')),
+                             ('project_create', None),
+                             ('project_update', None),
+                             ('add_group_user', None),
+                             ('remove_group_user', None),
+                             ('add_group_role', None),
+                             ('remove_project_user_role', None)):
+            self.mox.stubs.Set(project_identity, name,
+                               self._recorder(name, result))
+
+    def tearDown(self):
+        super(IdentityReconcileTests, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    def _recorder(self, name, result):
+        def call(request, *args, **kwargs):
+            with self.lock:
+                self.calls.append((name, args, kwargs))
+            if name == 'project_create':
+                return _wrap(id='p-%s' % args[0])
+            return result
+        return call
+
+    def _plan(self, desired=DESIRED):
+        stream = io.BytesIO(json.dumps(desired).encode('utf-8'))
+        return identity_reconcile.compute_plan(
+            None, identity_reconcile.load_desired(stream))
+
+    def test_load_desired_rejects_duplicates(self):
+        stream = io.BytesIO(b'{"groups": [{"name": "a"}, {"name": "a"}]}')
+
+        self.assertRaises(ValueError, identity_reconcile.load_desired,
+                          stream)
+
+    def test_compute_plan(self):
+        plan = self._plan()
+
+        self.assertEqual(
+            [[(change.action, change.target) for change in stage]
+             for stage in plan.stages],
+            [[('create_group', 'ops'), ('create_project', 'web2')],
+             [('create_project', 'api')],
+             [('update_project', 'web'),
+              ('add_member', 'developers'),
+              ('remove_member', 'developers'),
+              ('add_member', 'ops'),
+              ('grant', 'web'),
+              ('revoke', 'web')]])
+        self.assertEqual(plan.errors, [])
+        self.assertEqual(plan.reads, 5)
+        self.assertEqual(identity_reconcile.estimate_calls(plan)['grant'], 1)
+
+    def test_compute_plan_unknown_parent(self):
+        plan = self._plan({'projects': [{'name': 'orphan',
+                                         'parent': 'missing'}]})
+
+        self.assertEqual(plan.stages, [])
+        self.assertEqual(len(plan.errors), 1)
+
+    def test_apply(self):
+        plan = self._plan()
+
+        result = identity_reconcile.apply(None, plan)
+
+        self.assertEqual([outcome.error for outcome in result.outcomes],
+                         [None] * 9)
+        self.assertIn(('project_create', ('api',),
+                       {'description': None, 'enabled': True,
+                        'domain': 'default', 'parent': 'p-web2'}),
+                      self.calls)
+        self.assertIn(('add_group_role', (),
+                       {'role': 'r2', 'group': 'g-new',
+                        'project': 'p-web'}), self.calls)
+
+    def test_apply_skips_dependents_of_failed_creation(self):
+        def group_create(request, *args, **kwargs):
+            raise keystone_exceptions.Conflict()
+
+        self.mox.stubs.Set(project_identity, 'group_create', group_create)
+        plan = self._plan()
+
+        result = identity_reconcile.apply(None, plan)
+
+        self.assertEqual(sorted((change.action, change.target)
+                                for change in result.skipped),
+                         [('add_member', 'ops'), ('grant', 'web')])
+
+    def test_apply_retries_unavailable_keystone(self):
+        failures = [keystone_exceptions.ServiceUnavailable()]
+
+        def project_update(request, *args, **kwargs):
+            if failures:
+                raise failures.pop()
+
+        self.mox.stubs.Set(project_identity, 'project_update',
+                           project_update)
+        plan = self._plan({'projects': [{'name': 'web',
+                                         'description': 'New'}]})
+
+        result = identity_reconcile.apply(None, plan, backoff=0)
+
+        self.assertEqual([outcome.error for outcome in result.outcomes],
+                         [None])
+
+    def test_apply_does_not_create_twice_after_timeout(self):
+        def group_create(request, *args, **kwargs):
+            self.calls.append(('group_create', args, kwargs))
+            raise keystone_exceptions.RequestTimeout()
+
+        plan = self._plan({'groups': [{'name': 'ops'}]})
+        self.mox.stubs.Set(project_identity, 'group_create', group_create)
+        # The group was created by the request which timed out.
+        self.mox.stubs.Set(project_identity, 'iter_groups',
+                           lambda domain=None, name=None: iter([
+                               _wrap(id='g-ops', name='ops',
+                                     description='')]))
+
+        result = identity_reconcile.apply(None, plan, backoff=0)
+
+        self.assertEqual([(outcome.error, outcome.result)
+                          for outcome in result.outcomes], [(None, 'g-ops')])
+        self.assertEqual(len([call for call in self.calls
+                              if call[0] == 'group_create']), 1)
+
+    def test_checkpoint_finish(self):
+        path = os.path.join(self.tmp_dir, 'checkpoint.jsonl')
+        checkpoint = identity_reconcile.Checkpoint(path)
+        checkpoint.start(self._plan(), 'digest')
+        self.assertEqual(identity_reconcile.Checkpoint(path).digest,
+                         'digest')
+
+        checkpoint.finish()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(identity_reconcile.Checkpoint(path).plan)
+
+    def test_checkpoint_resumes(self):
+        path = os.path.join(self.tmp_dir, 'checkpoint.jsonl')
+        plan = self._plan()
+        checkpoint = identity_reconcile.Checkpoint(path)
+        checkpoint.start(plan)
+        identity_reconcile.apply(None, plan, checkpoint=checkpoint)
+        self.calls = []
+
+        resumed = identity_reconcile.Checkpoint(path)
+        result = identity_reconcile.apply(None, resumed.plan,
+                                          checkpoint=resumed)
+
+        self.assertEqual(resumed.plan, plan)
+        self.assertEqual(result.outcomes, [])
+        self.assertEqual(self.calls, [])
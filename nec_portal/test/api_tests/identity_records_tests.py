@@ -0,0 +1,57 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import pickle
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_records
+from nec_portal.test.api_tests.identity_replica_tests import Assignment
+
+
+class IdentityRecordsTests(test.TestCase):
+
+    def test_user_record(self):
+        user = self.users.first()
+        record = identity_records.UserRecord.from_resource(user)
+
+        self.assertEqual(record.id, user.id)
+        self.assertEqual(record.name, user.name)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_records_are_read_only(self):
+        record = identity_records.GroupRecord.from_resource(
+            self.groups.first())
+        with self.assertRaises(AttributeError):
+            record.name = 'changed'
+
+    def test_project_record_tree_attributes(self):
+        parent, child = identity_records.to_records(
+            identity_records.ProjectRecord, self.tenants.list()[:2])
+        child.parent = parent
+        parent.immediate_subprojects.append(child)
+
+        self.assertIs(child.parent, parent)
+        with self.assertRaises(AttributeError):
+            child.parent_id = parent.id
+
+    def test_role_assignment_record(self):
+        record = identity_records.RoleAssignmentRecord.from_resource(
+            Assignment('1', 'project', group_id='group'))
+
+        self.assertFalse(hasattr(record, 'user'))
+        self.assertEqual(record.group['id'], 'group')
+        self.assertEqual(record.role['id'], '1')
+        self.assertEqual(record.scope, {'project': {'id': 'project'}})
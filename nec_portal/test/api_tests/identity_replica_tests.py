@@ -0,0 +1,161 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import os
+import shutil
+import tempfile
+
+from keystoneclient import exceptions as keystone_exceptions
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_records
+from nec_portal.api import identity_replica
+from nec_portal.api import project_identity
+
+
+class FakeManager(object):
+
+    def __init__(self, items, members=None):
+        self.items = items
+        self.members = members or {}
+
+    def list(self, group=None, **kwargs):
+        if group:
+            return self.members.get(group, [])
+        return self.items
+
+    def get(self, item_id):
+        for item in self.items:
+            if item.id == item_id:
+                return item
+        raise keystone_exceptions.NotFound()
+
+
+class FakeClient(object):
+
+    def __init__(self, users, groups, projects, assignments, members):
+        self.users = FakeManager(users, members)
+        self.groups = FakeManager(groups)
+        self.projects = FakeManager(projects)
+        self.role_assignments = FakeManager(assignments)
+
+
+class Assignment(object):
+
+    def __init__(self, role_id, project_id, user_id=None, group_id=None):
+        self.role = {'id': role_id}
+        self.scope = {'project': {'id': project_id}}
+        if user_id:
+            self.user = {'id': user_id}
+        if group_id:
+            self.group = {'id': group_id}
+
+
+class IdentityReplicaTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityReplicaTests, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.replica = identity_replica.IdentityReplica(
+            os.path.join(self.tmp_dir, 'replica.sqlite3'))
+
+        users = self.users.list()
+        group = self.groups.first()
+        self.project_id = self.tenant.id
+        assignments = [Assignment('1', self.project_id, user_id=users[0].id),
+                       Assignment('2', self.project_id, user_id=users[1].id),
+                       Assignment('1', self.project_id, group_id=group.id),
+                       Assignment('1', 'other', user_id=users[2].id)]
+        self.replica.sync(FakeClient(users, [group], self.tenants.list(),
+                                     assignments,
+                                     {group.id: [users[1], users[2]]}))
+
+    def tearDown(self):
+        super(IdentityReplicaTests, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sync_marks_replica_fresh(self):
+        self.assertTrue(self.replica.is_fresh(60))
+
+    def test_project_users(self):
+        users = self.replica.project_users(self.project_id)
+        self.assertItemsEqual([u.id for u in users],
+                              [self.users.list()[0].id,
+                               self.users.list()[1].id])
+
+    def test_project_users_paged(self):
+        users = self.replica.project_users(self.project_id)
+        first = self.replica.project_users(self.project_id, limit=1)
+        rest = self.replica.project_users(self.project_id,
+                                          marker=first[0].id)
+        self.assertEqual([u.id for u in first + rest],
+                         [u.id for u in users])
+
+    def test_group_users(self):
+        users = self.replica.group_users(self.project_id,
+                                         self.groups.first().id)
+        self.assertEqual([u.id for u in users], [self.users.list()[1].id])
+
+    def test_project_groups(self):
+        groups = self.replica.project_groups(self.project_id)
+        self.assertEqual([g.id for g in groups], [self.groups.first().id])
+
+    def test_project_effective_roles(self):
+        users = self.users.list()
+        roles = self.replica.project_effective_roles(self.project_id)
+
+        self.assertEqual(roles[users[0].id], frozenset(['1']))
+        self.assertEqual(roles[users[1].id], frozenset(['1', '2']))
+        # Only a member of the group which has a role on the project.
+        self.assertEqual(roles[users[2].id], frozenset(['1']))
+        self.assertNotIn(users[3].id, roles)
+
+    def test_project_effective_roles_inherited(self):
+        user = self.users.list()[3]
+        child = identity_records.ProjectRecord(id='child', name='child',
+                                               parent_id=self.project_id)
+        self.replica.apply_change('project_create', {}, child)
+        self.replica.apply_change('add_project_user_role',
+                                  {'project': self.project_id,
+                                   'user': user.id, 'role': '3',
+                                   'group': None, 'inherited': True}, None)
+
+        # The grant applies to the subprojects only.
+        self.assertNotIn(
+            user.id, self.replica.project_effective_roles(self.project_id))
+        self.assertEqual(
+            self.replica.project_effective_roles('child')[user.id],
+            frozenset(['3']))
+
+    def test_apply_changes(self):
+        user = self.users.list()[3]
+        self.replica.apply_change('add_project_user_role',
+                                  {'project': self.project_id,
+                                   'user': user.id, 'role': '1',
+                                   'group': None}, None)
+        self.replica.apply_change('user_delete',
+                                  {'user_id': self.users.list()[0].id}, None)
+
+        users = self.replica.project_users(self.project_id)
+        self.assertItemsEqual([u.id for u in users],
+                              [self.users.list()[1].id, user.id])
+
+    def test_project_user_list_uses_replica(self):
+        self.mox.StubOutWithMock(identity_replica, 'get_replica')
+        identity_replica.get_replica().AndReturn(self.replica)
+        self.mox.ReplayAll()
+
+        users = project_identity.project_user_list(project=self.project_id)
+        self.assertEqual(len(users), 2)
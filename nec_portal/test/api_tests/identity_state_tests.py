@@ -0,0 +1,102 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_notifications
+from nec_portal.api import identity_records
+from nec_portal.api import identity_state
+from nec_portal.test.api_tests.identity_replica_tests import Assignment
+from nec_portal.test.api_tests.identity_replica_tests import FakeClient
+
+
+class IdentityNotificationsTests(test.TestCase):
+
+    def setUp(self):
+        super(IdentityNotificationsTests, self).setUp()
+        users = self.users.list()
+        group = self.groups.first()
+        self.project_id = self.tenant.id
+        assignments = [Assignment('1', self.project_id, user_id=users[0].id),
+                       Assignment('1', self.project_id, group_id=group.id)]
+        self.client = FakeClient(users, [group], self.tenants.list(),
+                                 assignments, {group.id: [users[1]]})
+        self.state = identity_state.IdentityState()
+        self.transport = identity_notifications.QueueTransport()
+        self.consumer = identity_notifications.NotificationConsumer(
+            self.state, self.transport, lambda: self.client,
+            poll_timeout=0.01)
+
+    def test_first_run_loads_state(self):
+        self.assertFalse(self.state.ready)
+        self.consumer.run_once()
+
+        self.assertTrue(self.state.ready)
+        users = self.state.project_users(self.project_id)
+        self.assertEqual([u.id for u in users], [self.users.first().id])
+
+    def test_role_assignment_notifications(self):
+        self.consumer.run_once()
+        user = self.users.list()[1]
+        self.transport.publish('identity.role_assignment.created',
+                               {'role': '2', 'user': user.id,
+                                'project': self.project_id})
+        self.transport.publish('identity.role_assignment.deleted',
+                               {'role': '1', 'user': self.users.first().id,
+                                'project': self.project_id})
+        self.consumer.run_once()
+
+        users = self.state.project_users(self.project_id)
+        self.assertEqual([u.id for u in users], [user.id])
+        group_users = self.state.group_users(self.project_id,
+                                             self.groups.first().id)
+        self.assertEqual([u.id for u in group_users], [user.id])
+
+    def test_inherited_role_assignment_notification(self):
+        self.consumer.run_once()
+        user = self.users.list()[2]
+        child = identity_records.ProjectRecord(id='child', name='child',
+                                               parent_id=self.project_id)
+        self.state.put_project(child)
+        self.transport.publish('identity.role_assignment.created',
+                               {'role': '2', 'user': user.id,
+                                'project': self.project_id,
+                                'inherited_to_projects': 'projects'})
+        self.consumer.run_once()
+
+        self.assertNotIn(
+            user.id, self.state.project_effective_roles(self.project_id))
+        self.assertEqual(
+            self.state.project_effective_roles('child')[user.id],
+            frozenset(['2']))
+
+    def test_deleted_notifications(self):
+        self.consumer.run_once()
+        self.transport.publish('identity.user.deleted',
+                               {'resource_info': self.users.first().id})
+        self.transport.publish('identity.group.deleted',
+                               {'resource_info': self.groups.first().id})
+        self.consumer.run_once()
+
+        self.assertEqual(self.state.project_users(self.project_id), [])
+        self.assertEqual(self.state.project_groups(self.project_id), [])
+
+    def test_updated_notification_for_missing_user(self):
+        self.consumer.run_once()
+        self.client.users.items = self.users.list()[1:]
+        self.transport.publish('identity.user.updated',
+                               {'resource_info': self.users.first().id})
+        self.consumer.run_once()
+
+        self.assertEqual(self.state.project_users(self.project_id), [])
@@ -0,0 +1,52 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import json
+import unittest
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_stream
+from nec_portal.api import project_identity
+
+
+class IdentityStreamTests(test.TestCase):
+
+    @unittest.skipIf(identity_stream.ijson is None, 'ijson is not installed')
+    def test_iter_members(self):
+        body = json.dumps({
+            'users': [{'id': '1', 'links': {'self': 'http://u/1'}},
+                      {'id': '2', 'links': {'self': 'http://u/2'}}],
+            'links': {'self': 'http://u', 'next': 'http://u?page=2'}})
+        links = {}
+        members = identity_stream.iter_members(
+            io.BytesIO(body.encode('utf-8')), 'users', links)
+
+        self.assertEqual([m['id'] for m in members], ['1', '2'])
+        self.assertEqual(links['next'], 'http://u?page=2')
+
+    def test_take_stops_when_all_found(self):
+        consumed = []
+
+        def users():
+            for user in self.users.list():
+                consumed.append(user.id)
+                yield user
+
+        wanted = self.users.list()[1].id
+        taken = project_identity._take(users(), set([wanted]))
+
+        self.assertEqual([u.id for u in taken], [wanted])
+        self.assertEqual(len(consumed), 2)
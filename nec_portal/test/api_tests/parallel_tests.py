@@ -0,0 +1,56 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import threading
+import time
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import deadline
+from nec_portal.api import parallel
+
+
+class RunBoundedTests(test.TestCase):
+
+    def test_outcomes_in_order(self):
+        def double(item):
+            if item == 2:
+                raise ValueError(item)
+            return item * 2
+
+        outcomes = parallel.run_bounded(double, range(4), 3)
+
+        self.assertEqual([o.result for o in outcomes], [0, 2, None, 6])
+        self.assertIsInstance(outcomes[2].error, ValueError)
+
+    def test_concurrency_limit(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work(item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        parallel.run_bounded(work, range(10), 2)
+        self.assertEqual(running[1], 2)
+
+    def test_deadline_shared_with_workers(self):
+        with deadline.deadline_scope(60) as budget:
+            outcomes = parallel.run_bounded(lambda item: deadline.current(),
+                                            range(3), 3)
+        self.assertEqual([o.result for o in outcomes], [budget] * 3)
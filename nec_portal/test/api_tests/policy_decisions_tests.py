@@ -0,0 +1,72 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from django import http
+
+from openstack_dashboard import api
+from openstack_dashboard import policy
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import policy_decisions
+
+RULES = (('identity', 'identity:update_user'),)
+
+
+class PolicyDecisionsTests(test.TestCase):
+
+    def setUp(self):
+        super(PolicyDecisionsTests, self).setUp()
+        self.calls = []
+
+        def check(rules, request, target=None):
+            self.calls.append((rules, target))
+            return target != {'user_id': 'u2'}
+
+        self.mox.stubs.Set(policy, 'check', check)
+        self.mox.stubs.Set(api.keystone, 'keystone_can_edit_user',
+                           lambda: self.calls.append('can_edit') or True)
+
+    def test_check_is_asked_once_per_target(self):
+        request = http.HttpRequest()
+
+        self.assertTrue(policy_decisions.check(RULES, request,
+                                               {'user_id': 'u1'}))
+        self.assertTrue(policy_decisions.check(RULES, request,
+                                               {'user_id': 'u1'}))
+        self.assertFalse(policy_decisions.check(RULES, request,
+                                                {'user_id': 'u2'}))
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(policy_decisions.decisions(request).hits, 1)
+
+    def test_decisions_are_per_request(self):
+        policy_decisions.check(RULES, http.HttpRequest())
+        policy_decisions.check(RULES, http.HttpRequest())
+
+        self.assertEqual(len(self.calls), 2)
+
+    def test_can_edit(self):
+        request = http.HttpRequest()
+
+        for _i in range(3):
+            self.assertTrue(policy_decisions.can_edit(request, 'user'))
+
+        self.assertEqual(self.calls, ['can_edit'])
+        self.assertTrue(policy_decisions.server_timing(request).startswith(
+            'authz;dur='))
+        self.assertIn('3 checks, 2 memoized',
+                      policy_decisions.server_timing(request))
+
+    def test_server_timing_without_decisions(self):
+        self.assertIsNone(policy_decisions.server_timing(http.HttpRequest()))
@@ -0,0 +1,80 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import threading
+
+from keystoneclient import exceptions as keystone_exceptions
+
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import project_cascade
+from nec_portal.api import project_identity
+
+SUBTREE = {'a': {'a1': None, 'a2': {'a21': None}},
+           'b': None}
+
+
+class ProjectCascadeTests(test.TestCase):
+
+    def setUp(self):
+        super(ProjectCascadeTests, self).setUp()
+        self.deleted = []
+        self.lock = threading.Lock()
+        self.mox.stubs.Set(project_identity, 'project_subtree',
+                           lambda request, project: SUBTREE)
+        self.mox.stubs.Set(project_identity, 'project_delete',
+                           self._project_delete)
+
+    def _project_delete(self, request, project):
+        if project == 'a21':
+            raise keystone_exceptions.Forbidden()
+        with self.lock:
+            self.deleted.append(project)
+
+    def test_subtree_levels(self):
+        levels, parents = project_cascade.subtree_levels('root', SUBTREE)
+
+        self.assertEqual(levels, [['root'], ['a', 'b'], ['a1', 'a2'],
+                                  ['a21']])
+        self.assertEqual(parents['a21'], 'a2')
+        self.assertEqual(parents['a'], 'root')
+
+    def test_cascade_delete_leaves_first(self):
+        self.mox.stubs.Set(project_identity, 'project_delete',
+                           lambda request, project:
+                           self.deleted.append(project))
+        progress = []
+
+        result = project_cascade.cascade_delete(
+            None, 'root', concurrency=1,
+            progress=lambda *args: progress.append(args))
+
+        self.assertEqual(self.deleted,
+                         ['a21', 'a1', 'a2', 'a', 'b', 'root'])
+        self.assertEqual(result.failed, [])
+        self.assertEqual(progress[-1], ('root', None, 6, 6))
+
+    def test_cascade_delete_refuses_protected_subtree(self):
+        self.assertRaises(project_cascade.ProtectedProject,
+                          project_cascade.cascade_delete,
+                          None, 'root', protected=['a21'])
+        self.assertEqual(self.deleted, [])
+
+    def test_cascade_delete_keeps_ancestors_of_failures(self):
+        result = project_cascade.cascade_delete(None, 'root', concurrency=4)
+
+        self.assertItemsEqual(result.deleted, ['a1', 'b'])
+        self.assertEqual([project for project, _e in result.failed],
+                         ['a21'])
+        self.assertEqual(result.skipped, ['a2', 'a', 'root'])
@@ -0,0 +1,78 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+from keystoneclient import exceptions as keystone_exceptions
+
+from openstack_dashboard.api import base
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import project_clone
+from nec_portal.api import project_identity
+from nec_portal.local import nec_portal_settings as nec_set
+from nec_portal.test.api_tests.identity_replica_tests import Assignment
+
+ROLE_NAMES = {'r1': 'C__DC1__Reader', 'r2': 'T__DC1__ObjectStore'}
+
+
+class ProjectCloneTests(test.TestCase):
+
+    def setUp(self):
+        super(ProjectCloneTests, self).setUp()
+        self.mox.stubs.Set(nec_set, 'DISINHERITED_ROLES',
+                           ['T__DC1__ObjectStore'])
+        self.assignments = [Assignment('r1', 'source', user_id='u1'),
+                            Assignment('r1', 'source', group_id='g1'),
+                            Assignment('r2', 'source', group_id='g1'),
+                            Assignment('r1', 'source', user_id='u1')]
+
+    def test_plan_grants(self):
+        grants, skipped = project_clone.plan_grants(
+            self.assignments, ROLE_NAMES, nec_set.DISINHERITED_ROLES)
+
+        self.assertEqual(grants, [
+            project_clone.Grant('group', 'g1', 'r1', 'C__DC1__Reader', False),
+            project_clone.Grant('user', 'u1', 'r1', 'C__DC1__Reader', False)])
+        self.assertEqual([grant.role_id for grant in skipped], ['r2'])
+
+    def test_clone_project(self):
+        granted = []
+
+        def add_group_role(request, role, group, project):
+            raise keystone_exceptions.Forbidden()
+
+        def add_project_user_role(request, project=None, user=None,
+                                  role=None):
+            granted.append((project, user, role))
+
+        self.mox.stubs.Set(project_identity, 'role_list', lambda request: [
+            base.APIDictWrapper({'id': role_id, 'name': name})
+            for role_id, name in ROLE_NAMES.items()])
+        self.mox.stubs.Set(project_identity, 'iter_role_assignments',
+                           lambda project: iter(self.assignments))
+        self.mox.stubs.Set(project_identity, 'project_create',
+                           lambda request, **kwargs:
+                           base.APIDictWrapper(dict(kwargs, id='new')))
+        self.mox.stubs.Set(project_identity, 'add_group_role',
+                           add_group_role)
+        self.mox.stubs.Set(project_identity, 'add_project_user_role',
+                           add_project_user_role)
+
+        result = project_clone.clone_project(None, 'source', 'clone',
+                                             parent='parent')
+
+        self.assertEqual(result.project.parent, 'parent')
+        self.assertEqual(granted, [('new', 'u1', 'r1')])
+        self.assertEqual([outcome.item.actor_type for outcome
+                          in result.outcomes if outcome.error], ['group'])
+        self.assertEqual(len(result.skipped), 1)
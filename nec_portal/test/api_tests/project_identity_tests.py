@@ -21,9 +21,12 @@ from openstack_dashboard.api import keystone
 from openstack_dashboard.test import helpers as test
 
 from keystoneclient import client
+from keystoneclient import exceptions as keystone_exceptions
 
 from nec_portal import api as nec_api
+from nec_portal.api import circuit_breaker
 from nec_portal.api import project_identity  # noqa
+from nec_portal.api import warm_store
 
 
 class ProjectIdentityApiTests(test.APITestCase):
@@ -40,6 +43,10 @@ class ProjectIdentityApiTests(test.APITestCase):
             lambda request: self.stub_keystoneclient()
         api.keystone = lambda request: self.stub_api_keystone()
 
+        project_identity.BREAKER.reset()
+        project_identity.LAST_KNOWN_GOOD.clear()
+        warm_store.STORE.clear()
+
     def tearDown(self):
         super(ProjectIdentityApiTests, self).tearDown()
 
@@ -117,6 +124,54 @@ class ProjectIdentityApiTests(test.APITestCase):
         self.assertEqual(len(res), 1)
         self.assertItemsEqual(res[0].id, "2")
 
+    def test_project_user_refs(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, "get_keystone_client")
+        project_identity.get_keystone_client().AndReturn(keystoneclient)
+
+        project_id = "project_id_0000-1111-2222"
+        assignments = []
+        for user_id, name in (("2", "user_b"), ("1", "user_a"),
+                              ("2", "user_b")):
+            assignment = IdentityObj()
+            assignment.add('user', {"id": user_id, "name": name,
+                                    "domain": {"id": "default"}})
+            assignments.append(assignment)
+
+        keystoneclient.role_assignments = self.mox.CreateMockAnything()
+        keystoneclient.role_assignments.list(
+            project=project_id, include_names=True).AndReturn(assignments)
+
+        self.mox.ReplayAll()
+        res = project_identity.project_user_refs(project_id)
+        self.assertEqual([(u.id, u.name) for u in res],
+                         [("1", "user_a"), ("2", "user_b")])
+        self.assertEqual(res[0].domain_id, "default")
+
+    def test_iter_project_user_refs(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, "get_keystone_client")
+        project_identity.get_keystone_client().AndReturn(keystoneclient)
+
+        project_id = "project_id_0000-1111-2222"
+        assignments = []
+        for user_id, name in (("2", "user_b"), ("1", "user_a"),
+                              ("2", "user_b")):
+            assignment = IdentityObj()
+            assignment.add('user', {"id": user_id, "name": name})
+            assignments.append(assignment)
+
+        keystoneclient.role_assignments = self.mox.CreateMockAnything()
+        keystoneclient.role_assignments.list(
+            project=project_id, include_names=True).AndReturn(assignments)
+
+        self.mox.ReplayAll()
+        res = project_identity.iter_project_user_refs(project_id)
+        self.assertEqual([(u.id, u.name) for u in res],
+                         [("2", "user_b"), ("1", "user_a")])
+
     def test_role_assignments_list(self):
 
         keystoneclient = self.stub_keystoneclient()
@@ -492,6 +547,83 @@ class ProjectIdentityApiTests(test.APITestCase):
         res = project_identity.group_get(self.request, group.id)
         self.assertItemsEqual(res.id, group.id)
 
+    def test_group_get_served_from_cache_on_failure(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, 'get_keystone_client')
+        project_identity.get_keystone_client().MultipleTimes() \
+            .AndReturn(keystoneclient)
+
+        group = self.groups.get(id="1")
+
+        keystoneclient.groups = self.mox.CreateMockAnything()
+        keystoneclient.groups.get(group.id).AndReturn(group)
+        keystoneclient.groups.get(group.id) \
+            .AndRaise(keystone_exceptions.ConnectionRefused())
+
+        self.mox.ReplayAll()
+        project_identity.group_get(self.request, group.id)
+        res = project_identity.group_get(self.request, group.id)
+        self.assertEqual(res.id, group.id)
+
+    def test_role_list_served_from_warm_store(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, 'get_keystone_client')
+        project_identity.get_keystone_client().AndReturn(keystoneclient)
+
+        roles = self.roles.list()
+
+        keystoneclient.roles = self.mox.CreateMockAnything()
+        keystoneclient.roles.list().AndReturn(roles)
+
+        self.mox.ReplayAll()
+        project_identity.role_list.warm(None)
+        res = project_identity.role_list(self.request)
+        self.assertEqual(res, roles)
+
+    def test_warm_membership_dropped_on_change(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, 'get_keystone_client')
+        project_identity.get_keystone_client().MultipleTimes() \
+            .AndReturn(keystoneclient)
+
+        group = self.groups.get(id="1")
+
+        keystoneclient.role_assignments = self.mox.CreateMockAnything()
+        keystoneclient.role_assignments.list(project='1').AndReturn([])
+        keystoneclient.groups = self.mox.CreateMockAnything()
+        keystoneclient.groups.delete(group.id).AndReturn(None)
+        keystoneclient.role_assignments.list(project='1').AndReturn([])
+
+        self.mox.ReplayAll()
+        project_identity._project_group_list.warm('1')
+        project_identity.project_group_list(project='1')
+        project_identity.group_delete(self.request, group.id)
+        project_identity.project_group_list(project='1')
+
+    def test_group_get_circuit_open(self):
+        project_identity.LAST_KNOWN_GOOD.put(
+            project_identity._call_key('group_get', (self.request, '1'), {}),
+            self.groups.get(id="1"))
+        for _i in range(project_identity.BREAKER.window):
+            project_identity.BREAKER.record(True, 0)
+
+        res = project_identity.group_get(self.request, '1')
+        self.assertEqual(res.id, '1')
+        self.assertTrue(project_identity.is_degraded())
+        self.assertRaises(circuit_breaker.IdentityUnavailable,
+                          project_identity.group_get, self.request, '2')
+
+    def test_group_delete_circuit_open(self):
+        for _i in range(project_identity.BREAKER.window):
+            project_identity.BREAKER.record(True, 0)
+
+        self.assertRaises(circuit_breaker.IdentityUnavailable,
+                          project_identity.group_delete,
+                          self.request, 'group_id_0000-1111-2222')
+
     def test_group_user_list(self):
 
         keystoneclient = self.stub_keystoneclient()
@@ -582,6 +714,28 @@ class ProjectIdentityApiTests(test.APITestCase):
                                               group_id, project_id)
         self.assertItemsEqual(res.id, role.id)
 
+    def test_add_group_role_inherited(self):
+
+        keystoneclient = self.stub_keystoneclient()
+        self.mox.StubOutWithMock(project_identity, 'get_keystone_client')
+        project_identity.get_keystone_client().AndReturn(keystoneclient)
+
+        role = self.roles.get(id="1")
+        project_id = "project_id_0000-1111-2222"
+        group_id = "group_id_0000-1111-2222"
+
+        keystoneclient.roles = self.mox.CreateMockAnything()
+        keystoneclient.roles.grant(role=role.id, group=group_id,
+                                   project=project_id,
+                                   os_inherit_extension_inherited=True).\
+            AndReturn(role)
+
+        self.mox.ReplayAll()
+        res = project_identity.add_group_role(self.request, role.id,
+                                              group_id, project_id,
+                                              inherited=True)
+        self.assertItemsEqual(res.id, role.id)
+
     def test_remove_group_role(self):
 
         keystoneclient = self.stub_keystoneclient()
@@ -715,6 +869,20 @@ class ProjectIdentityApiTests(test.APITestCase):
         self.mox.ReplayAll()
         project_identity.group_delete(self.request, group_id)
 
+    def test_stream_params_by_listing(self):
+        filters = {'domain': 'd1', 'project': 'p1', 'name': None}
+        self.assertEqual(
+            project_identity._stream_params('users', filters),
+            {'domain_id': 'd1', 'default_project_id': 'p1'})
+        self.assertEqual(
+            project_identity._stream_params('role_assignments', filters),
+            {'scope.domain.id': 'd1', 'scope.project.id': 'p1'})
+        self.assertEqual(
+            project_identity._v2_filters('users', filters),
+            {'tenant_id': 'p1'})
+        self.assertRaises(ValueError, project_identity._v2_filters,
+                          'groups', {'user': 'u1'})
+
 
 class IdentityObj(object):
 
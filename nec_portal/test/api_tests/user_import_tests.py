@@ -0,0 +1,110 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+#
+
+import io
+import threading
+
+from openstack_dashboard.api import base
+from openstack_dashboard.test import helpers as test
+
+from nec_portal.api import identity_records
+from nec_portal.api import project_identity
+from nec_portal.api import user_import
+from nec_portal.local import nec_portal_settings as nec_set
+
+CSV_FILE = (b'name,email,password,enabled\n'
+            b'alice,alice@example.com,secret,\n'
+            b'bob,not-an-email,secret,false\n'
+            b'carol,,,\n'
+            b'alice,,,\n'
+            b'dave,,,\n'
+            b',,,\n')
+
+
+class UserImportTests(test.TestCase):
+
+    def setUp(self):
+        super(UserImportTests, self).setUp()
+        user_import._INDEXES.clear()
+        self.lock = threading.Lock()
+        self.created = []
+        self.granted = []
+        existing = [
+            base.APIDictWrapper({'id': 'u-carol', 'name': 'carol',
+                                 'default_project_id': 'project',
+                                 user_import.IMPORT_MARKER: 'project'}),
+            identity_records.UserRecord(id='u-dave', name='dave',
+                                        default_project_id='other'),
+            identity_records.UserRecord(id='u-erin', name='erin',
+                                        default_project_id='project')]
+        self.mox.stubs.Set(nec_set, 'DEFAULT_USER_ROLES', ['_member_'])
+        self.mox.stubs.Set(project_identity, 'iter_users',
+                           lambda domain: iter(existing))
+        self.mox.stubs.Set(project_identity, 'role_list', lambda request: [
+            base.APIDictWrapper({'id': 'r-member', 'name': '_member_'}),
+            base.APIDictWrapper({'id': 'r-other', 'name': 'other'})])
+        self.mox.stubs.Set(project_identity, 'roles_for_user',
+                           lambda request, user, project: [])
+        self.mox.stubs.Set(project_identity, 'user_create',
+                           self._user_create)
+        self.mox.stubs.Set(project_identity, 'add_project_user_role',
+                           self._add_project_user_role)
+
+    def _user_create(self, request, **kwargs):
+        with self.lock:
+            self.created.append(kwargs['name'])
+        return base.APIDictWrapper({'id': 'u-' + kwargs['name']})
+
+    def _add_project_user_role(self, request, role, user, project):
+        with self.lock:
+            self.granted.append((user, role))
+
+    def test_iter_rows_csv(self):
+        rows = list(user_import.iter_rows(io.BytesIO(CSV_FILE), 'csv'))
+
+        self.assertEqual(rows[0], user_import.ImportRow(
+            2, 'alice', 'alice@example.com', 'secret', True))
+        self.assertFalse(rows[1].enabled)
+        self.assertEqual(len(rows), 6)
+
+    def test_iter_rows_json(self):
+        stream = io.BytesIO(b'[{"name": "alice", "enabled": false}, '
+                            b'{"name": "bob"}]')
+
+        rows = list(user_import.iter_rows(stream, 'json'))
+
+        self.assertEqual([(row.line, row.name, row.enabled) for row in rows],
+                         [(1, 'alice', False), (2, 'bob', True)])
+
+    def test_import(self):
+        importer = user_import.UserImporter(None, 'project', 'default',
+                                            concurrency=2, batch_size=2)
+        results = list(importer.run(
+            user_import.iter_rows(io.BytesIO(CSV_FILE), 'csv')))
+
+        self.assertEqual([result.status for result in results],
+                         ['created', 'invalid', 'resumed', 'invalid',
+                          'conflict', 'invalid'])
+        self.assertEqual(self.created, ['alice'])
+        self.assertItemsEqual(self.granted, [('u-alice', 'r-member'),
+                                             ('u-carol', 'r-member')])
+
+    def test_same_project_user_not_imported_is_conflict(self):
+        importer = user_import.UserImporter(None, 'project', 'default')
+
+        result = importer.validate(
+            user_import.ImportRow(2, 'erin', None, None, True))
+
+        self.assertEqual((result.status, result.user_id),
+                         ('conflict', 'u-erin'))
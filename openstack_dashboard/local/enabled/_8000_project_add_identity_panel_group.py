@@ -21,3 +21,5 @@ PANEL_GROUP = 'identity_project_panel_group'
 PANEL_GROUP_NAME = _('Identity')
 # The slug of the dashboard the PANEL_GROUP associated with. Required.
 PANEL_GROUP_DASHBOARD = 'project'
+# Installs nec_portal itself so that its management commands are found.
+ADD_INSTALLED_APPS = ['nec_portal']